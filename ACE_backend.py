@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import operator
+import re
+import time
 from pathlib import Path
 from typing import TypedDict, List, Optional, Literal, Annotated
 
@@ -11,15 +13,19 @@ from langgraph.types import Send
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_tavily import TavilySearch
 
 import os
-from dotenv import load_dotenv
-# override=False: .env will NOT overwrite vars already set by app.py at runtime
-load_dotenv(override=False)
 
 # ── User config bridge (set by app.py via os.environ before each run) ─────────
+# ace_config also loads .env (override=False), once per process.
 from ace_config import cfg   # reads os.environ at property-access time → always fresh
+import ace_evidence
+import ace_hedge
+import ace_images
+import ace_metrics
+import ace_profile
+import ace_ratelimit
+import ace_repair
 
 
 # ═════════════════════════════════════════════════════════════════════════════
@@ -61,6 +67,19 @@ class RouterDecision(BaseModel):
     queries: List[str] = Field(default_factory=list)
 
 
+class TopicPlan(BaseModel):
+    """One topic of a batched planning call: its routing, plus a plan when closed-book."""
+    topic_no: int
+    needs_research: bool
+    mode: Literal["closed_book", "hybrid", "open_book"]
+    queries: List[str] = Field(default_factory=list)
+    plan: Optional[Plan] = None
+
+
+class BatchPlan(BaseModel):
+    topics: List[TopicPlan]
+
+
 class EvidenceItem(BaseModel):
     title: str
     url: str
@@ -73,18 +92,35 @@ class EvidencePack(BaseModel):
     evidence: List[EvidenceItem] = Field(default_factory=list)
 
 
+class ImageSpec(BaseModel):
+    section_id: int = Field(..., description="id of the section the image is shown after.")
+    alt: str
+    caption: str
+    prompt: str = Field(..., description="Prompt to send to the image model.")
+    size: Literal["1024x1024", "1024x1536", "1536x1024"] = "1024x1024"
+
+
+class ImagePlan(BaseModel):
+    images: List[ImageSpec] = Field(default_factory=list)
+
+
 # ═════════════════════════════════════════════════════════════════════════════
 # STATE
 # ═════════════════════════════════════════════════════════════════════════════
 
-class State(TypedDict):
+class State(TypedDict, total=False):
     topic: str
+    deadline: Optional[float]                         # epoch seconds; None = no time budget
     mode: str
     needs_research: bool
     queries: List[str]
     evidence: List[EvidenceItem]
     plan: Optional[Plan]
+    section_words: Optional[int]                      # per-section word cap set under a deadline
     sections: Annotated[List[tuple[int, str]], operator.add]
+    images: List[dict]                                # ImageSpec + cache key; see ace_images.place
+    llm_calls: Annotated[List[dict], operator.add]   # one record per LLM call, see _invoke
+    degradations: Annotated[List[str], operator.add]  # what was cut to meet the deadline
     final: str
 
 
@@ -92,11 +128,51 @@ class State(TypedDict):
 # LLM  — re-initialised each call so a fresh API key is always used
 # ═════════════════════════════════════════════════════════════════════════════
 
-def get_llm() -> ChatGoogleGenerativeAI:
-    """Return an LLM instance using the current API key.
-    Priority: user key in Settings UI → GOOGLE_API_KEY in .env → GEMINI_API_KEY in .env
+# USD per 1M tokens (input, output), standard tier, prompts <= 200k tokens.
+MODEL_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash":      (0.30, 2.50),
+    "gemini-2.5-pro":        (1.25, 10.00),
+}
+
+
+# ── Output ceilings ──────────────────────────────────────────────────────────
+# Gemini 2.5 counts thinking tokens against max_output_tokens, so every capped call
+# gets an explicit thinking budget on top of its visible-output ceiling.
+# (2.5 Pro cannot turn thinking off; 128 is its minimum.)
+TOKENS_PER_WORD = 1.4
+THINKING_BUDGET = {"router": 0, "research": 0, "orchestrator": 1024, "worker": 512}
+ROUTER_MAX_TOKENS = 256
+
+
+def research_token_ceiling(n_raw_results: int) -> int:
+    return max(1024, 160 * n_raw_results)
+
+
+def plan_token_ceiling(n_sections: int) -> int:
+    return int((300 + 220 * n_sections) * cfg.output_headroom)
+
+
+def section_token_ceiling(task: Task, words_cap: Optional[int] = None) -> int:
+    """Visible-output ceiling for one section, from its word budget plus headroom."""
+    m = re.search(r"\d+", task.target_words or "")
+    words = max(int(m.group()) if m else 0, cfg.words_per_section)
+    if words_cap:
+        words = min(words, words_cap)
+    return int(words * TOKENS_PER_WORD * cfg.output_headroom) + 200
+
+
+def get_llm(node: str = "worker", max_output_tokens: Optional[int] = None) -> ChatGoogleGenerativeAI:
+    """Return an LLM instance for one pipeline stage using the current API key.
+    Model comes from cfg.model_for(node) (depth-based default, ACE_MODEL_<NODE> override).
+    max_output_tokens is the visible-output ceiling; the node's thinking budget is added on top.
+    Key priority: user key in Settings UI → GOOGLE_API_KEY in .env → GEMINI_API_KEY in .env
     Key is resolved explicitly so LangChain never falls back to a stale cached env read.
+    ACE_PROVIDER=fake returns ace_fakes.FakeChatModel (offline, no key needed).
     """
+    if cfg.provider == "fake":
+        import ace_fakes
+        return ace_fakes.FakeChatModel(model=cfg.model_for(node))
     key = (
         cfg.gemini_api_key                          # user's own key saved in MongoDB
         or os.environ.get("GOOGLE_API_KEY", "")     # server key set by app.py / .env
@@ -107,12 +183,175 @@ def get_llm() -> ChatGoogleGenerativeAI:
             "No Google API key found. Add your key in Settings → API Key, "
             "or set GOOGLE_API_KEY in your .env file."
         )
+    model = cfg.model_for(node)
+    limits = {}
+    if max_output_tokens:
+        thinking = THINKING_BUDGET.get(node, 0)
+        if "pro" in model:
+            thinking = max(thinking, 128)
+        limits = {"thinking_budget": thinking, "max_output_tokens": max_output_tokens + thinking}
     return ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
+        model=model,
         google_api_key=key,
+        **limits,
     )
 
 
+def _invoke(node: str, messages: list, schema=None, max_output_tokens: Optional[int] = None,
+            acquire: bool = True, hints: Optional[dict] = None):
+    """Run one LLM call for `node`; return (result, call_record).
+
+    result is the parsed `schema` instance, or the AIMessage when schema is None.
+    call_record carries model, latency, token usage, estimated cost and whether the
+    output ceiling was hit, and is appended to State.llm_calls so callers can report
+    per-node spend. acquire=False skips the rate limiter (caller already holds a token).
+
+    A reply that fails schema validation is repaired locally (ace_repair, with `hints`
+    for missing fields); only if that fails is the call made once more.
+    """
+    llm = get_llm(node, max_output_tokens)
+    model = cfg.model_for(node)
+    record = {
+        "node":              node,
+        "model":             model,
+        "seconds":           0.0,
+        "input_tokens":      0,
+        "output_tokens":     0,
+        "cost_usd":          0.0,
+        "max_output_tokens": max_output_tokens,
+        "hit_cap":           False,
+    }
+
+    def call_once(take_token: bool):
+        if take_token:
+            ace_ratelimit.limiter("llm", cfg.llm_rpm).acquire()
+        t0 = time.perf_counter()
+        try:
+            if schema is None:
+                out = {"raw": llm.invoke(messages)}
+            else:
+                out = llm.with_structured_output(schema, include_raw=True).invoke(messages)
+        except Exception:
+            ace_metrics.llm_call(node, model, ok=False)
+            raise
+        seconds = time.perf_counter() - t0
+        raw = out["raw"]
+        usage = getattr(raw, "usage_metadata", None) or {}
+        ace_metrics.llm_call(node, model, True, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+        price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+        finish = (getattr(raw, "response_metadata", None) or {}).get("finish_reason")
+        record["seconds"] = round(record["seconds"] + seconds, 3)
+        record["input_tokens"] += usage.get("input_tokens", 0)
+        record["output_tokens"] += usage.get("output_tokens", 0)
+        record["cost_usd"] += (usage.get("input_tokens", 0) * price_in
+                               + usage.get("output_tokens", 0) * price_out) / 1_000_000
+        record["hit_cap"] = "MAX_TOKENS" in str(finish)
+        return out, seconds
+
+    out, seconds = call_once(acquire)
+    if schema is None:
+        return out["raw"], record
+    if out.get("parsing_error") is None and out.get("parsed") is not None:
+        return out["parsed"], record
+
+    t0 = time.perf_counter()
+    repaired, fixes = ace_repair.repair(schema, out["raw"], hints)
+    repair_ms = round((time.perf_counter() - t0) * 1000, 2)
+    ace_repair.record(repaired is not None, seconds)
+    if repaired is not None:
+        # The retry this avoided would have cost about as long as the call itself.
+        record.update(repaired=True, repairs=fixes[:8], repair_ms=repair_ms, saved_seconds=round(seconds, 3))
+        return repaired, record
+
+    record["retried"] = True
+    out, _ = call_once(True)
+    if out.get("parsing_error") is None and out.get("parsed") is not None:
+        return out["parsed"], record
+    repaired, fixes = ace_repair.repair(schema, out["raw"], hints)
+    if repaired is None:
+        raise out.get("parsing_error") or ValueError(f"{node}: reply did not match {schema.__name__}")
+    record.update(repaired=True, repairs=fixes[:8])
+    return repaired, record
+
+
+def summarize_llm_calls(calls: List[dict]) -> dict:
+    """Aggregate State.llm_calls per node: {node: {calls, seconds, tokens, cost_usd, models}}.
+    Plain JSON types only, so the result can be stored with the saved document."""
+    out: dict = {}
+    for c in calls:
+        s = out.setdefault(c["node"], {
+            "calls": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0,
+            "cost_usd": 0.0, "models": [], "cap_hits": 0, "hedges": 0, "hedge_wins": 0,
+            "repairs": 0, "retries": 0, "repair_saved_s": 0.0, "late": 0,
+        })
+        s["calls"] += 1
+        s["cap_hits"] += int(c.get("hit_cap", False))
+        s["hedges"] += int(c.get("hedged", False))
+        s["hedge_wins"] += int(c.get("hedge_won", False))
+        s["repairs"] += int(c.get("repaired", False))
+        s["retries"] += int(c.get("retried", False))
+        s["late"] += int("late" in c)
+        s["repair_saved_s"] = round(s["repair_saved_s"] + c.get("saved_seconds", 0.0), 3)
+        s["seconds"] = round(s["seconds"] + c["seconds"], 3)
+        s["input_tokens"] += c["input_tokens"]
+        s["output_tokens"] += c["output_tokens"]
+        s["cost_usd"] += c["cost_usd"]
+        if c["model"] not in s["models"]:
+            s["models"].append(c["model"])
+    return out
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# DEADLINE  — optional overall time budget passed in as State["deadline"]
+# ═════════════════════════════════════════════════════════════════════════════
+# Each stage checks what is left and degrades instead of failing; every cut is
+# appended to State["degradations"] so the caller can report it.
+
+DEADLINE_RESERVE_S = 3.0     # kept back for the reducer and UI
+ROUTER_MIN_S       = 45.0    # less than this: skip the router call, go closed-book
+RESEARCH_MIN_S     = 75.0    # less than this: skip web research
+EXTRACT_MIN_S      = 45.0    # less than this after searching: use raw results, no LLM extraction
+PLAN_EST_S         = 15.0    # planner latency assumed when sizing the worker budget
+FEW_SECTIONS_S     = 40.0    # workers get less than this: plan at most 3 sections
+WORDS_FLOOR        = 80
+IMAGES_MIN_S       = 30.0    # less than this when sections start: no images
+
+
+def _remaining(state: dict) -> Optional[float]:
+    deadline = state.get("deadline")
+    return None if not deadline else deadline - time.time() - DEADLINE_RESERVE_S
+
+
+# Why a call was cut off by the deadline, appended to its degradation note.
+_CUT_OFF = {
+    "starved":    " (never started: every call thread was busy)",
+    "rate_limit": " (still waiting for the LLM rate limit)",
+}
+
+
+def _cut_off(reason) -> str:
+    return _CUT_OFF.get(reason, "")
+
+
+def _within(remaining: Optional[float], call, node: str):
+    """Run `call()` bounded by the remaining budget: (True, result) or (False, reason), where
+    reason is None for a plain timeout, or "starved" if the call never got a thread.
+    A timed-out `node` call keeps running; ACE_backend.stream() accounts for its cost."""
+    if remaining is None:
+        return True, call()
+    try:
+        return ace_hedge.call_with_timeout(call, remaining, {"node": node, "model": cfg.model_for(node)})
+    except ace_hedge.Starved:
+        return False, "starved"
+
+
+def _estimate_section_seconds(words: int) -> float:
+    measured = ace_hedge.hedge_delay(cfg.model_for("worker"), 90)
+    if measured is not None:
+        return measured
+    return 4.0 + words * TOKENS_PER_WORD / 60      # ~60 output tokens/s
+
+
 # ═════════════════════════════════════════════════════════════════════════════
 # ROUTER
 # ═════════════════════════════════════════════════════════════════════════════
@@ -139,36 +378,47 @@ If needs_research=true:
 
 def router_node(state: State) -> dict:
     topic = state["topic"]
+    remaining = _remaining(state)
 
     # ── User depth override: Quick → always closed_book, no research ──────────
     if cfg.depth_level == "Quick":
         return {"needs_research": False, "mode": "closed_book", "queries": []}
 
+    # ── Tight deadline → no routing call, no research ─────────────────────────
+    if remaining is not None and remaining < ROUTER_MIN_S:
+        return {
+            "needs_research": False, "mode": "closed_book", "queries": [],
+            "degradations": [f"Skipped routing and web research ({remaining:.0f}s left)"],
+        }
+
+    ok, routed = _within(remaining, lambda: _invoke("router", [
+        SystemMessage(content=ROUTER_SYSTEM),
+        HumanMessage(content=f"Topic: {topic}"),
+    ], RouterDecision, max_output_tokens=ROUTER_MAX_TOKENS), "router")
+    if not ok:
+        return {
+            "needs_research": False, "mode": "closed_book", "queries": [],
+            "degradations": [f"Router timed out{_cut_off(routed)} — continued closed-book"],
+        }
+    decision, call = routed
+
     # ── Exhaustive → always force open_book with research ─────────────────────
     if cfg.depth_level == "Exhaustive":
         hint = cfg.router_hint()
-        # Still ask LLM for good queries but force mode
-        decider = get_llm().with_structured_output(RouterDecision)
-        decision = decider.invoke([
-            SystemMessage(content=ROUTER_SYSTEM),
-            HumanMessage(content=f"Topic: {topic}"),
-        ])
+        # Still use the LLM's queries but force mode
         return {
             "needs_research": True,
             "mode": hint["mode"],
             "queries": decision.queries or [topic],
+            "llm_calls": [call],
         }
 
-    # ── Default: let LLM decide (Balanced / Deep) ─────────────────────────────
-    decider = get_llm().with_structured_output(RouterDecision)
-    decision = decider.invoke([
-        SystemMessage(content=ROUTER_SYSTEM),
-        HumanMessage(content=f"Topic: {topic}"),
-    ])
+    # ── Default: LLM decides (Balanced / Deep) ────────────────────────────────
     return {
         "needs_research": decision.needs_research,
         "mode": decision.mode,
         "queries": decision.queries,
+        "llm_calls": [call],
     }
 
 
@@ -180,7 +430,40 @@ def route_next(state: State) -> str:
 # RESEARCH
 # ═════════════════════════════════════════════════════════════════════════════
 
+# Optional dict-like cache of normalized search results, keyed by "query|max_results".
+# ace_batch installs a cross-process one so parallel workers don't repeat searches.
+SEARCH_CACHE = None
+
+# Optional ace_evidence_store.EvidenceStore: extracted evidence shared across runs and
+# users. Installed by streamlit_app.py and ace_jobs workers.
+EVIDENCE_STORE = None
+
+
 def _tavily_search(query: str, max_results: int = 2) -> List[dict]:
+    cache_key = f"{query}|{max_results}"
+    if SEARCH_CACHE is not None:
+        hit = SEARCH_CACHE.get(cache_key)
+        ace_metrics.cache("search", hits=int(hit is not None), misses=int(hit is None))
+        if hit is not None:
+            return hit
+    try:
+        results = _tavily_fetch(query, max_results)
+    except Exception:
+        ace_metrics.tavily_call(ok=False)
+        raise
+    ace_metrics.tavily_call(ok=True)
+    if SEARCH_CACHE is not None and results:
+        SEARCH_CACHE[cache_key] = results
+    return results
+
+
+def _tavily_fetch(query: str, max_results: int) -> List[dict]:
+    ace_ratelimit.limiter("tavily", cfg.tavily_rpm).acquire()
+    if cfg.provider == "fake":
+        import ace_fakes
+        return ace_fakes.search(query, max_results)
+
+    from langchain_tavily import TavilySearch   # only research runs need it
     tool = TavilySearch(max_results=max_results)
     response = tool.invoke({"query": query})
     results = response.get("results", []) if isinstance(response, dict) else []
@@ -212,8 +495,18 @@ Rules:
 """
 
 
+def _raw_evidence(raw_results: List[dict]) -> List[EvidenceItem]:
+    """Search results as evidence without the LLM pass (used when time is short)."""
+    dedup = {}
+    for r in raw_results:
+        if r["url"] and r["url"] not in dedup:
+            dedup[r["url"]] = EvidenceItem(**{**r, "snippet": (r["snippet"] or "")[:300]})
+    return list(dedup.values())
+
+
 def research_node(state: State) -> dict:
     queries = state.get("queries", []) or []
+    degradations: List[str] = []
 
     # Scale search results with depth
     max_results_per_query = {
@@ -222,41 +515,87 @@ def research_node(state: State) -> dict:
         "Exhaustive": 4,
     }.get(cfg.depth_level, 2)
 
-    raw_results: List[dict] = []
-    for q in queries:
-        raw_results.extend(_tavily_search(q, max_results=max_results_per_query))
+    remaining = _remaining(state)
+    if remaining is not None:
+        if remaining < RESEARCH_MIN_S:
+            return {"evidence": [], "degradations": [f"Skipped web research ({remaining:.0f}s left)"]}
+        if remaining < 2 * RESEARCH_MIN_S and len(queries) > 1:
+            queries = queries[:1]
+            max_results_per_query = min(max_results_per_query, 2)
+            degradations.append("Research capped to 1 query")
+
+    # Queries with fresh evidence in the shared store skip search and extraction.
+    stored = _stored_evidence(queries, max_results_per_query, state.get("topic", ""))
+    reused = [EvidenceItem(**item) for q in queries for item in stored.get(q, [])]
+    raw_by_query = {q: _tavily_search(q, max_results=max_results_per_query) for q in queries if q not in stored}
+    raw_results = [r for results in raw_by_query.values() for r in results]
 
     if not raw_results:
-        return {"evidence": []}
+        return {"evidence": _dedup_evidence(reused), "degradations": degradations}
+
+    remaining = _remaining(state)
+    if remaining is not None and remaining < EXTRACT_MIN_S:
+        degradations.append("Used raw search results (skipped evidence extraction)")
+        return {"evidence": _dedup_evidence(reused + _raw_evidence(raw_results)), "degradations": degradations}
 
-    extractor = get_llm().with_structured_output(EvidencePack)
-    pack = extractor.invoke([
+    ok, extracted = _within(remaining, lambda: _invoke("research", [
         SystemMessage(content=RESEARCH_SYSTEM),
         HumanMessage(content=f"Raw Results:\n{raw_results}"),
-    ])
+    ], EvidencePack, max_output_tokens=research_token_ceiling(len(raw_results))), "research")
+    if not ok:
+        degradations.append(f"Evidence extraction timed out{_cut_off(extracted)} — used raw search results")
+        return {"evidence": _dedup_evidence(reused + _raw_evidence(raw_results)), "degradations": degradations}
+    pack, call = extracted
 
+    fresh = _dedup_evidence([e for e in pack.evidence if e.url])
+    _store_evidence(raw_by_query, fresh, max_results_per_query, state.get("topic", ""))
+    return {"evidence": _dedup_evidence(reused + fresh), "llm_calls": [call], "degradations": degradations}
+
+
+def _dedup_evidence(items: List[EvidenceItem]) -> List[EvidenceItem]:
     dedup = {}
-    for e in pack.evidence:
-        if e.url:
-            dedup[e.url] = e
+    for e in items:
+        dedup.setdefault(e.url, e)
+    return list(dedup.values())
+
+
+def _stored_evidence(queries: List[str], max_results: int, topic: str) -> dict:
+    if EVIDENCE_STORE is None or not queries:
+        return {}
+    stored = EVIDENCE_STORE.lookup(queries, max_results, topic)
+    ace_metrics.cache("evidence", hits=len(stored), misses=len(queries) - len(stored))
+    return stored
 
-    return {"evidence": list(dedup.values())}
+
+def _store_evidence(raw_by_query: dict, evidence: List[EvidenceItem], max_results: int, topic: str):
+    """Save extracted items under the query whose search returned their URL.
+    Items whose URL no search returned are not stored, since nothing grounds them."""
+    if EVIDENCE_STORE is None or not evidence:
+        return
+    by_url = {e.url: e for e in evidence}
+    by_query = {}
+    for q, results in raw_by_query.items():
+        items = [by_url[r["url"]].model_dump() for r in results if r["url"] in by_url]
+        if items:
+            by_query[q] = list({i["url"]: i for i in items}.values())
+    EVIDENCE_STORE.save(by_query, max_results, topic)
 
 
 # ═════════════════════════════════════════════════════════════════════════════
 # ORCHESTRATOR  — now driven by user output_type + section count
 # ═════════════════════════════════════════════════════════════════════════════
 
-def _build_orch_system() -> str:
-    """Build orchestrator system prompt dynamically from user config."""
+def _build_orch_system(n_sections: Optional[int] = None, per_section_words: Optional[int] = None) -> str:
+    """Build orchestrator system prompt dynamically from user config.
+    n_sections / per_section_words override the config when a deadline forces a smaller plan."""
 
     output_type = cfg.output_type
-    n_sections  = cfg.section_count
+    n_sections  = n_sections or cfg.section_count
     tone        = cfg.tone
-    word_target = cfg.total_word_target
 
     # Per-section word budget (we leave a small overhead for title / glue)
-    per_section_words = cfg.words_per_section
+    per_section_words = per_section_words or cfg.words_per_section
+    word_target = n_sections * per_section_words
 
     # Output-type specific guidance
     output_guidance = {
@@ -313,25 +652,195 @@ Output MUST strictly match the Plan schema.
 """
 
 
+def _plan_size(remaining: Optional[float]):
+    """(n_sections, words_per_section, degradations) that fit the remaining budget."""
+    n, words = cfg.section_count, cfg.words_per_section
+    if remaining is None:
+        return n, words, []
+    cuts = []
+    for_workers = remaining - PLAN_EST_S
+    if for_workers < FEW_SECTIONS_S and n > 3:
+        n = 3
+        cuts.append(f"Reduced to 3 sections ({remaining:.0f}s left)")
+    est = _estimate_section_seconds(words)
+    if for_workers < est:
+        scaled = max(WORDS_FLOOR, int(words * max(for_workers, 0.0) / est) // 10 * 10)
+        if scaled < words:
+            words = scaled
+            cuts.append(f"Shortened sections to ~{words} words")
+    return n, words, cuts
+
+
 def orchestrator_node(state: State) -> dict:
-    planner = get_llm().with_structured_output(Plan)
+    if state.get("plan") is not None:
+        return {}               # already planned by plan_batch
     evidence = state.get("evidence", [])
     mode     = state.get("mode", "closed_book")
+    remaining = _remaining(state)
+    n_sections, words, degradations = _plan_size(remaining)
 
-    plan = planner.invoke([
-        SystemMessage(content=_build_orch_system()),
+    ok, planned = _within(remaining, lambda: _invoke("orchestrator", [
+        SystemMessage(content=_build_orch_system(n_sections, words)),
         HumanMessage(content=(
             f"Topic: {state['topic']}\n"
             f"Mode: {mode}\n"
             f"Output type: {cfg.output_type}\n"
             f"Tone: {cfg.tone}\n"
-            f"Total word target: {cfg.total_word_target} ({cfg.section_count} sections x {cfg.words_per_section} words each)\n\n"
+            f"Total word target: {n_sections * words} ({n_sections} sections x {words} words each)\n\n"
             f"Evidence (ONLY use for fresh claims; may be empty):\n"
             f"{[e.model_dump() for e in evidence][:16]}"
         )),
-    ])
+    ], Plan, max_output_tokens=plan_token_ceiling(n_sections),
+       hints={"blog_title": state["topic"], "tone": cfg.tone, "target_words": str(words)}), "orchestrator")
+    if not ok:
+        # No outline in time: hand the reducer an empty plan so the run still completes.
+        plan = Plan(blog_title=state["topic"], audience="General", tone=cfg.tone, tasks=[])
+        return {"plan": plan, "degradations": degradations + [f"Planner timed out{_cut_off(planned)} — no sections written"]}
+    plan, call = planned
+
+    return {
+        "plan": plan,
+        "section_words": words if words < cfg.words_per_section else None,
+        "llm_calls": [call],
+        "degradations": degradations,
+    }
+
 
-    return {"plan": plan}
+# ═════════════════════════════════════════════════════════════════════════════
+# BATCH PLANNING  — route + plan several topics per LLM call for bulk jobs
+# ═════════════════════════════════════════════════════════════════════════════
+# Router and planner prompts are small, so per topic the round trip dominates.
+# plan_batch routes a chunk of topics in one structured call and plans the
+# closed-book ones in the same reply; research topics are planned after research
+# as usual. Anything the batched reply doesn't cover validly falls back to the
+# normal single-topic router/planner path inside the graph.
+
+BATCH_PLAN_SYSTEM = """
+You route and plan several topics at once. Topics are numbered; return exactly one
+entry per topic with its topic_no.
+
+For each topic, first decide routing exactly as this routing module would:
+{router}
+Then, ONLY if mode is closed_book, also return its plan following the outline rules
+below (evidence is empty). For hybrid/open_book leave plan null; it is planned after research.
+
+Outline rules:
+{orchestrator}
+Output MUST strictly match the BatchPlan schema.
+"""
+
+
+def _apply_route_policy(topic: str, needs_research: bool, mode: str, queries: List[str]) -> dict:
+    # Same depth overrides as router_node.
+    if cfg.depth_level == "Quick":
+        return {"needs_research": False, "mode": "closed_book", "queries": []}
+    if cfg.depth_level == "Exhaustive":
+        return {"needs_research": True, "mode": cfg.router_hint()["mode"], "queries": queries or [topic]}
+    return {"needs_research": needs_research, "mode": mode, "queries": queries}
+
+
+def plan_batch(topics: List[str], batch_size: Optional[int] = None) -> List[dict]:
+    """Initial graph states for `topics`, routed (and planned when closed-book) in batches.
+
+    Makes one orchestrator-model call per `batch_size` topics (ACE_PLAN_BATCH_SIZE).
+    Each returned state is ready for `app.invoke`. A topic whose entry is missing or
+    invalid comes back as plain {"topic": ...} and takes the single-topic path.
+    The batch call's cost is split evenly across the topics it covered.
+    """
+    size = max(1, batch_size or cfg.plan_batch_size)
+    states: List[dict] = [{"topic": t} for t in topics]
+    if size == 1:
+        return states
+    n_sections, words = cfg.section_count, cfg.words_per_section
+    system = BATCH_PLAN_SYSTEM.format(router=ROUTER_SYSTEM, orchestrator=_build_orch_system(n_sections, words))
+
+    for start in range(0, len(topics), size):
+        chunk = topics[start:start + size]
+        listing = "\n".join(f"{i + 1}. {t}" for i, t in enumerate(chunk))
+        try:
+            batch, call = _invoke("orchestrator", [
+                SystemMessage(content=system),
+                HumanMessage(content=(
+                    f"Output type: {cfg.output_type}\n"
+                    f"Tone: {cfg.tone}\n"
+                    f"Per topic: {n_sections} sections x {words} words each\n\n"
+                    f"Topics:\n{listing}"
+                )),
+            ], BatchPlan, max_output_tokens=ROUTER_MAX_TOKENS * len(chunk) + plan_token_ceiling(n_sections) * len(chunk),
+               hints={"tone": cfg.tone, "target_words": str(words)})
+        except Exception:
+            continue            # whole chunk falls back to single-topic calls
+
+        covered = {}
+        for entry in batch.topics:
+            if 1 <= entry.topic_no <= len(chunk) and entry.topic_no not in covered:
+                covered[entry.topic_no] = entry
+        n = max(1, len(covered))
+        share = {
+            **call, "node": "batch_plan", "batched": len(covered),
+            "seconds":       round(call["seconds"] / n, 3),
+            "input_tokens":  call["input_tokens"] // n,
+            "output_tokens": call["output_tokens"] // n,
+            "cost_usd":      call["cost_usd"] / n,
+        }
+        for no, entry in covered.items():
+            topic = chunk[no - 1]
+            state = {"topic": topic, "llm_calls": [share],
+                     **_apply_route_policy(topic, entry.needs_research, entry.mode, entry.queries)}
+            if state["mode"] == "closed_book" and entry.plan is not None and entry.plan.tasks:
+                state["plan"] = entry.plan
+            states[start + no - 1] = state
+    return states
+
+
+def _late_records(finished: list, unfinished: list) -> list:
+    calls = [{**record, "late": info["late"]} for (_, record), info in finished]
+    calls += [{"node": info["node"], "model": info["model"], "seconds": 0.0, "input_tokens": 0,
+               "output_tokens": 0, "cost_usd": 0.0, "late": info["late"], "unfinished": True}
+              for info in unfinished]
+    return calls
+
+
+def stream(run_input: dict, on_late=None):
+    """`app.stream(run_input, stream_mode="updates")`, plus a last {"late_calls": {"llm_calls": [...]}}
+    update for calls that outlived their node (hedge losers, calls cut off by the deadline)
+    and had already finished when the graph did, so the run's cost includes them.
+
+    The stream never waits for late calls. Those still running are waited for in the
+    background, up to ACE_LATE_CALL_WAIT, and passed to `on_late(llm_calls)`; a call
+    still running then is reported with `unfinished: True` and no usage.
+    """
+    rest = None if on_late is None else (lambda f, u: on_late(_late_records(f, u)))
+    with ace_hedge.collect_late() as late:
+        try:
+            yield from app.stream(run_input, stream_mode="updates")
+        except BaseException:
+            # Failed or abandoned by the consumer: nothing more is yielded, so every late call goes to on_late.
+            done = late.settle(cfg.late_call_wait, rest)
+            if done and on_late is not None:
+                on_late(_late_records(done, []))
+            raise
+    calls = _late_records(late.settle(cfg.late_call_wait, rest), [])
+    if calls:
+        yield {"late_calls": {"llm_calls": calls}}
+
+
+def run_batch(topics: List[str], max_concurrency: int = 4, return_exceptions: bool = False) -> List:
+    """Generate every topic: batched planning, then the graph per topic (concurrently).
+    Images (ACE_IMAGES=1) are placed into each `final` once ready, up to ACE_IMAGE_WAIT.
+    With return_exceptions=True a failed topic yields its exception instead of aborting all."""
+    with ace_metrics.run(len(topics)):
+        results = app.batch(plan_batch(topics), config={"max_concurrency": max_concurrency},
+                            return_exceptions=return_exceptions)
+    for r in results:
+        if isinstance(r, dict) and r.get("images"):
+            r["final"], _ = ace_images.place(r["final"], r["images"], cfg.image_wait)
+    return results
+
+
+def entry_route(state: State) -> str:
+    # Pre-routed states (from plan_batch) skip the router.
+    return "router" if "mode" not in state else route_next(state)
 
 
 # ═════════════════════════════════════════════════════════════════════════════
@@ -391,19 +900,32 @@ Style:
 
 
 def fanout(state: State):
-    return [
-        Send(
+    if not state["plan"].tasks:
+        return "reducer"        # planner ran out of time — assemble what we have
+    # One BM25 index per run; each section gets only the evidence that matches it.
+    index = ace_evidence.EvidenceIndex([e.model_dump() for e in state.get("evidence", [])])
+    plan = state["plan"].model_dump()
+    sends = []
+    for task in state["plan"].tasks:
+        task = task.model_dump()
+        sends.append(Send(
             "worker",
             {
-                "task":     task.model_dump(),
-                "topic":    state["topic"],
-                "mode":     state["mode"],
-                "plan":     state["plan"].model_dump(),
-                "evidence": [e.model_dump() for e in state.get("evidence", [])],
+                "task":          task,
+                "topic":         state["topic"],
+                "mode":          state["mode"],
+                "plan":          plan,
+                "evidence":      index.top_k(task, cfg.evidence_per_section),
+                "deadline":      state.get("deadline"),
+                "section_words": state.get("section_words"),
             },
-        )
-        for task in state["plan"].tasks
-    ]
+        ))
+    if cfg.images_enabled and cfg.max_images > 0:
+        # Runs alongside the workers: plans images from the outline, then hands generation
+        # to ace_images' background pool, so the text never waits on image bytes.
+        sends.append(Send("images", {"topic": state["topic"], "plan": plan, "deadline": state.get("deadline")}))
+    ace_metrics.fanout_sent(len(sends))
+    return sends
 
 
 def worker_node(payload: dict) -> dict:
@@ -412,6 +934,12 @@ def worker_node(payload: dict) -> dict:
     evidence = [EvidenceItem(**e) for e in payload.get("evidence", [])]
     topic    = payload["topic"]
     mode     = payload.get("mode", "closed_book")
+    words    = payload.get("section_words")
+    skipped  = f"## {task.title}\n\n*This section was not generated: the time budget ran out.*"
+
+    remaining = _remaining(payload)
+    if remaining is not None and remaining <= 0:
+        return {"sections": [(task.id, skipped)], "degradations": [f"Skipped section: {task.title}"]}
 
     bullets_text = "\n -" + "\n -".join(task.bullets)
 
@@ -422,7 +950,7 @@ def worker_node(payload: dict) -> dict:
             for e in evidence[:20]
         )
 
-    section_md = get_llm().invoke([
+    messages = [
         SystemMessage(content=_build_worker_system()),
         HumanMessage(content=(
             f"Blog title: {plan.blog_title}\n"
@@ -434,7 +962,7 @@ def worker_node(payload: dict) -> dict:
             f"Mode: {mode}\n\n"
             f"Section title: {task.title}\n"
             f"Goal: {task.goal}\n"
-            f"Target words: {task.target_words}\n"
+            f"Target words: {words or task.target_words}\n"
             f"Tags: {task.tags}\n"
             f"requires_research: {task.requires_research}\n"
             f"requires_citations: {task.requires_citations}\n"
@@ -442,9 +970,111 @@ def worker_node(payload: dict) -> dict:
             f"Bullets:{bullets_text}\n\n"
             f"Evidence (ONLY use these URLs when citing):\n{evidence_text}\n"
         )),
-    ]).content.strip()
+    ]
+    ok, written = _invoke_section(messages, section_token_ceiling(task, words), remaining)
+    if not ok:
+        return {"sections": [(task.id, skipped)], "degradations": [f"Section timed out{_cut_off(written)}: {task.title}"]}
+    message, call = written
+    section_md = message.content.strip()
+
+    return {"sections": [(task.id, section_md)], "llm_calls": [call]}
+
+
+def _invoke_section(messages: list, max_output_tokens: int, remaining: Optional[float] = None):
+    """Worker call, hedged when ACE_HEDGE is on and enough latency history exists.
+
+    Returns (True, (message, call)), or (False, reason) if `remaining` seconds run out
+    (reason as in `_within`, or "rate_limit" if no limiter token came in time). The
+    primary's token is waited for within the deadline. The hedge takes one without
+    waiting; if none is free it is skipped, so hedging never pushes the process over
+    ACE_LLM_RPM. The deadline is applied inside the hedged call rather than around it,
+    so the two never wait on each other's threads.
+    """
+    model = cfg.model_for("worker")
+    delay = ace_hedge.hedge_delay(model, cfg.hedge_percentile) if cfg.hedge_enabled else None
+
+    def attempt(primary: bool, acquire: bool = False):
+        message, call = _invoke("worker", messages, max_output_tokens=max_output_tokens, acquire=acquire)
+        if primary:
+            # The primary's own latency, also when a hedge beat it or the deadline passed:
+            # recording only winners would pull the percentile down and make hedges fire
+            # ever earlier.
+            ace_hedge.record_latency(model, call["seconds"])
+        return message, call
+
+    limiter = ace_ratelimit.limiter("llm", cfg.llm_rpm)
+    if remaining is not None:
+        # Wait for the token here, bounded by the deadline: a call abandoned while still
+        # waiting for it would otherwise go out after the run has moved on.
+        t0 = time.monotonic()
+        if not limiter.acquire(timeout=remaining):
+            return False, "rate_limit"
+        remaining = max(0.0, remaining - (time.monotonic() - t0))
+    if delay is None:
+        return _within(remaining, lambda: attempt(True, acquire=remaining is None), "worker")
+
+    if remaining is None:
+        limiter.acquire()
+    try:
+        (message, call), hedged, won = ace_hedge.hedged_call(
+            lambda: attempt(True),
+            delay,
+            limiter.try_acquire,
+            hedge=lambda: attempt(False),
+            info={"node": "worker", "model": model},
+            timeout=remaining,
+        )
+    except ace_hedge.Starved:
+        return False, "starved"
+    except TimeoutError:
+        return False, None
+    return True, (message, {**call, "hedged": hedged, "hedge_won": won})
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# IMAGES  — optional (ACE_IMAGES=1); planned from the outline, generated in background
+# ═════════════════════════════════════════════════════════════════════════════
 
-    return {"sections": [(task.id, section_md)]}
+IMAGES_SYSTEM = """You are an expert technical editor.
+Decide if images/diagrams would help THIS document, based on its outline.
+
+Rules:
+- At most {max_images} images in total; zero is fine.
+- Each image must materially improve understanding (diagram/flow/table-like visual).
+- Attach each image to the section it illustrates via section_id.
+- Avoid decorative images; prefer technical diagrams with short labels.
+Return strictly ImagePlan.
+"""
+
+
+def images_node(payload: dict) -> dict:
+    plan = Plan(**payload["plan"])
+    remaining = _remaining(payload)
+    if remaining is not None and remaining < IMAGES_MIN_S:
+        return {"images": [], "degradations": [f"Skipped images ({remaining:.0f}s left)"]}
+
+    outline = "\n".join(f"{t.id}. {t.title} — {t.goal}" for t in plan.tasks)
+    ok, planned = _within(remaining, lambda: _invoke("images", [
+        SystemMessage(content=IMAGES_SYSTEM.format(max_images=cfg.max_images)),
+        HumanMessage(content=(
+            f"Title: {plan.blog_title}\n"
+            f"Blog kind: {plan.blog_kind}\n"
+            f"Topic: {payload['topic']}\n\n"
+            f"Sections:\n{outline}"
+        )),
+    ], ImagePlan, max_output_tokens=300 * cfg.max_images + 100), "images")
+    if not ok:
+        return {"images": [], "degradations": [f"Image planning timed out{_cut_off(planned)} — no images"]}
+    image_plan, call = planned
+
+    section_ids = {t.id for t in plan.tasks}
+    images = []
+    for spec in image_plan.images[:cfg.max_images]:
+        if spec.section_id not in section_ids:
+            continue
+        key = ace_images.submit(spec.prompt, size=spec.size)
+        images.append({**spec.model_dump(), "key": key})
+    return {"images": images, "llm_calls": [call]}
 
 
 # ═════════════════════════════════════════════════════════════════════════════
@@ -453,8 +1083,15 @@ def worker_node(payload: dict) -> dict:
 
 def reducer_node(state: State) -> dict:
     plan = state["plan"]
-    ordered = [md for _, md in sorted(state["sections"], key=lambda x: x[0])]
-    body = "\n\n".join(ordered).strip()
+    # Image markers go after their section; ace_images.place() fills them in later.
+    markers: dict = {}
+    for img in state.get("images") or []:
+        markers.setdefault(img["section_id"], []).append(ace_images.MARKER.format(key=img["key"]))
+    ordered = [
+        "\n\n".join([md, *markers.get(tid, [])])
+        for tid, md in sorted(state.get("sections", []), key=lambda x: x[0])
+    ]
+    body = "\n\n".join(ordered).strip() or "*No sections were generated within the time budget.*"
     final_md = f"# {plan.blog_title}\n\n{body}\n"
 
     filename = "".join(
@@ -470,18 +1107,25 @@ def reducer_node(state: State) -> dict:
 # GRAPH
 # ═════════════════════════════════════════════════════════════════════════════
 
-G = StateGraph(State)
-G.add_node("router",       router_node)
-G.add_node("research",     research_node)
-G.add_node("orchestrator", orchestrator_node)
-G.add_node("worker",       worker_node)
-G.add_node("reducer",      reducer_node)
+def _node(name: str, fn, fanned_out: bool = False):
+    """Graph node with opt-in profiling (ace_profile) and latency metrics (ace_metrics)."""
+    return ace_profile.wrap(name, ace_metrics.wrap(name, fn, fanned_out))
+
 
-G.add_edge(START, "router")
+G = StateGraph(State)
+G.add_node("router",       _node("router", router_node))
+G.add_node("research",     _node("research", research_node))
+G.add_node("orchestrator", _node("orchestrator", orchestrator_node))
+G.add_node("worker",       _node("worker", worker_node, fanned_out=True))
+G.add_node("images",       _node("images", images_node, fanned_out=True))
+G.add_node("reducer",      _node("reducer", reducer_node))
+
+G.add_conditional_edges(START, entry_route, {"router": "router", "research": "research", "orchestrator": "orchestrator"})
 G.add_conditional_edges("router", route_next, {"research": "research", "orchestrator": "orchestrator"})
 G.add_edge("research", "orchestrator")
-G.add_conditional_edges("orchestrator", fanout, ["worker"])
+G.add_conditional_edges("orchestrator", fanout, ["worker", "images", "reducer"])
 G.add_edge("worker", "reducer")
+G.add_edge("images", "reducer")
 G.add_edge("reducer", END)
 
 app = G.compile()
\ No newline at end of file
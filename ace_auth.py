@@ -0,0 +1,216 @@
+"""
+ace_auth.py — Passwords and session tokens for the Streamlit app
+bcrypt runs on a bounded worker pool so a sign-in storm queues (or is turned away)
+instead of saturating every core. Sessions embed a small user snapshot so a token
+resolves in one query, and validated tokens are kept in a bounded in-process TTL cache.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+from bson import ObjectId
+
+import ace_metrics
+from ace_config import cfg
+
+SESSION_DAYS = 30
+TOKEN_CACHE_TTL = 300        # seconds a validated token is trusted without a DB read
+TOKEN_CACHE_SIZE = 1024
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# PASSWORD HASHING
+# ═════════════════════════════════════════════════════════════════════════════
+
+class AuthBusy(RuntimeError):
+    """Raised when every bcrypt worker is busy and the wait queue is full."""
+
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+_check_seconds = None        # EWMA of bcrypt.checkpw time (inside the pool job), paces unknown-email rejects
+_check_fastest = None        # fastest check seen: a solo check on this host
+_check_lock = threading.Lock()
+_REJECT_CAP = 3              # a reject never waits longer than this many solo checks
+_dummy_hash = None
+
+
+def _submit(fn, *args):
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = max(1, cfg.bcrypt_workers)
+                _slots = threading.BoundedSemaphore(workers + max(0, cfg.bcrypt_queue))
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ace-bcrypt")
+    if not _slots.acquire(blocking=False):
+        raise AuthBusy("Too many sign-ins in progress — please retry in a few seconds.")
+    try:
+        fut = _pool.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    fut.add_done_callback(lambda _: _slots.release())
+    return fut.result()
+
+
+# bcrypt is imported on first use: resolving a session token never needs it.
+
+def hash_pw(pw: str) -> str:
+    import bcrypt
+    return _submit(bcrypt.hashpw, pw.encode(), bcrypt.gensalt(rounds=cfg.bcrypt_rounds)).decode()
+
+
+def _timed_checkpw(pw: bytes, hashed: bytes) -> bool:
+    # Runs on the pool and times only bcrypt itself: time spent queued for a worker
+    # must not leak into the reject delay, or a burst would make rejects slower than checks.
+    global _check_seconds, _check_fastest
+    import bcrypt
+    t0 = time.perf_counter()
+    ok = bcrypt.checkpw(pw, hashed)
+    took = time.perf_counter() - t0
+    with _check_lock:
+        _check_seconds = took if _check_seconds is None else 0.8 * _check_seconds + 0.2 * took
+        _check_fastest = took if _check_fastest is None else min(_check_fastest, took)
+    return ok
+
+
+def check_pw(pw: str, hashed: str) -> bool:
+    return _submit(_timed_checkpw, pw.encode(), hashed.encode())
+
+
+def reject_unknown_email():
+    """Spend as long as a real password check would, without burning bcrypt CPU.
+
+    The wait runs as a job on the bcrypt pool, so an unknown email queues, and is turned
+    away with AuthBusy, exactly like a known one: load never reveals whether an account
+    exists. The wait itself is the recent bcrypt time, capped at _REJECT_CAP solo checks.
+    Until a real check has been timed, one check against a dummy hash seeds the estimate.
+    """
+    global _dummy_hash
+    if _check_seconds is None:
+        if _dummy_hash is None:
+            _dummy_hash = hash_pw(secrets.token_urlsafe(16))
+        check_pw(secrets.token_urlsafe(16), _dummy_hash)
+        return
+    with _check_lock:
+        seconds = min(_check_seconds, _REJECT_CAP * _check_fastest)
+    _submit(time.sleep, seconds)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SESSIONS
+# ═════════════════════════════════════════════════════════════════════════════
+
+class _TokenCache:
+    """Small LRU of token -> (user, expires_monotonic). Thread-safe: Streamlit runs sessions in threads."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            hit = self._data.get(token)
+            if hit is None:
+                return None
+            user, expires = hit
+            if expires <= time.monotonic():
+                del self._data[token]
+                return None
+            self._data.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: dict, session_expires_at: datetime):
+        # Never trust a cached token past the session's own expiry.
+        remaining = (session_expires_at - datetime.now(timezone.utc)).total_seconds()
+        ttl = min(self.ttl, remaining)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[token] = (user, time.monotonic() + ttl)
+            self._data.move_to_end(token)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, token: str):
+        with self._lock:
+            self._data.pop(token, None)
+
+
+_cache = _TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+
+def _snapshot(user: dict) -> dict:
+    return {"name": user["name"], "email": user["email"]}
+
+
+def create_session(db, user: dict, writer=None) -> str:
+    """Create a session token. With a `writer` the insert is queued; the token is
+    primed in the cache either way, so this process resolves it before the write lands."""
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    session = {
+        "token": token,
+        "user_id": str(user["_id"]),
+        "user": _snapshot(user),
+        "created_at": now,
+        "expires_at": now + timedelta(days=SESSION_DAYS),
+    }
+    if writer is not None:
+        writer.insert("sessions", session)
+    else:
+        db["sessions"].insert_one(session)
+    _cache.put(token, {"_id": ObjectId(session["user_id"]), **session["user"]}, session["expires_at"])
+    return token
+
+
+def get_user_from_token(db, token: str):
+    """Resolve a token to `{"_id", "name", "email"}` or None.
+
+    Cache hit: no DB access. Miss: one `sessions` read. Sessions created before the
+    snapshot existed fall back to a `users` read once and are backfilled.
+    """
+    if not token:
+        return None
+    cached = _cache.get(token)
+    ace_metrics.cache("session", hits=int(cached is not None), misses=int(cached is None))
+    if cached is not None:
+        return cached
+
+    with ace_metrics.mongo_op("get_user_from_token"):      # cache misses only
+        session = db["sessions"].find_one({"token": token, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        if not session:
+            return None
+        snap = session.get("user")
+        if not snap:
+            found = db["users"].find_one({"_id": ObjectId(session["user_id"])}, {"name": 1, "email": 1})
+            if not found:
+                return None
+            snap = _snapshot(found)
+            db["sessions"].update_one({"_id": session["_id"]}, {"$set": {"user": snap}})
+
+    user = {"_id": ObjectId(session["user_id"]), **snap}
+    expires_at = session["expires_at"]
+    if expires_at.tzinfo is None:            # pymongo returns naive UTC unless tz_aware=True
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    _cache.put(token, user, expires_at)
+    return user
+
+
+def delete_session(db, token: str, writer=None):
+    # Goes through the same writer as create_session, so a sign-out can't overtake the
+    # queued insert and leave the token valid once the insert lands.
+    if token:
+        _cache.discard(token)
+        if writer is not None:
+            writer.delete("sessions", {"token": token})
+        else:
+            db["sessions"].delete_one({"token": token})
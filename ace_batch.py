@@ -0,0 +1,108 @@
+"""
+ace_batch.py — Multi-process batch generation for large backfills
+Threads in one process share the GIL for the CPU-side work (pydantic validation,
+prompt building, Markdown assembly), so backfills fan out over processes. Every
+process runs ACE_backend.run_batch on a chunk of topics. They all draw from
+shared Gemini/Tavily rate limiters, so the total request rate stays within
+ACE_LLM_RPM / ACE_TAVILY_RPM however many processes run. A shared search cache
+means a query is fetched once per backfill. Duplicate topics are generated once.
+
+    python ace_batch.py topics.txt --processes 4 --out results.jsonl
+    ACE_PROVIDER=fake python ace_batch.py topics.txt        # offline dry run
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ace_ratelimit
+from ace_config import cfg
+
+_backend = None
+
+
+def _init_worker(limiters: dict, search_cache):
+    global _backend
+    for name, lim in limiters.items():
+        ace_ratelimit.install(name, lim)
+    _backend = importlib.import_module("ACE_backend")
+    _backend.SEARCH_CACHE = search_cache
+
+
+def _portable(result) -> dict:
+    # Plain JSON types only: results cross a process boundary and go to JSONL.
+    if isinstance(result, BaseException):
+        return {"error": f"{type(result).__name__}: {result}"}
+    plan = result.get("plan")
+    return {
+        "final":        result.get("final", ""),
+        "blog_title":   plan.blog_title if plan is not None else "",
+        "mode":         result.get("mode", ""),
+        "degradations": result.get("degradations", []),
+        "run_stats":    _backend.summarize_llm_calls(result.get("llm_calls", [])),
+    }
+
+
+def _run_chunk(topics: list, concurrency: int) -> list:
+    results = _backend.run_batch(topics, max_concurrency=concurrency, return_exceptions=True)
+    return [_portable(r) for r in results]
+
+
+def run_parallel(topics: list, processes: int = None, concurrency: int = 4, chunk_size: int = None) -> list:
+    """Generate `topics` across `processes` worker processes; results in input order.
+
+    Each result is {"topic", "final", "blog_title", "mode", "degradations", "run_stats"}
+    or {"topic", "error"}. `concurrency` is graph runs in flight per process;
+    `chunk_size` defaults to ACE_PLAN_BATCH_SIZE so each chunk is one batched planning call.
+    """
+    processes = processes or os.cpu_count() or 1
+    chunk_size = max(1, chunk_size or cfg.plan_batch_size)
+    unique = list(dict.fromkeys(topics))
+    chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+
+    ctx = multiprocessing.get_context("spawn")     # no forked copies of pools/locks held by threads
+    with ctx.Manager() as manager:
+        limiters = {
+            "llm":    ace_ratelimit.SharedRateLimiter(cfg.llm_rpm, ctx=ctx),
+            "tavily": ace_ratelimit.SharedRateLimiter(cfg.tavily_rpm, ctx=ctx),
+        }
+        with ProcessPoolExecutor(max_workers=processes, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(limiters, manager.dict())) as pool:
+            futures = [pool.submit(_run_chunk, chunk, concurrency) for chunk in chunks]
+            by_topic = {}
+            for chunk, fut in zip(chunks, futures):
+                try:
+                    outs = fut.result()
+                except Exception as e:              # worker crashed: report the whole chunk
+                    outs = [{"error": f"{type(e).__name__}: {e}"}] * len(chunk)
+                by_topic.update(zip(chunk, outs))
+    return [{"topic": t, **by_topic[t]} for t in topics]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate one document per line of a topics file.")
+    ap.add_argument("topics", help="text file, one topic per line")
+    ap.add_argument("--processes", type=int, default=os.cpu_count())
+    ap.add_argument("--concurrency", type=int, default=4, help="graph runs in flight per process")
+    ap.add_argument("--out", default="-", help="JSONL output path (default stdout)")
+    args = ap.parse_args()
+
+    with open(args.topics, encoding="utf-8") as f:
+        topics = [line.strip() for line in f if line.strip()]
+    t0 = time.perf_counter()
+    results = run_parallel(topics, processes=args.processes, concurrency=args.concurrency)
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    for r in results:
+        out.write(json.dumps(r, ensure_ascii=False) + "\n")
+    if out is not sys.stdout:
+        out.close()
+    failed = sum("error" in r for r in results)
+    print(f"{len(results)} topics, {failed} failed, {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,11 @@ ACE_backend.py imports from here — reads env at property-access time → alway
 """
 import os
 
+from dotenv import load_dotenv
+
+# The one place .env is loaded. override=False: never replaces values app.py set at runtime.
+load_dotenv(override=False)
+
 
 class AceConfig:
 
@@ -43,10 +48,227 @@ class AceConfig:
     def extra_instruction(self) -> str:
         return os.environ.get("ACE_EXTRA_INSTRUCTION", "")
 
+    # ── Model tiering ────────────────────────────────────────────────────────
+    # Short structured calls (router, research extraction) go to the cheapest model;
+    # writing gets stronger models as depth grows. ACE_MODEL_<NODE> overrides.
+    DEPTH_MODELS = {
+        "Quick":      {"router": "gemini-2.5-flash-lite", "research": "gemini-2.5-flash-lite",
+                       "orchestrator": "gemini-2.5-flash-lite", "worker": "gemini-2.5-flash",
+                       "images": "gemini-2.5-flash-lite"},
+        "Balanced":   {"router": "gemini-2.5-flash-lite", "research": "gemini-2.5-flash-lite",
+                       "orchestrator": "gemini-2.5-flash", "worker": "gemini-2.5-flash",
+                       "images": "gemini-2.5-flash-lite"},
+        "Deep":       {"router": "gemini-2.5-flash-lite", "research": "gemini-2.5-flash-lite",
+                       "orchestrator": "gemini-2.5-pro", "worker": "gemini-2.5-flash",
+                       "images": "gemini-2.5-flash-lite"},
+        "Exhaustive": {"router": "gemini-2.5-flash-lite", "research": "gemini-2.5-flash",
+                       "orchestrator": "gemini-2.5-pro", "worker": "gemini-2.5-pro",
+                       "images": "gemini-2.5-flash"},
+    }
+
+    def model_for(self, node: str) -> str:
+        """Model for one pipeline stage: router | research | orchestrator | worker | images."""
+        override = os.environ.get(f"ACE_MODEL_{node.upper()}", "").strip()
+        if override:
+            return override
+        defaults = self.DEPTH_MODELS.get(self.depth_level, self.DEPTH_MODELS["Balanced"])
+        return defaults.get(node, "gemini-2.5-flash")
+
+    @property
+    def output_headroom(self) -> float:
+        """Multiplier on the expected output size when setting max_output_tokens."""
+        return float(os.environ.get("ACE_OUTPUT_HEADROOM", "1.5"))
+
+    @property
+    def provider(self) -> str:
+        """google (Gemini + Tavily) | fake (ace_fakes.py, offline)."""
+        return os.environ.get("ACE_PROVIDER", "google").lower()
+
+    # ── Rate limits & hedging ────────────────────────────────────────────────
+    @property
+    def llm_rpm(self) -> float:
+        """Gemini requests/minute for this process (0 = unlimited)."""
+        return float(os.environ.get("ACE_LLM_RPM", "0"))
+
+    @property
+    def tavily_rpm(self) -> float:
+        """Tavily requests/minute for this process (0 = unlimited)."""
+        return float(os.environ.get("ACE_TAVILY_RPM", "0"))
+
+    @property
+    def hedge_enabled(self) -> bool:
+        """Issue a duplicate worker call when a section runs past the hedge percentile."""
+        return os.environ.get("ACE_HEDGE", "0").lower() in ("1", "true", "yes")
+
+    @property
+    def hedge_percentile(self) -> float:
+        return float(os.environ.get("ACE_HEDGE_PERCENTILE", "90"))
+
+    @property
+    def call_threads(self) -> int:
+        """Threads in each of the hedged and deadline call pools. Abandoned calls hold theirs
+        until their request returns; idle threads are only started when needed."""
+        return int(os.environ.get("ACE_CALL_THREADS", "256"))
+
+    @property
+    def late_call_wait(self) -> float:
+        """Seconds abandoned calls (hedge losers, timeouts) are waited for, in the background
+        after a run, to report their cost."""
+        return float(os.environ.get("ACE_LATE_CALL_WAIT", "10"))
+
+    @property
+    def evidence_per_section(self) -> int:
+        """Evidence items sent to each section, picked by BM25 relevance (0 = all, up to 20)."""
+        return int(os.environ.get("ACE_EVIDENCE_PER_SECTION", "6"))
+
+    @property
+    def evidence_ttl_hours(self) -> float:
+        """How long extracted evidence stays reusable in the shared store (0 = don't store)."""
+        return float(os.environ.get("ACE_EVIDENCE_TTL_H", "72"))
+
+    @property
+    def plan_batch_size(self) -> int:
+        """Topics routed/planned per LLM call by ACE_backend.plan_batch (1 = no batching)."""
+        return int(os.environ.get("ACE_PLAN_BATCH_SIZE", "5"))
+
+    # ── Profiling (read by ace_profile.py) ───────────────────────────────────
+    @property
+    def profile_mode(self) -> str:
+        """'' (off) | sample | cprofile; "1" means sample."""
+        return os.environ.get("ACE_PROFILE", "")
+
+    @property
+    def profile_dir(self) -> str:
+        return os.environ.get("ACE_PROFILE_DIR", "profiles")
+
+    @property
+    def profile_interval_ms(self) -> float:
+        return float(os.environ.get("ACE_PROFILE_INTERVAL_MS", "5"))
+
+    # ── Metrics (read by ace_metrics.py) ─────────────────────────────────────
+    @property
+    def metrics_port(self) -> int:
+        """Port for the Prometheus /metrics endpoint; 0 = not served."""
+        return int(os.environ.get("ACE_METRICS_PORT", "0"))
+
+    @property
+    def metrics_addr(self) -> str:
+        return os.environ.get("ACE_METRICS_ADDR", "0.0.0.0")
+
+    # ── Per-user quotas (read by ace_quota.py) ───────────────────────────────
+    # Deeper runs cost more per call, so they get fewer runs per minute and more
+    # tokens per day. ACE_QUOTA_RUNS_PER_MIN[_<DEPTH>] / ACE_QUOTA_TOKENS_PER_DAY[_<DEPTH>]
+    # override; 0 = unlimited.
+    DEPTH_QUOTAS = {
+        "Quick":      {"runs_per_min": 6, "tokens_per_day": 500_000},
+        "Balanced":   {"runs_per_min": 4, "tokens_per_day": 1_000_000},
+        "Deep":       {"runs_per_min": 2, "tokens_per_day": 1_500_000},
+        "Exhaustive": {"runs_per_min": 1, "tokens_per_day": 2_000_000},
+    }
+
+    @property
+    def quota_enabled(self) -> bool:
+        return os.environ.get("ACE_QUOTA", "1").lower() in ("1", "true", "yes")
+
+    @property
+    def quota_own_key(self) -> bool:
+        """Also limit users who generate with their own Gemini key (default: only server-key users)."""
+        return os.environ.get("ACE_QUOTA_OWN_KEY", "0").lower() in ("1", "true", "yes")
+
+    def quota_for(self, depth: str) -> dict:
+        """{"runs_per_min", "tokens_per_day"} for one depth level."""
+        defaults = self.DEPTH_QUOTAS.get(depth, self.DEPTH_QUOTAS["Balanced"])
+        out = {}
+        for key, value in defaults.items():
+            env = f"ACE_QUOTA_{key.upper()}"
+            out[key] = float(os.environ.get(f"{env}_{depth.upper()}") or os.environ.get(env) or value)
+        return out
+
+    # ── Job queue (read by ace_jobs.py) ──────────────────────────────────────
+    @property
+    def job_queue(self) -> bool:
+        """Generate through the Mongo `jobs` queue (ace_jobs workers) instead of in the app process."""
+        return os.environ.get("ACE_JOB_QUEUE", "0").lower() in ("1", "true", "yes")
+
+    @property
+    def job_lease(self) -> float:
+        """Seconds a claimed job stays leased without a heartbeat before another worker may take it."""
+        return float(os.environ.get("ACE_JOB_LEASE", "60"))
+
+    @property
+    def job_max_attempts(self) -> int:
+        """Attempts (failures or expired leases) before a job is dead-lettered."""
+        return int(os.environ.get("ACE_JOB_MAX_ATTEMPTS", "3"))
+
+    @property
+    def job_wait(self) -> float:
+        """Seconds the app follows a queued job before handing back with its status."""
+        return float(os.environ.get("ACE_JOB_WAIT", "900"))
+
+    @property
+    def job_claim_wait(self) -> float:
+        """Seconds the app waits for any worker to claim a new job (none claiming = no workers)."""
+        return float(os.environ.get("ACE_JOB_CLAIM_WAIT", "60"))
+
+    # ── Images (read by ACE_backend images stage and ace_images.py) ──────────
+    @property
+    def images_enabled(self) -> bool:
+        return os.environ.get("ACE_IMAGES", "0").lower() in ("1", "true", "yes")
+
+    @property
+    def max_images(self) -> int:
+        return int(os.environ.get("ACE_MAX_IMAGES", "2"))
+
+    @property
+    def image_model(self) -> str:
+        return os.environ.get("ACE_IMAGE_MODEL", "gemini-2.5-flash-image")
+
+    @property
+    def image_generator(self) -> str:
+        """gemini | fake (deterministic offline placeholders)."""
+        return os.environ.get("ACE_IMAGE_GENERATOR", "gemini")
+
+    @property
+    def image_wait(self) -> float:
+        """Seconds the app waits for images after the text is ready."""
+        return float(os.environ.get("ACE_IMAGE_WAIT", "60"))
+
+    @property
+    def images_dir(self) -> str:
+        """Where generated image files are cached (relative paths resolve against the CWD)."""
+        return os.environ.get("ACE_IMAGES_DIR", "images")
+
     @property
     def needs_web_research(self) -> bool:
         return self.depth_level in ("Balanced", "Deep", "Exhaustive")
 
+    # ── Auth (read by ace_auth.py) ───────────────────────────────────────────
+    @property
+    def bcrypt_rounds(self) -> int:
+        """bcrypt work factor for new hashes (4-31; each +1 doubles the cost)."""
+        return int(os.environ.get("ACE_BCRYPT_ROUNDS", "12"))
+
+    @property
+    def bcrypt_workers(self) -> int:
+        """Max concurrent hashes — bcrypt releases the GIL, so this is a core budget."""
+        return int(os.environ.get("ACE_BCRYPT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+    @property
+    def bcrypt_queue(self) -> int:
+        """Hashes allowed to wait for a worker before sign-ins are turned away."""
+        return int(os.environ.get("ACE_BCRYPT_QUEUE", "32"))
+
+    # ── Write-behind (read by ace_writeback.py) ──────────────────────────────
+    @property
+    def writeback_journal(self) -> str:
+        """Local file queued writes are fsynced to before they are acknowledged; "" = none."""
+        return os.environ.get("ACE_WRITEBACK_JOURNAL", "writeback.journal")
+
+    @property
+    def writeback_retry_s(self) -> float:
+        """How long a write keeps retrying while MongoDB is unreachable before it is dead-lettered."""
+        return float(os.environ.get("ACE_WRITEBACK_RETRY_S", "300"))
+
     def router_hint(self) -> dict:
         depth = self.depth_level
         if depth == "Quick":
@@ -115,4 +337,23 @@ class AceConfig:
         )
 
 
-cfg = AceConfig()
\ No newline at end of file
+cfg = AceConfig()
+
+
+# User settings (streamlit_app DEFAULT_SETTINGS keys) → the env vars AceConfig reads.
+SETTINGS_ENV = {
+    "output_type":       ("ACE_OUTPUT_TYPE", "Study Guide"),
+    "section_count":     ("ACE_SECTION_COUNT", 5),
+    "words_per_section": ("ACE_WORDS_PER_SECTION", 300),
+    "depth_level":       ("ACE_DEPTH_LEVEL", "Balanced"),
+    "tone":              ("ACE_TONE", "Educational"),
+    "extra_instruction": ("ACE_EXTRA_INSTRUCTION", ""),
+    "images":            ("ACE_IMAGES", False),
+}
+
+
+def apply_settings(settings: dict):
+    """Set the generation env vars from a user-settings dict (API keys are handled by the caller)."""
+    for key, (env, default) in SETTINGS_ENV.items():
+        value = settings.get(key, default)
+        os.environ[env] = ("1" if value else "0") if isinstance(default, bool) else str(value)
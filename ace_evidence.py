@@ -0,0 +1,77 @@
+"""
+ace_evidence.py — Per-section evidence selection with a small in-memory BM25 index
+Built once per run over evidence titles + snippets (in `fanout`); each section is then
+sent only its top-k items for a query made from its title, goal, bullets and tags.
+Pure Python: a run has at most a few dozen evidence items.
+"""
+import math
+import re
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in into is it its of on or that the this to "
+    "was what when where which who why will with your you vs".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+class BM25:
+    """Okapi BM25 over a list of documents (already tokenized)."""
+
+    def __init__(self, docs: list, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.tfs = [Counter(d) for d in docs]
+        self.lens = [len(d) for d in docs]
+        self.avg_len = (sum(self.lens) / len(docs)) if docs else 0.0
+        df = Counter(t for tf in self.tfs for t in tf)
+        n = len(docs)
+        # Lucene's idf variant: stays positive for terms found in most documents.
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: list) -> list:
+        out = []
+        for tf, length in zip(self.tfs, self.lens):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_len) if self.avg_len else self.k1
+            s = 0.0
+            for t in set(query):
+                f = tf.get(t)
+                if f:
+                    s += self.idf[t] * f * (self.k1 + 1) / (f + norm)
+            out.append(s)
+        return out
+
+
+def _item_text(e: dict) -> str:
+    # Title counts twice: it's short and usually the best summary of the item.
+    return f"{e.get('title', '')} {e.get('title', '')} {e.get('snippet') or ''} {e.get('source') or ''}"
+
+
+def _task_query(task: dict) -> list:
+    return tokenize(" ".join([task.get("title", ""), task.get("goal", ""),
+                              *task.get("bullets", []), *task.get("tags", [])]))
+
+
+class EvidenceIndex:
+    def __init__(self, evidence: list):
+        """`evidence` is a list of EvidenceItem dicts (model_dump())."""
+        self.evidence = evidence
+        self._bm25 = BM25([tokenize(_item_text(e)) for e in evidence])
+
+    def top_k(self, task: dict, k: int) -> list:
+        """Up to `k` items matching the section, best first, ties keeping research order.
+
+        A section that matches nothing gets no evidence, unless it is flagged
+        requires_research/requires_citations. Then it gets the first `k` items so it
+        still has something to cite.
+        """
+        if k <= 0 or len(self.evidence) <= k:
+            return list(self.evidence)
+        scores = self._bm25.scores(_task_query(task))
+        ranked = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: (-scores[i], i))[:k]
+        if not ranked and (task.get("requires_research") or task.get("requires_citations")):
+            ranked = list(range(k))
+        return [self.evidence[i] for i in ranked]
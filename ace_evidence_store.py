@@ -0,0 +1,130 @@
+"""
+ace_evidence_store.py — Shared store of extracted research evidence (MongoDB, TTL)
+research_node saves the normalised EvidenceItems it extracts into the `evidence`
+collection, one document per (query, url). Later runs, from any user, reuse a query's
+fresh items and skip both the Tavily search and the extraction call for it. Items
+expire through a TTL index ACE_EVIDENCE_TTL_H hours after they were fetched (reuse
+does not extend that), which also bounds how many topics one item can collect. Each
+item records which topics used it and how often, for debugging grounding:
+
+    python ace_evidence_store.py query "rust ownership model"   # what a query returns
+    python ace_evidence_store.py url https://example.com/post   # every query that found a URL
+
+streamlit_app.py and ace_jobs workers install one as ACE_backend.EVIDENCE_STORE.
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from ace_config import cfg
+
+log = logging.getLogger(__name__)
+
+ITEM_FIELDS = ("title", "url", "published_at", "snippet", "source")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
+class EvidenceStore:
+    def __init__(self, db):
+        self.coll = db["evidence"]
+
+    def ensure_indexes(self):
+        self.coll.create_index([("query", 1), ("url", 1)], unique=True)
+        self.coll.create_index("url")
+        self.coll.create_index("expire_at", expireAfterSeconds=0)
+
+    def lookup(self, queries: list, max_results: int, topic: str = "") -> dict:
+        """{query: [item dict]} for queries with fresh items fetched at >= `max_results` per query.
+
+        One round trip for all queries. A query missing from the result needs a fresh search.
+        The TTL monitor deletes expired items only about once a minute, so expiry is also
+        checked here. A store error never fails the run: it is logged and the queries are
+        searched as usual.
+        """
+        if not queries or cfg.evidence_ttl_hours <= 0:
+            return {}
+        keys = {normalize_query(q): q for q in queries}
+        now = datetime.now(timezone.utc)
+        found: dict = {}
+        ids = []
+        try:
+            cursor = self.coll.find(
+                {"query": {"$in": list(keys)}, "expire_at": {"$gt": now}, "fetched_with": {"$gte": max_results}},
+                {"query": 1, **{f: 1 for f in ITEM_FIELDS}},
+            ).sort("rank", 1)
+            for doc in cursor:
+                ids.append(doc["_id"])
+                found.setdefault(keys[doc["query"]], []).append({f: doc.get(f) for f in ITEM_FIELDS})
+        except Exception:
+            log.warning("evidence store: lookup failed", exc_info=True)
+            return {}
+        if ids:
+            try:
+                self.coll.update_many({"_id": {"$in": ids}}, {"$inc": {"uses": 1}, "$set": {"last_used_at": now},
+                                                            "$addToSet": {"topics": topic[:200]}})
+            except Exception:
+                log.warning("evidence store: could not record reuse", exc_info=True)
+        return found
+
+    def save(self, by_query: dict, max_results: int, topic: str = ""):
+        """Upsert extracted items: `by_query` is {query: [item dict]} for one search round."""
+        if cfg.evidence_ttl_hours <= 0:
+            return
+        now = datetime.now(timezone.utc)
+        expire_at = now + timedelta(hours=cfg.evidence_ttl_hours)
+        ops = []
+        for query, items in by_query.items():
+            q = normalize_query(query)
+            for rank, item in enumerate(items):
+                ops.append(UpdateOne(
+                    {"query": q, "url": item["url"]},
+                    {
+                        "$set": {**{f: item.get(f) for f in ITEM_FIELDS}, "rank": rank,
+                                 "fetched_with": max_results, "fetched_at": now, "expire_at": expire_at},
+                        "$setOnInsert": {"first_seen": now, "uses": 0},
+                        "$addToSet": {"topics": topic[:200]},
+                    },
+                    upsert=True,
+                ))
+        if ops:
+            try:
+                self.coll.bulk_write(ops, ordered=False)
+            except Exception:
+                log.warning("evidence store: could not save %d item(s)", len(ops), exc_info=True)
+
+    def find(self, query: str = None, url: str = None, limit: int = 50) -> list:
+        """Stored items for a query and/or URL, newest first (debugging)."""
+        flt = {}
+        if query:
+            flt["query"] = normalize_query(query)
+        if url:
+            flt["url"] = url
+        return list(self.coll.find(flt, {"_id": 0}).sort("fetched_at", -1).limit(limit))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect the shared evidence store")
+    ap.add_argument("kind", choices=("query", "url"))
+    ap.add_argument("value")
+    ap.add_argument("--limit", type=int, default=50)
+    args = ap.parse_args()
+
+    from pymongo import MongoClient
+
+    uri = os.environ.get("MONGO_URI", "")
+    if not uri:
+        raise SystemExit("MONGO_URI not set")
+    store = EvidenceStore(MongoClient(uri, serverSelectionTimeoutMS=6000)["content_engine"])
+    for doc in store.find(**{args.kind: args.value}, limit=args.limit):
+        print(json.dumps(doc, default=str, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
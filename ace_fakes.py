@@ -0,0 +1,148 @@
+"""
+ace_fakes.py — Offline stand-ins for Gemini and Tavily (ACE_PROVIDER=fake)
+Used by the scaling benchmark, batch dry runs and tests: no network, no API keys.
+Replies are deterministic for a given prompt and shaped like the real ones: an
+AIMessage with usage_metadata, and structured output with include_raw.
+
+    ACE_FAKE_LATENCY   seconds each call sleeps (network wait, releases the GIL)   default 0.05
+    ACE_FAKE_CPU_MS    milliseconds of pure-Python work per call (holds the GIL)   default 0
+"""
+import hashlib
+import os
+import random
+import re
+import time
+
+from langchain_core.messages import AIMessage
+
+_WORDS = ("system design latency cache index query model data pipeline stream "
+          "throughput memory thread process queue schema token budget trade-off").split()
+
+
+def _pace(prompt: str):
+    # Two costs a real call has: waiting on the network and CPU-side parsing/validation.
+    cpu_ms = float(os.environ.get("ACE_FAKE_CPU_MS", "0"))
+    if cpu_ms > 0:
+        end = time.process_time() + cpu_ms / 1000
+        h = 0
+        while time.process_time() < end:
+            for ch in prompt[:2000]:
+                h = (h * 31 + ord(ch)) & 0xFFFFFFFF
+    time.sleep(float(os.environ.get("ACE_FAKE_LATENCY", "0.05")))
+
+
+def _text(messages) -> str:
+    return "\n".join(str(getattr(m, "content", m)) for m in messages)
+
+
+def _rng(prompt: str) -> random.Random:
+    return random.Random(hashlib.sha256(prompt.encode()).digest())
+
+
+def _topic(prompt: str) -> str:
+    m = re.search(r"^Topic:\s*(.+)$", prompt, re.M)
+    return m.group(1).strip() if m else "the topic"
+
+
+def _words(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choice(_WORDS) for _ in range(n))
+
+
+def _plan(prompt: str, rnd: random.Random, topic: str = None) -> dict:
+    n = int((re.search(r"exactly (\d+) sections", prompt) or re.search(r"(\d+) sections", prompt) or [0, 5])[1])
+    words = (re.search(r'target_words: "(\d+)"', prompt) or [0, "300"])[1]
+    topic = topic or _topic(prompt)
+    return {
+        "blog_title": f"{topic.title()}: A Practical Guide",
+        "audience": "developers",
+        "tone": "Educational",
+        "tasks": [
+            {
+                "id": i + 1,
+                "title": f"{_words(rnd, 2).title()} in {topic}",
+                "goal": f"Understand how {_words(rnd, 3)} shapes {topic}.",
+                "bullets": [f"Explain {_words(rnd, 3)}" for _ in range(3)],
+                "target_words": words,
+                "tags": [rnd.choice(_WORDS)],
+            }
+            for i in range(n)
+        ],
+    }
+
+
+def _payload(schema_name: str, prompt: str, rnd: random.Random) -> dict:
+    topic = _topic(prompt)
+    if schema_name == "RouterDecision":
+        return {"needs_research": True, "mode": "hybrid",
+                "queries": [f"{topic} overview", f"{topic} best practices"]}
+    if schema_name == "EvidencePack":
+        urls = list(dict.fromkeys(re.findall(r"https?://[^\s'\"|,}]+", prompt)))
+        return {"evidence": [{"title": f"Source on {_words(rnd, 2)}", "url": u,
+                              "snippet": _words(rnd, 20)} for u in urls]}
+    if schema_name == "Plan":
+        return _plan(prompt, rnd)
+    if schema_name == "BatchPlan":
+        topics = re.findall(r"^(\d+)\. (.+)$", prompt, re.M)
+        # Even-numbered topics route to research (planned later); odd ones are planned now.
+        return {"topics": [
+            {"topic_no": int(no), "needs_research": True, "mode": "hybrid", "queries": [f"{t} overview"]}
+            if int(no) % 2 == 0 else
+            {"topic_no": int(no), "needs_research": False, "mode": "closed_book", "plan": _plan(prompt, rnd, t)}
+            for no, t in topics
+        ]}
+    if schema_name == "ImagePlan":
+        return {"images": []}
+    raise ValueError(f"ace_fakes: no fake reply for schema {schema_name}")
+
+
+def _usage(prompt: str, out: str) -> dict:
+    tokens_in, tokens_out = len(prompt) // 4, len(out) // 4
+    return {"input_tokens": tokens_in, "output_tokens": tokens_out, "total_tokens": tokens_in + tokens_out}
+
+
+class FakeChatModel:
+    """Drop-in for the parts of ChatGoogleGenerativeAI that ACE_backend uses."""
+
+    def __init__(self, model: str = "fake", **_):
+        self.model = model
+
+    def invoke(self, messages) -> AIMessage:
+        prompt = _text(messages)
+        _pace(prompt)
+        rnd = _rng(prompt)
+        m = re.search(r"^Section title:\s*(.+)$", prompt, re.M)
+        words = int((re.search(r"^Target words:\s*(\d+)", prompt, re.M) or [0, "120"])[1])
+        title = m.group(1).strip() if m else _topic(prompt)
+        body = "\n\n".join(_words(rnd, 60) + "." for _ in range(max(1, words // 60)))
+        content = f"## {title}\n\n{body}"
+        return AIMessage(content=content, usage_metadata=_usage(prompt, content),
+                         response_metadata={"finish_reason": "STOP"})
+
+    def with_structured_output(self, schema, include_raw: bool = False):
+        return _Structured(schema, include_raw)
+
+
+class _Structured:
+    def __init__(self, schema, include_raw: bool):
+        self.schema, self.include_raw = schema, include_raw
+
+    def invoke(self, messages):
+        prompt = _text(messages)
+        _pace(prompt)
+        data = _payload(self.schema.__name__, prompt, _rng(prompt))
+        parsed = self.schema.model_validate(data)
+        raw = AIMessage(content=parsed.model_dump_json(), usage_metadata=_usage(prompt, str(data)),
+                        response_metadata={"finish_reason": "STOP"})
+        return {"raw": raw, "parsed": parsed, "parsing_error": None} if self.include_raw else parsed
+
+
+def search(query: str, max_results: int = 2) -> list:
+    """Fake Tavily results, already normalized like ACE_backend._tavily_search."""
+    _pace(query)
+    rnd = _rng(query)
+    slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-")
+    return [
+        {"title": f"{query.title()} — {_words(rnd, 3)}", "url": f"https://example.com/{slug}/{i}",
+         "snippet": _words(rnd, 40), "published_at": None, "source": "example.com"}
+        for i in range(max_results)
+    ]
@@ -0,0 +1,113 @@
+"""
+ace_flight.py — Single-flight coalescing of identical generations
+Two requests with the same topic (normalised) and the same output-affecting settings
+share one canonical run key. Within a process, the first request starts the pipeline
+on its own thread. Later ones join as subscribers and replay its stream of graph
+updates from the start (router, research, plan, every section), then follow it live.
+Each subscriber builds and saves its own history entry from the shared updates. The
+pipeline does not depend on any one page session, so it keeps running if the tab
+that started it reruns or closes. Across processes, ace_jobs coalesces queued jobs
+on the same key.
+"""
+import contextvars
+import hashlib
+import json
+import threading
+import time
+
+# User settings that change what the pipeline produces.
+RUN_SETTINGS = ("output_type", "section_count", "words_per_section", "depth_level",
+                "tone", "extra_instruction", "images", "time_budget")
+# User-supplied keys. Only a hash of who pays goes into the run key, never the key itself.
+_PAYER_KEYS = ("gemini_api_key", "tavily_api_key")
+
+_flights: dict = {}
+_lock = threading.Lock()
+
+
+def payer(settings: dict) -> dict:
+    """Who pays for each API: "server", or a hash of the user's own key."""
+    out = {}
+    for k in _PAYER_KEYS:
+        own = (settings.get(k) or "").strip()
+        out[k] = hashlib.sha256(own.encode("utf-8")).hexdigest()[:16] if own else "server"
+    return out
+
+
+def run_key(topic: str, settings: dict) -> str:
+    """Canonical hash of a generation request: normalised topic + output-affecting settings
+    + who pays. Runs only coalesce when the same keys pay for them, so a request paid by the
+    server (and held to a quota) never rides on one paid by a user's own key, or vice versa."""
+    canon = {
+        "topic": " ".join(topic.split()).casefold(),
+        **{k: settings.get(k) for k in RUN_SETTINGS},
+        "payer": payer(settings),
+    }
+    blob = json.dumps(canon, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+class Flight:
+    """One running pipeline and the updates it has produced so far."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.events: list = []
+        self.error = None
+        self.done = False
+        self.subscribers = 1
+        self.started = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _run(self, start):
+        try:
+            for event in start():
+                with self._cond:
+                    self.events.append(event)
+                    self._cond.notify_all()
+        except BaseException as e:      # re-raised in every subscriber
+            self.error = e
+        finally:
+            with _lock:
+                if _flights.get(self.key) is self:
+                    del _flights[self.key]
+            with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    def subscribe(self):
+        """Yield every update from the first one on, block for new ones, and re-raise the
+        pipeline's exception at the end if it failed."""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.events) and not self.done:
+                    self._cond.wait()
+                batch = self.events[i:]
+                finished = self.done
+            yield from batch
+            i += len(batch)
+            if finished and i >= len(self.events):
+                break
+        if self.error is not None:
+            raise self.error
+
+
+def join(key: str, start):
+    """Return (flight, leader). `start()` must return the graph update iterator; it is
+    called once, on the flight's own thread, only if no flight for `key` is running."""
+    with _lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            flight.subscribers += 1
+            return flight, False
+        flight = _flights[key] = Flight(key)
+    # The leader's context (e.g. its ace_profile session) carries over to the pipeline thread.
+    ctx = contextvars.copy_context()
+    threading.Thread(target=ctx.run, args=(flight._run, start), name=f"ace-flight-{key[:8]}", daemon=True).start()
+    return flight, True
+
+
+def in_flight() -> int:
+    with _lock:
+        return len(_flights)
@@ -0,0 +1,167 @@
+"""
+ace_hedge.py — Hedged and deadline-bounded LLM calls for the graph's worker threads
+If a call hasn't returned by the Pth percentile of recent latencies, a duplicate is
+issued (only if the rate limiter has a spare token) and the first to finish wins.
+Calls are blocking HTTP requests on threads, so a losing or timed-out call can't be
+aborted mid-flight: it is cancelled if it hasn't started. Otherwise it keeps running
+and spending tokens, so inside `collect_late()` it is handed to the run's LateCalls,
+whose `settle()` hands its result over for cost accounting.
+"""
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import ace_profile
+from ace_config import cfg
+
+log = logging.getLogger(__name__)
+
+MIN_SAMPLES = 10
+
+_pool = ThreadPoolExecutor(max_workers=cfg.call_threads, thread_name_prefix="ace-hedge")
+# Deadline-bounded calls get their own threads: sharing _pool with hedges let waiting
+# outer calls fill it, so inner hedge attempts queued until the deadline passed.
+_deadline_pool = ThreadPoolExecutor(max_workers=cfg.call_threads, thread_name_prefix="ace-deadline")
+_lock = threading.Lock()
+_latencies: dict = defaultdict(lambda: deque(maxlen=200))   # key (e.g. model) -> recent seconds
+_late: contextvars.ContextVar = contextvars.ContextVar("ace_hedge_late", default=None)
+
+
+class LateCalls:
+    """Calls of one run that were still running when their caller moved on."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: list = []           # (future, info)
+
+    def add(self, fut, info: dict):
+        with self._lock:
+            self._calls.append((fut, info))
+
+    @staticmethod
+    def _split(calls: list):
+        # Calls that raised or were cancelled are dropped: there is no usage to account for.
+        finished = [(f.result(), info) for f, info in calls if f.done() and not f.cancelled() and f.exception() is None]
+        unfinished = [info for f, info in calls if not f.done()]
+        return finished, unfinished
+
+    def settle(self, timeout: float, on_rest=None) -> list:
+        """Never blocks: returns the late calls that already finished ([(result, info)]).
+
+        The rest are waited for on a background thread, for up to `timeout` s, and then
+        handed to `on_rest(finished, unfinished)` (dropped when `on_rest` is None).
+        """
+        with self._lock:
+            calls, self._calls = self._calls, []
+        done = [(f, info) for f, info in calls if f.done()]
+        rest = [(f, info) for f, info in calls if not f.done()]
+        if rest and on_rest is not None:
+            def wait_rest():
+                wait([f for f, _ in rest], timeout=max(0.0, timeout))
+                try:
+                    on_rest(*self._split(rest))
+                except Exception:
+                    log.exception("late-call accounting failed")
+            threading.Thread(target=wait_rest, name="ace-late-calls", daemon=True).start()
+        return self._split(done)[0]
+
+
+@contextlib.contextmanager
+def collect_late():
+    """Hand calls abandoned within this block (and threads that copy its context) to a LateCalls."""
+    sink = LateCalls()
+    token = _late.set(sink)
+    try:
+        yield sink
+    finally:
+        _late.reset(token)
+
+
+class Starved(TimeoutError):
+    """The deadline passed before a pool thread picked the call up: the pool was saturated,
+    the call itself never ran."""
+
+
+def _abandon(fut, info: dict) -> bool:
+    """Cancel `fut` if it has not started (returns True), else hand it to the run's LateCalls."""
+    if fut.cancel():
+        return True
+    sink = _late.get()
+    if sink is not None:
+        sink.add(fut, info)
+    return False
+
+
+def record_latency(key: str, seconds: float):
+    with _lock:
+        _latencies[key].append(seconds)
+
+
+def hedge_delay(key: str, percentile: float):
+    """Seconds to wait before hedging, or None until MIN_SAMPLES latencies are known."""
+    with _lock:
+        samples = sorted(_latencies[key])
+    if len(samples) < MIN_SAMPLES:
+        return None
+    idx = min(len(samples) - 1, int(len(samples) * percentile / 100))
+    return samples[idx]
+
+
+def call_with_timeout(call, timeout: float, info: dict = None):
+    """Run `call()` for at most `timeout` seconds: (True, result) or (False, None) on timeout.
+    A timed-out call that is already running is abandoned with `info` (see LateCalls); one
+    that never left the pool queue raises Starved instead."""
+    fut = _deadline_pool.submit(contextvars.copy_context().run, ace_profile.carry(call))
+    done, _ = wait([fut], timeout=max(0.0, timeout))
+    if not done:
+        if _abandon(fut, {**(info or {}), "late": "timed_out"}):
+            raise Starved("call never started before its deadline")
+        return False, None
+    return True, fut.result()
+
+
+def hedged_call(call, delay, try_acquire, hedge=None, info: dict = None, timeout: float = None):
+    """Run `call()`; after `delay` seconds start `hedge()` (default `call`) if `try_acquire()` allows.
+
+    Returns (result, hedged, hedge_won). If the first finisher raised, the other
+    attempt's outcome is used instead. A loser that is already running is abandoned
+    with `info` (see LateCalls). With `timeout`, raises TimeoutError once that many
+    seconds pass without a result, abandoning whatever is still running, or Starved if
+    no attempt ever started.
+    """
+    end = None if timeout is None else time.monotonic() + max(0.0, timeout)
+
+    def left():
+        return None if end is None else max(0.0, end - time.monotonic())
+
+    def give_up(futures):
+        never_ran = [_abandon(f, {**(info or {}), "late": "timed_out"}) for f in futures]
+        if all(never_ran):
+            raise Starved("hedged call never started before its deadline")
+        raise TimeoutError("hedged call ran past its deadline")
+
+    primary = _pool.submit(contextvars.copy_context().run, ace_profile.carry(call))
+    done, _ = wait([primary], timeout=delay if end is None else min(delay, left()))
+    if not done and (left() == 0 or not try_acquire()):
+        done, _ = wait([primary], timeout=left())
+        if not done:
+            give_up([primary])
+    if done:
+        return primary.result(), False, False
+
+    hedge = _pool.submit(contextvars.copy_context().run, ace_profile.carry(hedge or call))
+    pending = {primary, hedge}
+    while True:
+        done, pending = wait(pending, timeout=left(), return_when=FIRST_COMPLETED)
+        if not done:
+            give_up(pending)
+        ok = [f for f in done if f.exception() is None]
+        if ok or not pending:
+            winner = ok[0] if ok else next(iter(done))
+            for loser in pending:
+                _abandon(loser, {**(info or {}), "late": "hedge_loser"})
+            return winner.result(), True, winner is hedge
@@ -0,0 +1,260 @@
+"""
+ace_images.py — Image generation for the optional image stage
+Images are content-addressed: the file name is a hash of (model, size, prompt), so a
+prompt seen before is served from disk and identical prompts in flight share one
+request. Generation runs on a process-wide background pool, so the graph returns
+the text first; `place()` later swaps each image marker for the finished image.
+
+The generator is pluggable: ACE_IMAGE_GENERATOR=fake (or `set_generator`) produces
+deterministic placeholder PNGs with no network access, for offline runs and tests.
+
+Files live on the host that generated them. In queue mode that is a worker, so workers
+`publish()` finished images to MongoDB, and a process with `set_store(db)` (the app)
+downloads any image missing from its own ACE_IMAGES_DIR the first time it is shown.
+"""
+import contextvars
+import hashlib
+import os
+import re
+import struct
+import threading
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait as _wait
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bson import Binary
+
+import ace_metrics
+import ace_profile
+from ace_config import cfg
+
+MARKER = "<!-- ace-image:{key} -->"
+_MARKER_RE = re.compile(r"<!-- ace-image:([0-9a-f]+) -->\n?")
+# Documents always reference images as images/<key>.png; that is resolved against
+# ACE_IMAGES_DIR when rendering, so saved Markdown does not depend on where files live.
+_IMAGE_MD_RE = re.compile(r"^!\[([^\]]*)\]\(images/([0-9a-f]+)\.png\)\n\*([^\n]*)\*$", re.M)
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ace-image")
+_lock = threading.Lock()
+_inflight: dict = {}        # key -> Future
+_errors: dict = {}          # key -> last error message (bounded, see _generate)
+_generator = None           # set_generator() override
+_store = None               # set_store() database for images generated on other hosts
+
+STORE_COLL = "images"
+_MAX_STORED_BYTES = 15 * 1024 * 1024     # under MongoDB's 16 MB document limit
+
+log = logging.getLogger(__name__)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# GENERATORS  — fn(prompt, model, size) -> PNG bytes
+# ═════════════════════════════════════════════════════════════════════════════
+
+def gemini_generator(prompt: str, model: str, size: str) -> bytes:
+    """Raw image bytes from a Gemini image model (uses GOOGLE_API_KEY)."""
+    from google import genai
+    from google.genai import types
+
+    api_key = cfg.gemini_api_key or os.environ.get("GOOGLE_API_KEY", "")
+    if not api_key:
+        raise RuntimeError("GOOGLE_API_KEY is not set.")
+    resp = genai.Client(api_key=api_key).models.generate_content(
+        model=model,
+        contents=f"{prompt}\n\nAspect: {size}",
+        config=types.GenerateContentConfig(response_modalities=["IMAGE"]),
+    )
+    # Depending on SDK version, parts may hang off resp.candidates[0].content.parts
+    parts = getattr(resp, "parts", None)
+    if not parts and getattr(resp, "candidates", None):
+        parts = resp.candidates[0].content.parts
+    for part in parts or []:
+        inline = getattr(part, "inline_data", None)
+        if inline and getattr(inline, "data", None):
+            return inline.data
+    raise RuntimeError("No image content returned (safety/quota/SDK change).")
+
+
+def fake_generator(prompt: str, model: str, size: str) -> bytes:
+    """A small solid-colour PNG derived from the prompt — no network, deterministic."""
+    r, g, b = hashlib.sha256(prompt.encode()).digest()[:3]
+    w = h = 64
+    raw = b"".join(b"\x00" + bytes((r, g, b)) * w for _ in range(h))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw))
+            + chunk(b"IEND", b""))
+
+
+_GENERATORS = {"gemini": gemini_generator, "fake": fake_generator}
+
+
+def set_generator(fn):
+    """Override the generator for this process (None restores ACE_IMAGE_GENERATOR)."""
+    global _generator
+    _generator = fn
+
+
+def _current_generator():
+    return _generator or _GENERATORS.get(cfg.image_generator, gemini_generator)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# CACHE + BACKGROUND GENERATION
+# ═════════════════════════════════════════════════════════════════════════════
+
+def image_key(prompt: str, model: str, size: str) -> str:
+    return hashlib.sha256(f"{model}\n{size}\n{prompt}".encode()).hexdigest()[:24]
+
+
+def path_for(key: str) -> Path:
+    return Path(cfg.images_dir) / f"{key}.png"
+
+
+def _write(key: str, data: bytes):
+    Path(cfg.images_dir).mkdir(parents=True, exist_ok=True)
+    tmp = path_for(key).with_suffix(f".{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path_for(key))      # readers never see a half-written file
+
+
+def _generate(key: str, prompt: str, model: str, size: str, generator):
+    try:
+        _write(key, generator(prompt, model, size))
+    except Exception as e:
+        with _lock:
+            if len(_errors) > 256:
+                _errors.clear()
+            _errors[key] = str(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def submit(prompt: str, model: str = None, size: str = "1024x1024") -> str:
+    """Start generating `prompt` in the background (unless cached or in flight); return its key."""
+    model = model or cfg.image_model
+    key = image_key(prompt, model, size)
+    if path_for(key).exists():
+        ace_metrics.cache("image", hits=1)
+        return key
+    ace_metrics.cache("image", misses=1)
+    with _lock:
+        if key not in _inflight:
+            _errors.pop(key, None)
+            # Run in a copy of the caller's context so metrics and profiling see its run.
+            _inflight[key] = _pool.submit(contextvars.copy_context().run, ace_profile.carry(_generate),
+                                          key, prompt, model, size, _current_generator())
+    return key
+
+
+def wait(keys: list, timeout: float) -> dict:
+    """Block up to `timeout` seconds for `keys`; return {key: path or None}."""
+    with _lock:
+        pending = [f for f in (_inflight.get(k) for k in keys) if f is not None]
+    if pending:
+        _wait(pending, timeout=max(0.0, timeout))
+    return {k: (path_for(k) if path_for(k).exists() else None) for k in keys}
+
+
+def error(key: str):
+    with _lock:
+        return _errors.get(key)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SHARED STORE  — images generated on another host (queue workers)
+# ═════════════════════════════════════════════════════════════════════════════
+
+def publish(db, keys: list) -> int:
+    """Copy finished local images into MongoDB for other hosts; returns how many were new.
+
+    Content-addressed, so an image already stored is left alone.
+    """
+    stored = 0
+    for key in keys:
+        path = path_for(key)
+        if not path.exists():
+            continue
+        data = path.read_bytes()
+        if len(data) > _MAX_STORED_BYTES:
+            log.warning("image %s is %d bytes, too large to store; other hosts will not show it", key, len(data))
+            continue
+        with ace_metrics.mongo_op("publish_image"):
+            res = db[STORE_COLL].update_one(
+                {"_id": key},
+                {"$setOnInsert": {"data": Binary(data), "bytes": len(data),
+                                  "created_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        stored += res.upserted_id is not None
+    return stored
+
+
+def set_store(db):
+    """Fetch images missing locally from `db` (None turns it off)."""
+    global _store
+    _store = db
+
+
+def ensure(path: str) -> bool:
+    """Whether the image file at `path` (from `segments`) exists, downloading it from the
+    store first if it was generated elsewhere."""
+    path = Path(path)
+    if path.exists():
+        return True
+    if _store is None:
+        return False
+    with ace_metrics.mongo_op("fetch_image"):
+        doc = _store[STORE_COLL].find_one({"_id": path.stem}, {"data": 1})
+    if doc is None:
+        return False
+    _write(path.stem, bytes(doc["data"]))
+    return True
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# MARKDOWN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def place(md: str, images: list, timeout: float = 0.0):
+    """Replace image markers in `md` with finished images (waiting up to `timeout`).
+
+    `images` are the specs from the graph's images stage ({key, alt, caption, ...}).
+    Returns (markdown, failed_specs). Images that aren't ready are dropped from the
+    text, so the document reads cleanly either way.
+    """
+    specs = {s["key"]: s for s in images}
+    ready = wait(list(specs), timeout) if specs else {}
+    failed = [s for k, s in specs.items() if not ready.get(k)]
+
+    def swap(m):
+        spec, path = specs.get(m.group(1)), ready.get(m.group(1))
+        if not spec or not path:
+            return ""
+        return f"![{spec['alt']}](images/{path.name})\n*{spec['caption']}*\n"
+
+    return _MARKER_RE.sub(swap, md), failed
+
+
+def segments(md: str) -> list:
+    """Split for rendering: ("md", text) and ("image", path, alt, caption) parts.
+
+    Streamlit's Markdown can't load local files, so images are drawn with st.image.
+    """
+    out, pos = [], 0
+    for m in _IMAGE_MD_RE.finditer(md):
+        if m.start() > pos:
+            out.append(("md", md[pos:m.start()]))
+        out.append(("image", str(path_for(m.group(2))), m.group(1), m.group(3)))
+        pos = m.end()
+    if pos < len(md):
+        out.append(("md", md[pos:]))
+    return out
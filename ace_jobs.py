@@ -0,0 +1,447 @@
+"""
+ace_jobs.py — MongoDB job queue so several machines share generation load
+With ACE_JOB_QUEUE=1 the app enqueues a `jobs` document instead of running the graph
+itself, then mirrors the job's progress. Workers on any machine claim jobs atomically
+(`find_one_and_update`) under a lease. While they run the ACE_backend graph they renew
+it with heartbeats, and then save the document to the user's history. If a worker dies,
+its lease expires and another worker retries the job. A job that has failed or expired
+ACE_JOB_MAX_ATTEMPTS times is dead-lettered (status "dead", errors kept). To scale out,
+start more workers.
+
+    python ace_jobs.py worker             # one worker process; needs MONGO_URI
+    python ace_jobs.py worker --metrics-port 9101   # ... with Prometheus /metrics (ace_metrics.py)
+    python ace_jobs.py status             # job counts by status, latest dead letters
+    python ace_jobs.py requeue <job_id>   # give a dead job a fresh set of attempts
+
+Only plain pymongo collection calls are used, so the queue runs against a local mongod
+or an in-memory stand-in such as mongomock.
+"""
+import argparse
+import importlib
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import ace_evidence_store
+import ace_images
+import ace_metrics
+import ace_profile
+import ace_quota
+import ace_store
+from ace_config import apply_settings, cfg
+
+log = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, DEAD = "queued", "running", "done", "dead"
+RETRY_BACKOFF = 10          # seconds before retry 1; doubles per attempt, capped at 5 min
+DONE_TTL = timedelta(days=7)
+_KEYS = ("gemini_api_key", "tavily_api_key")   # never copied into job documents
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def ensure_indexes(db):
+    jobs = db["jobs"]
+    # One index per claim branch: queued-and-due, and running-with-expired-lease.
+    jobs.create_index([("status", 1), ("available_at", 1)])
+    jobs.create_index([("status", 1), ("lease_expires_at", 1)])
+    jobs.create_index([("user_id", 1), ("created_at", -1)])
+    # Set only while a job is queued or running: at most one live job per run key.
+    jobs.create_index("active_key", unique=True, sparse=True)
+    # Finished jobs clean themselves up; dead letters have no expire_at and stay.
+    jobs.create_index("expire_at", expireAfterSeconds=0)
+
+
+# ── Producer side (the app) ──────────────────────────────────────────────────
+def enqueue(db, user_id: str, topic: str, settings: dict, run_key: str = None) -> ObjectId:
+    """Queue one generation. `settings` is the user-settings dict; API keys are left out
+    (workers read them from `user_settings`).
+
+    With a `run_key` (ace_flight.run_key), a request identical to a queued or running job
+    subscribes to that job and gets its id instead of queueing a second run. The key
+    includes who pays, so only requests paid by the same keys share a job.
+    """
+    jobs = db["jobs"]
+    while True:
+        if run_key:
+            hit = jobs.find_one_and_update({"active_key": run_key},
+                                           {"$addToSet": {"subscribers": user_id}}, projection={"_id": 1})
+            if hit is not None:
+                return hit["_id"]
+        now = _now()
+        doc = {
+            "user_id":      user_id,
+            "topic":        topic,
+            "settings":     {k: v for k, v in settings.items() if k not in _KEYS},
+            "status":       QUEUED,
+            "attempts":     0,
+            "created_at":   now,
+            "available_at": now,
+            "progress":     {},
+            "errors":       [],
+            "subscribers":  [],
+        }
+        if run_key:
+            doc["run_key"] = doc["active_key"] = run_key
+        try:
+            return jobs.insert_one(doc).inserted_id
+        except DuplicateKeyError:
+            continue            # an identical request was queued first — subscribe to it
+
+
+def get_job(db, job_id, user_id: str = None):
+    """The job, if `user_id` owns it or subscribed to it (any job when user_id is None)."""
+    query = {"_id": ObjectId(job_id)}
+    if user_id is not None:
+        query["$or"] = [{"user_id": user_id}, {"subscribers": user_id}]
+    return db["jobs"].find_one(query, {"settings": 0})
+
+
+def wait(db, job_id, user_id: str, on_progress=None, poll: float = 1.0, timeout: float = None,
+         claim_timeout: float = None, on_poll=None) -> dict:
+    """Poll until the job is done or dead. Calls on_progress(stage, detail) once per new
+    stage update and on_poll(job) on every poll. Returns the final job document, or the
+    last one seen once `timeout` passes, or `claim_timeout` passes with no worker having
+    claimed it."""
+    seen, started = {}, time.monotonic()
+    while True:
+        job = get_job(db, job_id, user_id)
+        if job is None:
+            raise KeyError(f"job {job_id} not found")
+        for stage, detail in job.get("progress", {}).items():
+            if seen.get(stage) != detail:
+                seen[stage] = detail
+                if on_progress:
+                    on_progress(stage, detail)
+        if job["status"] in (DONE, DEAD):
+            return job
+        waited = time.monotonic() - started
+        if timeout is not None and waited >= timeout:
+            return job
+        if claim_timeout is not None and waited >= claim_timeout and job["status"] == QUEUED and not job["attempts"]:
+            return job
+        if on_poll:
+            on_poll(job)
+        time.sleep(poll)
+
+
+# ── Worker side ──────────────────────────────────────────────────────────────
+def claim(db, worker_id: str, lease: float = None, max_attempts: int = None):
+    """Atomically take the oldest due job, or one whose lease expired. None if idle."""
+    lease = lease or cfg.job_lease
+    max_attempts = max_attempts or cfg.job_max_attempts
+    now = _now()
+    return db["jobs"].find_one_and_update(
+        {
+            "$or": [
+                {"status": QUEUED, "available_at": {"$lte": now}},
+                {"status": RUNNING, "lease_expires_at": {"$lt": now}},
+            ],
+            "attempts": {"$lt": max_attempts},
+        },
+        {
+            "$set": {"status": RUNNING, "worker": worker_id, "started_at": now,
+                     "heartbeat_at": now, "lease_expires_at": now + timedelta(seconds=lease)},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _owned(job_id, worker_id: str) -> dict:
+    # Every worker-side write is conditional on still holding the lease.
+    return {"_id": job_id, "worker": worker_id, "status": RUNNING}
+
+
+def heartbeat(db, job_id, worker_id: str, lease: float = None, progress: dict = None) -> bool:
+    """Extend the lease (and record stage progress). False means the lease was lost."""
+    now = _now()
+    update = {"heartbeat_at": now, "lease_expires_at": now + timedelta(seconds=lease or cfg.job_lease)}
+    for stage, detail in (progress or {}).items():
+        update[f"progress.{stage}"] = detail
+    return db["jobs"].update_one(_owned(job_id, worker_id), {"$set": update}).matched_count == 1
+
+
+def complete(db, job_id, worker_id: str, blog_id) -> bool:
+    now = _now()
+    return db["jobs"].update_one(_owned(job_id, worker_id), {
+        "$set": {"status": DONE, "blog_id": blog_id, "finished_at": now, "expire_at": now + DONE_TTL},
+        "$unset": {"lease_expires_at": "", "active_key": ""},
+    }).matched_count == 1
+
+
+def fail(db, job: dict, worker_id: str, error: str, max_attempts: int = None) -> str:
+    """Record a failure. The job is requeued with backoff, or dead-lettered on its
+    last attempt. Returns the new status ("" if the lease had already been lost)."""
+    max_attempts = max_attempts or cfg.job_max_attempts
+    now = _now()
+    update = {"$push": {"errors": {"at": now, "worker": worker_id, "attempt": job["attempts"],
+                                   "error": error[:2000]}}}
+    if job["attempts"] >= max_attempts:
+        status = DEAD
+        update["$set"] = {"status": DEAD, "finished_at": now}
+        update["$unset"] = {"lease_expires_at": "", "active_key": ""}
+    else:
+        status = QUEUED
+        backoff = min(300, RETRY_BACKOFF * 2 ** (job["attempts"] - 1))
+        update["$set"] = {"status": QUEUED, "available_at": now + timedelta(seconds=backoff)}
+        update["$unset"] = {"lease_expires_at": "", "worker": ""}
+    return status if db["jobs"].update_one(_owned(job["_id"], worker_id), update).matched_count else ""
+
+
+def reap(db, max_attempts: int = None) -> int:
+    """Dead-letter jobs whose lease expired on their last attempt (claim skips them)."""
+    now = _now()
+    return db["jobs"].update_many(
+        {"status": RUNNING, "lease_expires_at": {"$lt": now},
+         "attempts": {"$gte": max_attempts or cfg.job_max_attempts}},
+        {"$set": {"status": DEAD, "finished_at": now},
+         "$push": {"errors": {"at": now, "error": "lease expired (worker stopped heartbeating)"}},
+         "$unset": {"lease_expires_at": "", "active_key": ""}},
+    ).modified_count
+
+
+def requeue(db, job_id) -> bool:
+    """Give a dead job a fresh set of attempts."""
+    return db["jobs"].update_one(
+        {"_id": ObjectId(job_id), "status": DEAD},
+        {"$set": {"status": QUEUED, "attempts": 0, "available_at": _now(), "progress": {}},
+         "$unset": {"finished_at": "", "worker": ""}},
+    ).modified_count == 1
+
+
+class LeaseLost(Exception):
+    """Another worker took over the job; this worker's result must be discarded."""
+
+
+class _Lease:
+    """Heartbeat thread for one claimed job; also carries stage progress to the job document."""
+
+    def __init__(self, db, job_id, worker_id: str, lease: float):
+        self.db, self.job_id, self.worker_id, self.lease = db, job_id, worker_id, lease
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._pending: dict = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="ace-job-lease", daemon=True)
+        self._thread.start()
+
+    def progress(self, stage: str, detail: str):
+        with self._lock:
+            self._pending[stage] = detail
+        self.beat()
+
+    def beat(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not heartbeat(self.db, self.job_id, self.worker_id, self.lease, pending):
+            self.lost.set()
+
+    def _run(self):
+        while not self._stop.wait(self.lease / 3):
+            try:
+                self.beat()
+            except Exception:
+                log.exception("job %s: heartbeat failed", self.job_id)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _describe(node: str, update: dict, counts: dict) -> str:
+    # Same wording as the app's pipeline cards.
+    if node == "router":
+        return f"Mode: {update.get('mode', 'closed_book').replace('_', ' ')}"
+    if node == "research":
+        return f"Retrieved {len(update.get('evidence', []))} evidence items"
+    if node == "orchestrator":
+        plan = update.get("plan")
+        return f"Plan ready · {len(plan.tasks) if plan else '?'} sections"
+    if node == "worker":
+        counts["worker"] = counts.get("worker", 0) + 1
+        return f"{counts['worker']} sections written"
+    if node == "reducer":
+        return "Blog assembled ✓"
+    if node == "late_calls":
+        return f"Accounted for {len(update.get('llm_calls', []))} late call(s)"
+    return "done"
+
+
+class Worker:
+    """Claims jobs one at a time and runs them through the ACE_backend graph.
+
+    Generation settings travel through os.environ, so a worker process runs one job
+    at a time. To scale, start more worker processes or machines.
+    """
+
+    def __init__(self, db, worker_id: str = None, lease: float = None, poll: float = 1.0):
+        self.db = db
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = lease or cfg.job_lease
+        self.poll = poll
+        self.evidence_store = ace_evidence_store.EvidenceStore(db)
+        # Server keys captured once: a user's own key must not leak into the next job.
+        self._server_keys = {k: os.environ.get(k, "") for k in ("GOOGLE_API_KEY", "GEMINI_API_KEY", "TAVILY_API_KEY")}
+
+    def run(self, stop: threading.Event = None):
+        stop = stop or threading.Event()
+        log.info("worker %s started", self.worker_id)
+        while not stop.is_set():
+            reap(self.db)
+            if not self.run_once():
+                stop.wait(self.poll)
+
+    def run_once(self) -> bool:
+        """Claim and process one job. False if the queue had nothing due."""
+        job = claim(self.db, self.worker_id, self.lease)
+        if job is None:
+            return False
+        lease = _Lease(self.db, job["_id"], self.worker_id, self.lease)
+        try:
+            blog_id = self._process(job, lease)
+        except LeaseLost:
+            log.warning("job %s: lease lost, result discarded", job["_id"])
+        except Exception as e:
+            log.exception("job %s failed (attempt %d)", job["_id"], job["attempts"])
+            fail(self.db, job, self.worker_id, f"{type(e).__name__}: {e}")
+        else:
+            if not complete(self.db, job["_id"], self.worker_id, blog_id):
+                log.warning("job %s: lease lost after saving", job["_id"])
+        finally:
+            lease.stop()
+        return True
+
+    def _use_keys(self, user_id: str) -> bool:
+        """Point the env at the user's own keys, else the server's. True if the user has their own Gemini key."""
+        own = self.db["user_settings"].find_one({"user_id": user_id}, {k: 1 for k in _KEYS}) or {}
+        own_gemini = (own.get("gemini_api_key") or "").strip()
+        gemini = own_gemini or self._server_keys["GOOGLE_API_KEY"] or self._server_keys["GEMINI_API_KEY"]
+        tavily = (own.get("tavily_api_key") or "").strip() or self._server_keys["TAVILY_API_KEY"]
+        os.environ["GOOGLE_API_KEY"] = os.environ["GEMINI_API_KEY"] = gemini
+        os.environ["TAVILY_API_KEY"] = tavily
+        return bool(own_gemini)
+
+    def _process(self, job: dict, lease: _Lease) -> ObjectId:
+        # The blog is saved under the job's _id, so a retry can tell whether an
+        # earlier attempt got as far as saving.
+        oid, user_id, settings = job["_id"], job["user_id"], job["settings"]
+        if job["attempts"] > 1:
+            if self.db["blogs"].find_one({"_id": oid}, {"_id": 1}):
+                return oid
+            # Orphans from a crash between inserts.
+            self.db["blog_bodies"].delete_one({"_id": oid})
+            self.db["blog_search"].delete_one({"_id": oid})
+
+        own_key = self._use_keys(user_id)
+        apply_settings(settings)
+        backend = importlib.import_module("ACE_backend")
+        backend.EVIDENCE_STORE = self.evidence_store
+        run_input = {"topic": job["topic"]}
+        if int(settings.get("time_budget", 0)):
+            run_input["deadline"] = time.time() + int(settings["time_budget"])
+
+        mode, plan, final, images, llm_calls, degradations, counts = "closed_book", None, None, [], [], [], {}
+        # The app took the run from the user's quota before enqueueing; tokens are charged here.
+        depth = settings.get("depth_level", "Balanced")
+
+        def charge_late(calls):     # calls that finished after the stream ended (background thread)
+            ace_quota.charge(self.db, user_id, depth, ace_quota.tokens_used(calls), own_key=own_key)
+
+        try:
+            with ace_profile.session(f"job-{oid}-{job['topic']}") as prof, ace_profile.track("job", profile=False), ace_metrics.run():
+                for event in backend.stream(run_input, on_late=charge_late):
+                    for node, update in event.items():
+                        if not isinstance(update, dict):
+                            continue
+                        llm_calls.extend(update.get("llm_calls", []))
+                        degradations.extend(update.get("degradations", []))
+                        mode = update.get("mode", mode)
+                        plan = update.get("plan", plan)
+                        final = update.get("final", final)
+                        images = update.get("images", images)
+                        lease.progress(node, _describe(node, update, counts))
+                    if lease.lost.is_set():
+                        raise LeaseLost()
+        finally:
+            ace_quota.charge(self.db, user_id, depth, ace_quota.tokens_used(llm_calls), own_key=own_key)
+
+        if images and final:
+            final, missing = ace_images.place(final, images, cfg.image_wait)
+            if missing:
+                degradations.append(f"{len(missing)} image(s) not ready in time — left out")
+            # The files are on this worker; the app reads them back from MongoDB.
+            gone = {s["key"] for s in missing}
+            ace_images.publish(self.db, [s["key"] for s in images if s["key"] not in gone])
+        if not (final and plan):
+            raise RuntimeError("no output produced")
+
+        lease.beat()
+        if lease.lost.is_set():
+            raise LeaseLost()
+        entry = ace_store.build_entry(job["topic"], settings, plan.blog_title, final, mode,
+                                      backend.summarize_llm_calls(llm_calls), degradations)
+        if prof is not None:
+            entry["profile"] = ace_profile.summary(prof)
+        try:
+            ace_store.save_blog(self.db, user_id, entry, blog_id=oid)
+        except DuplicateKeyError:
+            pass            # a worker holding the expired lease saved it first
+        return oid
+
+
+# ── CLI ──────────────────────────────────────────────────────────────────────
+def _db():
+    from pymongo import MongoClient
+
+    uri = os.environ.get("MONGO_URI", "")
+    if not uri:
+        raise SystemExit("MONGO_URI not set")
+    return MongoClient(uri, serverSelectionTimeoutMS=6000)["content_engine"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ACE generation job queue")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="claim and run jobs until interrupted")
+    w.add_argument("--id", help="worker id (default host:pid)")
+    w.add_argument("--poll", type=float, default=1.0, help="seconds between polls when idle")
+    w.add_argument("--metrics-port", type=int, default=None, help="serve /metrics here (default ACE_METRICS_PORT)")
+    sub.add_parser("status", help="job counts by status and the latest dead letters")
+    r = sub.add_parser("requeue", help="retry a dead job")
+    r.add_argument("job_id")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    db = _db()
+    if args.cmd == "worker":
+        ensure_indexes(db)
+        ace_store.ensure_indexes(db)
+        ace_evidence_store.EvidenceStore(db).ensure_indexes()
+        ace_metrics.serve(args.metrics_port)
+        try:
+            Worker(db, worker_id=args.id, poll=args.poll).run()
+        except KeyboardInterrupt:
+            pass
+    elif args.cmd == "status":
+        for row in db["jobs"].aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}]):
+            print(f"{row['_id']:>8} {row['n']}")
+        for job in db["jobs"].find({"status": DEAD}).sort("finished_at", -1).limit(10):
+            last = job["errors"][-1]["error"] if job.get("errors") else ""
+            print(f"dead {job['_id']} {job['topic'][:40]!r}: {last}")
+    else:
+        print("requeued" if requeue(db, args.job_id) else "not a dead job")
+
+
+if __name__ == "__main__":
+    main()
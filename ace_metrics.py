@@ -0,0 +1,181 @@
+"""
+ace_metrics.py — Prometheus metrics for the generation engine
+Counters, gauges and histograms live in prometheus_client's default registry. They
+are served in the Prometheus text format on ACE_METRICS_PORT (0 = off, the default).
+streamlit_app.py starts the endpoint once per server process; an ace_jobs worker
+serves its own (`--metrics-port`). Each process exposes only its own numbers, so
+scrape every process and sum in PromQL.
+
+Run-level metrics are labelled by depth level and output type. The labels are taken
+once, when `run()` starts. A settings change in another session therefore never
+relabels a run midway.
+
+    ace_node_seconds{node,depth,output_type}                 graph node latency (histogram)
+    ace_llm_calls_total{node,model,outcome,depth,output_type} LLM calls, outcome ok | error
+    ace_llm_tokens_total{node,direction,depth,output_type}    tokens, direction in | out
+    ace_tavily_calls_total{outcome,depth,output_type}         Tavily searches, ok | error
+    ace_cache_requests_total{cache,result}                    search | evidence | render | image | session, hit | miss
+    ace_fanout_pending{depth,output_type}                     sections/image plans sent by fanout, not finished
+    ace_active_runs{depth,output_type}                        runs in progress
+    ace_mongo_op_seconds{op}                                  load_blogs | save_blog | get_user_from_token |
+                                                              writeback_<collection> | publish_image | fetch_image
+
+Hit ratio, e.g. for the evidence store:
+    sum(rate(ace_cache_requests_total{cache="evidence",result="hit"}[5m]))
+      / sum(rate(ace_cache_requests_total{cache="evidence"}[5m]))
+"""
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from ace_config import cfg
+
+log = logging.getLogger(__name__)
+
+_RUN_LABELS = ("depth", "output_type")
+
+NODE_SECONDS = Histogram(
+    "ace_node_seconds", "Wall time of one graph node call", ("node", *_RUN_LABELS),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+LLM_CALLS = Counter("ace_llm_calls", "LLM calls by node, model and outcome (ok | error)",
+                    ("node", "model", "outcome", *_RUN_LABELS))
+LLM_TOKENS = Counter("ace_llm_tokens", "LLM tokens by node and direction (in | out)",
+                     ("node", "direction", *_RUN_LABELS))
+TAVILY_CALLS = Counter("ace_tavily_calls", "Tavily searches by outcome (ok | error)", ("outcome", *_RUN_LABELS))
+CACHE_REQUESTS = Counter("ace_cache_requests", "Cache lookups by cache and result (hit | miss)", ("cache", "result"))
+FANOUT_PENDING = Gauge("ace_fanout_pending", "Section and image tasks sent by fanout and not yet finished",
+                       _RUN_LABELS)
+ACTIVE_RUNS = Gauge("ace_active_runs", "Generation runs in progress in this process", _RUN_LABELS)
+MONGO_SECONDS = Histogram(
+    "ace_mongo_op_seconds", "Latency of MongoDB-backed operations", ("op",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+class _Run:
+    """Labels and fan-out bookkeeping shared by every thread of one run (or batch)."""
+
+    def __init__(self, labels: tuple):
+        self.labels = labels
+        self.pending = 0
+        self.lock = threading.Lock()
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("ace_metrics_run", default=None)
+_served: dict = {}
+_serve_lock = threading.Lock()
+
+
+def _labels() -> tuple:
+    r = _current.get()
+    return r.labels if r is not None else (cfg.depth_level, cfg.output_type)
+
+
+@contextlib.contextmanager
+def run(count: int = 1):
+    """Count `count` runs as active until exit and pin their labels to the current settings.
+
+    Threads pick the run up through contextvars, like ace_profile sessions. Fan-out tasks
+    still pending at exit (e.g. cancelled after a sibling failed) are taken off the gauge.
+    """
+    r = _Run((cfg.depth_level, cfg.output_type))
+    token = _current.set(r)
+    ACTIVE_RUNS.labels(*r.labels).inc(count)
+    try:
+        yield r
+    finally:
+        _current.reset(token)
+        ACTIVE_RUNS.labels(*r.labels).dec(count)
+        with r.lock:
+            left, r.pending = r.pending, 0
+        if left:
+            FANOUT_PENDING.labels(*r.labels).dec(left)
+
+
+def fanout_sent(n: int):
+    r = _current.get()
+    if r is not None:
+        with r.lock:
+            r.pending += n
+    FANOUT_PENDING.labels(*_labels()).inc(n)
+
+
+def _fanout_done():
+    r = _current.get()
+    if r is not None:
+        with r.lock:
+            if r.pending <= 0:           # already settled by run() exit
+                return
+            r.pending -= 1
+    FANOUT_PENDING.labels(*_labels()).dec()
+
+
+def wrap(name: str, fn, fanned_out: bool = False):
+    """Graph-node wrapper: observes the node's latency; `fanned_out` nodes (Send targets)
+    also leave the fan-out queue when they finish."""
+    @functools.wraps(fn)
+    def node(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            NODE_SECONDS.labels(name, *_labels()).observe(time.perf_counter() - t0)
+            if fanned_out:
+                _fanout_done()
+    return node
+
+
+def llm_call(node: str, model: str, ok: bool, tokens_in: int = 0, tokens_out: int = 0):
+    labels = _labels()
+    LLM_CALLS.labels(node, model, "ok" if ok else "error", *labels).inc()
+    if tokens_in:
+        LLM_TOKENS.labels(node, "in", *labels).inc(tokens_in)
+    if tokens_out:
+        LLM_TOKENS.labels(node, "out", *labels).inc(tokens_out)
+
+
+def tavily_call(ok: bool):
+    TAVILY_CALLS.labels("ok" if ok else "error", *_labels()).inc()
+
+
+def cache(name: str, hits: int = 0, misses: int = 0):
+    if hits:
+        CACHE_REQUESTS.labels(name, "hit").inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(name, "miss").inc(misses)
+
+
+@contextlib.contextmanager
+def mongo_op(op: str):
+    """Time a MongoDB-backed operation (observed on errors too)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        MONGO_SECONDS.labels(op).observe(time.perf_counter() - t0)
+
+
+def serve(port: int = None) -> bool:
+    """Start the /metrics endpoint on `port` (default ACE_METRICS_PORT) once per process.
+
+    Returns whether it is being served. A port already in use (e.g. a second app
+    process on the same host) is logged, not raised.
+    """
+    port = cfg.metrics_port if port is None else port
+    if port <= 0:
+        return False
+    with _serve_lock:
+        if port not in _served:
+            try:
+                start_http_server(port, addr=cfg.metrics_addr)
+                _served[port] = True
+            except OSError as e:
+                log.warning("metrics: could not listen on port %d: %s", port, e)
+                _served[port] = False
+        return _served[port]
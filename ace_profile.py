@@ -0,0 +1,296 @@
+"""
+ace_profile.py — Opt-in profiling of generation runs, per graph node
+Off unless ACE_PROFILE is set, or a caller passes `mode` to `session()`. Each graph
+node in ACE_backend is wrapped with `wrap()`. When no session is active, a wrapped
+node costs one ContextVar lookup.
+
+    ACE_PROFILE=sample        wall-clock stack sampling of node threads → <run>.speedscope.json
+    ACE_PROFILE=cprofile      deterministic cProfile per node → <run>.<node>.pstats
+    ACE_PROFILE_DIR           where artefacts go (default ./profiles)
+    ACE_PROFILE_INTERVAL_MS   sampling interval (default 5)
+
+Every run also writes <run>.summary.json: wall time and calls per node, and in sample
+mode the seconds spent on network, validation, rate_limit, waiting (threads/futures),
+streamlit, app_code (this repo) and other libraries. Sampling sees blocked threads
+too, so network waits show up.
+cProfile only sees its own thread; on Python 3.12+ a second concurrent cProfile cannot
+start, so overlapping node calls go unprofiled and are counted as `skipped`. The outer
+trackers around a whole run ("streamlit", "job") are only timed, never cProfiled, so they
+do not hold the one profiler slot for the whole run. Work a node hands to a thread pool
+(hedged and deadline-bound LLM calls, image generation) is tracked under that node's
+name through `carry()`.
+
+    with ace_profile.session("my topic"):       # or ace_profile.session("x", mode="sample")
+        app.invoke({"topic": "my topic"})
+
+speedscope JSON opens at https://www.speedscope.app; .pstats files open with
+`python -m pstats` or snakeviz.
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from ace_config import cfg
+
+_current: contextvars.ContextVar = contextvars.ContextVar("ace_profile_session", default=None)
+
+# A sample's category comes from the library frames between the innermost frame and the
+# nearest frame of this repo's own code. If the innermost frame is our own code, the
+# sample is "app_code" (prompt building, assembly), or "rate_limit" inside ace_ratelimit.
+_CATEGORIES = (
+    ("network",    ("socket.py", "ssl.py", "http/client.py", "httpx", "httpcore", "urllib3",
+                    "requests", "grpc", "selectors.py", "pymongo")),
+    ("validation", ("pydantic",)),
+    ("streamlit",  ("streamlit",)),
+    ("waiting",    ("threading.py", "concurrent/futures", "queue.py")),
+)
+_ROOT = os.path.dirname(os.path.abspath(__file__)).replace("\\", "/") + "/"
+
+
+def _category(stack: list, frames: list) -> str:
+    for idx in reversed(stack):
+        path = frames[idx]["file"].replace("\\", "/")
+        if path.startswith(_ROOT) and "site-packages" not in path:
+            return "rate_limit" if path.endswith("ace_ratelimit.py") else "app_code"
+        for name, needles in _CATEGORIES:
+            if any(n in path for n in needles):
+                return name
+    return "other"
+
+
+class Session:
+    """One profiled run. Use through `session()`; artefacts are written on exit."""
+
+    def __init__(self, label: str, mode: str, out_dir: str, interval_ms: float):
+        self.label, self.mode, self.out_dir = label, mode, out_dir
+        self.interval = interval_ms / 1000
+        self.paths: list = []
+        self.breakdown: dict = {}
+        self.nodes: dict = {}            # name → {"calls", "seconds"}
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._threads: dict = {}         # thread id → stack of names being tracked
+        self._carried: dict = {}         # thread id → calls it has handed to other threads, running
+        self._frames: list = []
+        self._frame_ids: dict = {}
+        self._samples: dict = {}         # name → ([stack], [weight s])
+        self._stats: dict = {}           # name → pstats.Stats
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = time.perf_counter()
+
+    # ── tracking ─────────────────────────────────────────────────────────────
+    def current(self):
+        """Innermost name tracked on the calling thread, or None."""
+        with self._lock:
+            names = self._threads.get(threading.get_ident())
+            return names[-1] if names else None
+
+    @contextlib.contextmanager
+    def carrying(self, tid: int):
+        """While held, thread `tid` is not sampled: its time is the carried call's."""
+        with self._lock:
+            self._carried[tid] = self._carried.get(tid, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._carried[tid] -= 1
+                if not self._carried[tid]:
+                    del self._carried[tid]
+
+    @contextlib.contextmanager
+    def track(self, name: str, profile: bool = True, count: bool = True):
+        """`profile=False` only times (no cProfile); `count=False` samples/profiles under
+        `name` without adding a call or its seconds (for work carried to another thread)."""
+        tid = threading.get_ident()
+        prof = None
+        if self.mode == "cprofile" and profile:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:           # another profiler is active (3.12+ allows one)
+                prof = None
+                with self._lock:
+                    self.skipped += 1
+        with self._lock:
+            self._threads.setdefault(tid, []).append(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            if prof is not None:
+                prof.disable()
+            with self._lock:
+                names = self._threads[tid]
+                names.pop()
+                if not names:
+                    del self._threads[tid]
+                if count:
+                    node = self.nodes.setdefault(name, {"calls": 0, "seconds": 0.0})
+                    node["calls"] += 1
+                    node["seconds"] += seconds
+                if prof is not None:
+                    if name in self._stats:
+                        self._stats[name].add(prof)
+                    else:
+                        self._stats[name] = pstats.Stats(prof)
+
+    # ── sampling ─────────────────────────────────────────────────────────────
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        idx = self._frame_ids.get(key)
+        if idx is None:
+            idx = self._frame_ids[key] = len(self._frames)
+            self._frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return idx
+
+    def _sample_loop(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frames = sys._current_frames()
+            with self._lock:
+                active = {tid: names[-1] for tid, names in self._threads.items() if tid not in self._carried}
+            for tid, name in active.items():
+                f = frames.get(tid)
+                stack = []
+                while f is not None:
+                    stack.append(self._frame_id(f.f_code))
+                    f = f.f_back
+                stack.reverse()
+                samples, weights = self._samples.setdefault(name, ([], []))
+                samples.append(stack)
+                weights.append(weight)
+
+    def start(self):
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample_loop, name="ace-profile", daemon=True)
+            self._sampler.start()
+
+    # ── output ───────────────────────────────────────────────────────────────
+    def close(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        os.makedirs(self.out_dir, exist_ok=True)
+        slug = re.sub(r"[^a-z0-9]+", "-", self.label.lower()).strip("-")[:40] or "run"
+        stem = os.path.join(self.out_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{slug}")
+
+        if self.mode == "sample" and self._samples:
+            profiles = []
+            totals: dict = {}
+            for name, (samples, weights) in self._samples.items():
+                for stack, w in zip(samples, weights):
+                    cat = _category(stack, self._frames)
+                    totals[cat] = totals.get(cat, 0.0) + w
+                profiles.append({
+                    "type": "sampled", "name": name, "unit": "milliseconds",
+                    "startValue": 0, "endValue": round(sum(weights) * 1000, 3),
+                    "samples": samples, "weights": [round(w * 1000, 3) for w in weights],
+                })
+            path = f"{stem}.speedscope.json"
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "$schema": "https://www.speedscope.app/file-format-schema.json",
+                    "name": self.label, "exporter": "ace_profile",
+                    "shared": {"frames": self._frames}, "profiles": profiles,
+                }, f)
+            self.paths.append(path)
+            self.breakdown = {k: round(v, 3) for k, v in sorted(totals.items(), key=lambda kv: -kv[1])}
+
+        for name, stats in self._stats.items():
+            path = f"{stem}.{name}.pstats"
+            stats.dump_stats(path)
+            self.paths.append(path)
+
+        path = f"{stem}.summary.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "label": self.label, "mode": self.mode,
+                "wall_seconds": round(time.perf_counter() - self._started, 3),
+                "nodes": {k: {"calls": v["calls"], "seconds": round(v["seconds"], 3)} for k, v in self.nodes.items()},
+                "breakdown_seconds": self.breakdown, "skipped": self.skipped, "artefacts": list(self.paths),
+            }, f, indent=2)
+        self.paths.append(path)
+
+
+def _mode(mode) -> str:
+    mode = (mode if mode is not None else cfg.profile_mode).strip().lower()
+    return "sample" if mode in ("1", "true", "yes") else mode if mode in ("sample", "cprofile") else ""
+
+
+@contextlib.contextmanager
+def session(label: str, mode: str = None):
+    """Profile everything tracked until exit; yields the Session, or None when profiling is off.
+
+    `mode` ("sample" | "cprofile" | "") overrides ACE_PROFILE for this run. Threads pick the
+    session up through contextvars, which LangGraph copies into its worker threads.
+    """
+    mode = _mode(mode)
+    if not mode:
+        yield None
+        return
+    s = Session(label, mode, cfg.profile_dir, cfg.profile_interval_ms)
+    token = _current.set(s)
+    s.start()
+    try:
+        yield s
+    finally:
+        _current.reset(token)
+        s.close()
+
+
+def summary(s: Session) -> dict:
+    """Plain-JSON summary of a closed session, for storing with the saved document."""
+    return {"mode": s.mode, "breakdown_seconds": s.breakdown, "artefacts": list(s.paths)}
+
+
+def track(name: str, profile: bool = True):
+    """Attribute the current thread's time to `name` in the active session (no-op when off).
+
+    Pass `profile=False` for trackers that span a whole run, so cProfile stays free for nodes.
+    """
+    s = _current.get()
+    return s.track(name, profile=profile) if s is not None else contextlib.nullcontext()
+
+
+def carry(fn):
+    """Wrap `fn` so that, run on another thread, it is tracked under the calling thread's
+    current name. The calling thread is not sampled while it runs, so its wait on the
+    result is not counted twice. Returns `fn` unchanged when no session is active or
+    nothing is tracked."""
+    s = _current.get()
+    name = s.current() if s is not None else None
+    if name is None:
+        return fn
+    parent = threading.get_ident()
+
+    @functools.wraps(fn)
+    def carried(*args, **kwargs):
+        with s.carrying(parent), s.track(name, count=False):
+            return fn(*args, **kwargs)
+    return carried
+
+
+def wrap(name: str, fn):
+    """Graph-node wrapper: profiles `fn` under `name` when a session is active."""
+    @functools.wraps(fn)
+    def node(*args, **kwargs):
+        s = _current.get()
+        if s is None:
+            return fn(*args, **kwargs)
+        with s.track(name):
+            return fn(*args, **kwargs)
+    return node
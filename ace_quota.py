@@ -0,0 +1,146 @@
+"""
+ace_quota.py — Per-user generation quotas, enforced in MongoDB
+Each user has two token buckets per depth level: runs per minute and LLM tokens per
+day (limits in AceConfig.DEPTH_QUOTAS). `check` takes one run before the pipeline
+starts and also needs a positive token balance. `charge` debits the tokens a run
+actually used once it finishes, so one large run can push the balance below zero.
+Buckets live in the `quotas` collection, so every app process and job worker shares
+one budget. Updates are compare-and-set on a version field. A rejection is
+remembered in-process until its retry time, so repeated clicks are turned away
+without a database round trip. By default only users on the server's key are
+limited (ACE_QUOTA_OWN_KEY=1 limits everyone).
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+from ace_config import cfg
+
+DAY = 86400
+IDLE_TTL = 2 * DAY          # an untouched bucket is full again by then; its document expires
+_CAS_RETRIES = 8
+
+_blocked: dict = {}         # (user_id, depth) → (monotonic deadline, QuotaExceeded)
+_blocked_lock = threading.Lock()
+
+
+class QuotaExceeded(Exception):
+    """Raised before any LLM call when a user is over quota; carries retry_after seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason, self.retry_after = reason, retry_after
+
+    def __str__(self):
+        return f"{self.reason} Try again in {format_wait(self.retry_after)}."
+
+
+def ensure_indexes(db):
+    db["quotas"].create_index("expire_at", expireAfterSeconds=0)
+
+
+def applies(own_key: bool) -> bool:
+    return cfg.quota_enabled and (cfg.quota_own_key or not own_key)
+
+
+def format_wait(seconds: float) -> str:
+    seconds = max(1, int(seconds + 0.999))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60} s"
+    return f"{seconds // 3600} h {seconds % 3600 // 60} min"
+
+
+def _level(bucket, capacity: float, per_sec: float, now: float) -> float:
+    if bucket is None:
+        return capacity
+    return min(capacity, bucket["level"] + (now - bucket["at"]) * per_sec)
+
+
+def _update(db, user_id: str, depth: str, step):
+    """Compare-and-set loop over the user's quota document.
+
+    `step(runs, tokens, limits)` gets the refilled levels and returns the
+    (runs, tokens) levels to write, or raises.
+    """
+    limits = cfg.quota_for(depth)
+    runs_cap, tokens_cap = limits["runs_per_min"], limits["tokens_per_day"]
+    key = f"{user_id}|{depth}"
+    coll = db["quotas"]
+    for _ in range(_CAS_RETRIES):
+        doc = coll.find_one({"_id": key})
+        now = time.time()
+        runs = _level(doc and doc.get("runs"), runs_cap, runs_cap / 60, now)
+        tokens = _level(doc and doc.get("tokens"), tokens_cap, tokens_cap / DAY, now)
+        new_runs, new_tokens = step(runs, tokens, limits)
+        fields = {
+            "runs":      {"level": new_runs, "at": now},
+            "tokens":    {"level": new_tokens, "at": now},
+            "user_id":   user_id,
+            "depth":     depth,
+            "expire_at": _expire_at(now),
+        }
+        if doc is None:
+            try:
+                coll.insert_one({"_id": key, "v": 1, **fields})
+                return
+            except DuplicateKeyError:
+                continue
+        if coll.update_one({"_id": key, "v": doc["v"]}, {"$set": fields, "$inc": {"v": 1}}).matched_count:
+            return
+    raise RuntimeError(f"quota update for {key} kept conflicting")
+
+
+def _expire_at(now: float) -> datetime:
+    return datetime.fromtimestamp(now + IDLE_TTL, timezone.utc)
+
+
+def _remember(user_id: str, depth: str, err: QuotaExceeded):
+    with _blocked_lock:
+        _blocked[(user_id, depth)] = (time.monotonic() + err.retry_after, err)
+
+
+def check(db, user_id: str, depth: str, own_key: bool = False):
+    """Take one run from the user's quota or raise QuotaExceeded. Call before any LLM work."""
+    if not applies(own_key):
+        return
+    with _blocked_lock:
+        until, err = _blocked.get((user_id, depth), (0, None))
+    if err is not None:
+        left = until - time.monotonic()
+        if left > 0:
+            raise QuotaExceeded(err.reason, left)
+
+    def step(runs, tokens, limits):
+        rpm, per_day = limits["runs_per_min"], limits["tokens_per_day"]
+        if per_day > 0 and tokens <= 0:
+            wait = (1 - tokens) / (per_day / DAY)
+            raise QuotaExceeded(f"Daily token budget for {depth} used up ({per_day:,.0f} tokens/day).", wait)
+        if rpm > 0 and runs < 1:
+            wait = (1 - runs) / (rpm / 60)
+            raise QuotaExceeded(f"Run limit for {depth} reached ({rpm:g} per minute).", wait)
+        return (runs - 1 if rpm > 0 else runs), tokens
+
+    try:
+        _update(db, user_id, depth, step)
+    except QuotaExceeded as e:
+        _remember(user_id, depth, e)
+        raise
+
+
+def charge(db, user_id: str, depth: str, tokens_used: int, own_key: bool = False):
+    """Debit the tokens a finished run used (the balance may go negative)."""
+    if not applies(own_key) or tokens_used <= 0:
+        return
+
+    def step(runs, tokens, limits):
+        return runs, (tokens - tokens_used if limits["tokens_per_day"] > 0 else tokens)
+
+    _update(db, user_id, depth, step)
+
+
+def tokens_used(llm_calls: list) -> int:
+    return sum(c.get("input_tokens", 0) + c.get("output_tokens", 0) for c in llm_calls)
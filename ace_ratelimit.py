@@ -0,0 +1,104 @@
+"""
+ace_ratelimit.py — Process-wide request rate limits for external APIs
+Limiter state is shared by all sessions and worker threads in the process.
+SharedRateLimiter keeps the same bucket in shared memory so several processes
+(ace_batch) draw from one quota.
+"""
+import multiprocessing
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket: `per_minute` requests/minute with bursts up to `burst`. 0 = unlimited."""
+
+    def __init__(self, per_minute: float = 0, burst: int = 0):
+        self._lock = threading.Lock()
+        self.configure(per_minute, burst)
+
+    def configure(self, per_minute: float, burst: int = 0):
+        with self._lock:
+            self.per_minute = per_minute
+            self.capacity = burst or max(1, int(per_minute // 6))   # ~10 s of traffic
+            self._tokens = float(self.capacity)
+            self._stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.per_minute / 60)
+        self._stamp = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available right now (used for optional extra calls)."""
+        if self.per_minute <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Block until a token is available, or for at most `timeout` s (False if none came)."""
+        if self.per_minute <= 0:
+            return True
+        end = None if timeout is None else time.monotonic() + max(0.0, timeout)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) * 60 / self.per_minute
+            if end is not None:
+                left = end - time.monotonic()
+                if left <= 0:
+                    return False
+                wait = min(wait, left)
+            time.sleep(wait)
+
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter whose bucket lives in shared memory: one budget for every process.
+
+    Create it in the parent and hand it to child processes at start-up (e.g. as a
+    ProcessPoolExecutor initarg), then `install` it there. CLOCK_MONOTONIC is
+    system-wide on Linux/macOS, so refill stamps agree across processes.
+    """
+
+    def __init__(self, per_minute: float = 0, burst: int = 0, ctx=None):
+        ctx = ctx or multiprocessing.get_context("spawn")
+        self._lock = ctx.Lock()
+        self._shared = ctx.RawArray("d", 4)     # per_minute, capacity, tokens, stamp
+        self.configure(per_minute, burst)
+
+    def _field(i):
+        return property(lambda self: self._shared[i], lambda self, v: self._shared.__setitem__(i, v))
+
+    per_minute = _field(0)
+    capacity = _field(1)
+    _tokens = _field(2)
+    _stamp = _field(3)
+    del _field
+
+
+_limiters: dict = {}
+_registry_lock = threading.Lock()
+
+
+def install(name: str, lim: RateLimiter):
+    """Use `lim` for `name` in this process (e.g. a SharedRateLimiter in a batch worker)."""
+    with _registry_lock:
+        _limiters[name] = lim
+
+
+def limiter(name: str, per_minute: float) -> RateLimiter:
+    """Shared limiter for `name` ("llm", "tavily"); reconfigured if the rate setting changed."""
+    with _registry_lock:
+        lim = _limiters.get(name)
+        if lim is None:
+            lim = _limiters[name] = RateLimiter(per_minute)
+        elif lim.per_minute != per_minute:
+            lim.configure(per_minute)
+        return lim
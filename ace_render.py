@@ -0,0 +1,107 @@
+"""
+ace_render.py — Pre-rendered, sanitized HTML for viewing saved documents
+A document is converted once, at save time or on first view, into per-section HTML
+and cached in-process by content hash. Reruns reuse the cache instead of re-parsing
+the Markdown. streamlit_app.py shows long documents as collapsible sections and
+only sends the open ones to the browser.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import ace_images
+import ace_metrics
+
+LAZY_MIN_WORDS = 2500        # longer documents render as collapsible sections
+CACHE_SIZE = 64
+
+_EXTENSIONS = ["fenced_code", "tables", "sane_lists"]
+_FENCE_RE = re.compile(r"^(```|~~~)")
+_HEADING_RE = re.compile(r"^##\s+(.+?)\s*#*\s*$")
+
+_cache: OrderedDict = OrderedDict()
+_lock = threading.Lock()
+
+
+def content_hash(md: str) -> str:
+    return hashlib.sha256(md.encode("utf-8")).hexdigest()[:16]
+
+
+def to_html(md: str) -> str:
+    # Output is model-generated and may quote arbitrary HTML; nh3 keeps only safe tags
+    # and attributes and adds rel="noopener noreferrer" to links.
+    # Imported here so pages that never open a document don't load them.
+    import markdown
+    import nh3
+
+    return nh3.clean(markdown.markdown(md, extensions=_EXTENSIONS))
+
+
+def _parts(md: str) -> list:
+    """("html", str) and ("image", path, alt, caption) parts; images are drawn with st.image."""
+    out = []
+    for seg in ace_images.segments(md):
+        if seg[0] == "md":
+            if seg[1].strip():
+                out.append(("html", to_html(seg[1])))
+        else:
+            out.append(seg)
+    return out
+
+
+def _split(md: str):
+    """(preamble, [(title, body)]) split on level-2 headings outside code fences."""
+    preamble, sections, fenced = [], [], False
+    for line in md.splitlines():
+        if _FENCE_RE.match(line.lstrip()):
+            fenced = not fenced
+        m = None if fenced else _HEADING_RE.match(line)
+        if m:
+            sections.append((m.group(1), []))
+        elif sections:
+            sections[-1][1].append(line)
+        else:
+            preamble.append(line)
+    return "\n".join(preamble), [(title, "\n".join(body)) for title, body in sections]
+
+
+def render(md: str) -> dict:
+    """Cached render of a whole document.
+
+    Returns {"hash", "words", "lazy", "preamble": parts, "sections": [{"title", "words",
+    "heading", "parts"}]}. `heading` is the section's <h2> for the expanded
+    (non-lazy) layout; `parts` is the body only.
+    """
+    key = content_hash(md)
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+    ace_metrics.cache("render", hits=int(hit is not None), misses=int(hit is None))
+    if hit is not None:
+        return hit
+
+    preamble, split = _split(md)
+    sections = [
+        {
+            "title":   title,
+            "words":   len(body.split()),
+            "heading": to_html(f"## {title}"),
+            "parts":   _parts(body),
+        }
+        for title, body in split
+    ]
+    words = len(md.split())
+    doc = {
+        "hash":     key,
+        "words":    words,
+        "lazy":     words >= LAZY_MIN_WORDS and len(sections) > 1,
+        "preamble": _parts(preamble),
+        "sections": sections,
+    }
+    with _lock:
+        _cache[key] = doc
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return doc
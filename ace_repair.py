@@ -0,0 +1,344 @@
+"""
+ace_repair.py — Local repair of structured LLM output that failed schema validation
+When `with_structured_output` can't parse a reply (2 or 7 bullets, a number where a
+string is expected, a truncated or fenced JSON object), the raw reply is repaired
+here — lenient JSON parsing, then a schema-driven pass that coerces scalars, clamps
+or pads lists and fills missing fields — and validated again. A remote retry is
+only needed when this returns None.
+
+Counters are process-wide.
+"""
+import json
+import re
+import threading
+import typing
+from typing import Literal, Union
+
+from pydantic import BaseModel, ValidationError
+
+_MISSING = object()
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# LENIENT JSON
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _scan(text: str):
+    """Yield (index, open-bracket stack, in_string) after each char, JSON string-aware."""
+    stack, in_str, esc = [], False, False
+    for i, ch in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]" and stack:
+            stack.pop()
+        yield i, stack, in_str
+
+
+def _closers(stack) -> str:
+    return "".join("}" if c == "{" else "]" for c in reversed(stack))
+
+
+def _close_truncated(text: str):
+    """Best-effort parse of a reply cut off mid-object (e.g. at max_output_tokens).
+
+    Tries the full text with its brackets closed, then cuts back to each earlier
+    comma so a half-written key or value is dropped rather than guessed.
+    """
+    cuts, stack, in_str = [], [], False
+    for i, stack, in_str in _scan(text):
+        if not in_str and text[i] == ",":
+            cuts.append((i, list(stack)))
+    tail = text + ('"' if in_str else "")
+    candidates = [(tail, list(stack))] + [(text[:i], s) for i, s in reversed(cuts[-50:])]
+    for body, st in candidates:
+        try:
+            return json.loads(_TRAILING_COMMA_RE.sub(r"\1", body.rstrip().rstrip(",:")) + _closers(st))
+        except ValueError:
+            continue
+    return _MISSING
+
+
+def loads_lenient(text: str, fixes: list):
+    """json.loads that tolerates code fences, prose around the object, trailing
+    commas and truncation. Returns _MISSING when nothing usable is found."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    s = _FENCE_RE.sub("", text.strip())
+    starts = [i for i in (s.find("{"), s.find("[")) if i >= 0]
+    if not starts:
+        return _MISSING
+    s = s[min(starts):]
+    end = max(s.rfind("}"), s.rfind("]"))
+    for body in ((s[:end + 1], s) if end >= 0 else (s,)):
+        try:
+            obj = json.loads(_TRAILING_COMMA_RE.sub(r"\1", body))
+            fixes.append("lenient JSON")
+            return obj
+        except ValueError:
+            continue
+    obj = _close_truncated(s)
+    if obj is not _MISSING:
+        fixes.append("closed truncated JSON")
+    return obj
+
+
+def _payload(raw, fixes: list):
+    """The structured payload of a raw AIMessage: tool-call args, else the text content."""
+    for call in getattr(raw, "tool_calls", None) or []:
+        if isinstance(call.get("args"), dict):
+            return call["args"]
+    for call in getattr(raw, "invalid_tool_calls", None) or []:
+        if isinstance(call.get("args"), str):
+            return loads_lenient(call["args"], fixes)
+    content = getattr(raw, "content", raw)
+    if isinstance(content, list):
+        content = "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    if isinstance(content, dict):
+        return content
+    return loads_lenient(content or "", fixes)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SCHEMA-DRIVEN COERCION
+# ═════════════════════════════════════════════════════════════════════════════
+# Schema-specific knowledge lives in the two tables below; everything else is
+# driven by the pydantic field annotations and length constraints.
+
+def _pad_bullets(item: dict):
+    title = item.get("title") or "this section"
+    return [item.get("goal") or f"What {title} is and why it matters",
+            f"Key details of {title}",
+            f"Practical implications of {title}"]
+
+
+# (model, field) -> fn(item, index, hints) for required fields the reply left out.
+_FILL = {
+    ("Task", "id"):               lambda item, i, h: i + 1,
+    ("Task", "title"):            lambda item, i, h: f"Section {i + 1}",
+    ("Task", "goal"):             lambda item, i, h: item.get("title") or _MISSING,
+    ("Task", "target_words"):     lambda item, i, h: h.get("target_words", _MISSING),
+    ("Task", "bullets"):          lambda item, i, h: [],
+    ("Plan", "blog_title"):       lambda item, i, h: h.get("blog_title", _MISSING),
+    ("Plan", "audience"):         lambda item, i, h: h.get("audience", "general readers"),
+    ("Plan", "tone"):             lambda item, i, h: h.get("tone", "clear and practical"),
+    ("RouterDecision", "needs_research"): lambda item, i, h: _norm(item.get("mode") or "closed_book") != "closedbook",
+    ("RouterDecision", "mode"):   lambda item, i, h: "hybrid" if item.get("needs_research") else "closed_book",
+    ("TopicPlan", "topic_no"):    lambda item, i, h: i + 1,
+    ("TopicPlan", "needs_research"): lambda item, i, h: _norm(item.get("mode") or "closed_book") != "closedbook",
+    ("TopicPlan", "mode"):        lambda item, i, h: "hybrid" if item.get("needs_research") else "closed_book",
+    ("EvidenceItem", "title"):    lambda item, i, h: item.get("url") or _MISSING,
+}
+
+# (model, field) -> fn(item) giving candidate entries to pad a too-short list with.
+_PAD = {
+    ("Task", "bullets"): _pad_bullets,
+}
+
+
+def _norm(key) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(key).lower())
+
+
+def _bounds(info):
+    lo = hi = None
+    for m in info.metadata:
+        lo = getattr(m, "min_length", lo)
+        hi = getattr(m, "max_length", hi)
+    return lo, hi
+
+
+def _coerce(tp, value, path: str, fixes: list, hints: dict, index: int = 0):
+    """Coerce `value` towards annotation `tp`; returns _MISSING if it can't be used."""
+    origin, args = typing.get_origin(tp), typing.get_args(tp)
+
+    if origin is Union:
+        if value is None and type(None) in args:
+            return None
+        inner = [a for a in args if a is not type(None)]
+        return _coerce(inner[0], value, path, fixes, hints, index) if len(inner) == 1 else value
+
+    if isinstance(tp, type) and issubclass(tp, BaseModel):
+        if isinstance(value, str):
+            value = loads_lenient(value, fixes)
+        return _coerce_model(tp, value, path, fixes, hints, index) if isinstance(value, dict) else _MISSING
+
+    if origin is Literal:
+        if value in args:
+            return value
+        wanted = _norm(value)
+        for a in args:
+            if _norm(a) == wanted:
+                fixes.append(f"{path}: {value!r} -> {a!r}")
+                return a
+        return _MISSING
+
+    if origin in (list, typing.List):
+        elem = args[0] if args else typing.Any
+        if isinstance(value, str):
+            value = [p.strip(" -*•\t") for p in re.split(r"\n|;", value)]
+            fixes.append(f"{path}: split string into list")
+        elif not isinstance(value, (list, tuple)):
+            value = [] if value is None else [value]
+        out = []
+        for i, v in enumerate(value):
+            c = _coerce(elem, v, f"{path}[{i}]", fixes, hints, i)
+            if c is _MISSING or c == "" or c is None:
+                fixes.append(f"{path}[{i}]: dropped unusable entry")
+                continue
+            out.append(c)
+        return out
+
+    if tp is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "yes", "1", "false", "no", "0"):
+            fixes.append(f"{path}: {value!r} -> bool")
+            return value.strip().lower() in ("true", "yes", "1")
+        if isinstance(value, (int, float)):
+            return bool(value)
+        return _MISSING
+
+    if tp is int:
+        if isinstance(value, bool):
+            return _MISSING
+        if isinstance(value, int):
+            return value
+        m = re.search(r"-?\d+", str(value)) if value is not None else None
+        if m:
+            fixes.append(f"{path}: {value!r} -> int")
+            return int(m.group())
+        return _MISSING
+
+    if tp is str:
+        if isinstance(value, str):
+            return value.strip()
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            fixes.append(f"{path}: {value!r} -> str")
+            return str(value)
+        if isinstance(value, list) and all(isinstance(v, str) for v in value):
+            fixes.append(f"{path}: joined list into str")
+            return "; ".join(value)
+        return _MISSING
+
+    return value
+
+
+def _coerce_model(model, data: dict, path: str, fixes: list, hints: dict, index: int = 0):
+    by_norm = {_norm(k): k for k in data}
+    item = {}
+    # Rename near-miss keys first (blogTitle, "Target Words") so fill hooks can see siblings.
+    for name in model.model_fields:
+        if name in data:
+            item[name] = data[name]
+        elif _norm(name) in by_norm:
+            item[name] = data[by_norm[_norm(name)]]
+            fixes.append(f"{path}.{by_norm[_norm(name)]} -> {name}")
+
+    for name, info in model.model_fields.items():
+        where = f"{path}.{name}"
+        value = item.get(name, _MISSING)
+        if value is not _MISSING and value is not None:
+            value = _coerce(info.annotation, value, where, fixes, hints, index)
+        elif value is None and not info.is_required():
+            value = _coerce(info.annotation, None, where, fixes, hints, index)
+        if value is _MISSING or value is None and info.is_required():
+            if not info.is_required():
+                item.pop(name, None)
+                continue
+            fill = _FILL.get((model.__name__, name))
+            value = fill(item, index, hints) if fill else _MISSING
+            if value is _MISSING:
+                return _MISSING
+            fixes.append(f"{where}: filled missing value")
+
+        lo, hi = _bounds(info)
+        if isinstance(value, list):
+            if hi is not None and len(value) > hi:
+                fixes.append(f"{where}: clamped {len(value)} -> {hi} items")
+                value = value[:hi]
+            if lo is not None and len(value) < lo:
+                pad = _PAD.get((model.__name__, name))
+                extra = [p for p in (pad({**item, **{name: value}}) if pad else []) if p not in value]
+                if len(value) + len(extra) < lo:
+                    return _MISSING
+                fixes.append(f"{where}: padded {len(value)} -> {lo} items")
+                value = value + extra[:lo - len(value)]
+        item[name] = value
+
+    if model.__name__ == "Plan":
+        if not item["tasks"]:
+            return _MISSING                 # an empty plan is worth a retry
+        ids = [t["id"] for t in item["tasks"]]
+        if len(set(ids)) != len(ids):
+            for i, t in enumerate(item["tasks"]):
+                t["id"] = i + 1
+            fixes.append(f"{path}.tasks: renumbered duplicate ids")
+    return item
+
+
+def repair(schema, raw, hints: dict = None):
+    """Try to turn a raw reply that failed to parse into a `schema` instance.
+
+    `hints` supplies values for required fields the reply left out (e.g. the
+    planner's per-section word budget as `target_words`). Returns (instance, fixes)
+    where instance is None if the reply can't be salvaged locally.
+    """
+    fixes: list = []
+    data = _payload(raw, fixes)
+    if isinstance(data, list) and len(data) == 1 and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        return None, fixes
+    # Replies occasionally wrap the object: {"Plan": {...}} or {"properties": {...}}.
+    if len(data) == 1 and isinstance(next(iter(data.values())), dict) \
+            and next(iter(data)) not in schema.model_fields:
+        data = next(iter(data.values()))
+        fixes.append("unwrapped nested object")
+    item = _coerce_model(schema, data, schema.__name__, fixes, hints or {})
+    if item is _MISSING:
+        return None, fixes
+    try:
+        return schema.model_validate(item), fixes
+    except ValidationError:
+        return None, fixes
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# STATS
+# ═════════════════════════════════════════════════════════════════════════════
+
+_lock = threading.Lock()
+_stats = {"parse_failures": 0, "repaired": 0, "retried": 0, "saved_seconds": 0.0}
+
+
+def record(repaired: bool, saved_seconds: float = 0.0):
+    """Count one parse failure; `saved_seconds` is the retry latency a repair avoided."""
+    with _lock:
+        _stats["parse_failures"] += 1
+        if repaired:
+            _stats["repaired"] += 1
+            _stats["saved_seconds"] += saved_seconds
+        else:
+            _stats["retried"] += 1
+
+
+def stats() -> dict:
+    """Process-wide totals plus `repair_rate` (repaired / parse failures)."""
+    with _lock:
+        out = dict(_stats)
+    out["repair_rate"] = out["repaired"] / out["parse_failures"] if out["parse_failures"] else 0.0
+    out["saved_seconds"] = round(out["saved_seconds"], 3)
+    return out
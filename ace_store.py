@@ -0,0 +1,253 @@
+"""
+ace_store.py — MongoDB data access for generated history
+streamlit_app.py owns the client (cached with st.cache_resource) and passes `db` in.
+Listing and search queries project metadata only; the Markdown body is fetched on demand.
+
+Bodies live zlib-compressed in `blog_bodies` (same `_id` as the `blogs` entry), so
+`blogs` stays small. `blog_search` (same `_id` again) holds what full-text search needs:
+title, topic and the distinct words of the body. Entries saved before this layout still
+carry an inline `markdown` and are read as-is.
+"""
+import re
+import zlib
+from datetime import datetime, timezone
+
+from bson import Binary, ObjectId
+from pymongo.errors import OperationFailure
+
+import ace_metrics
+
+# Everything the sidebar / output header needs — deliberately excludes `markdown`.
+BLOG_LIST_FIELDS = {
+    "blog_title":        1,
+    "filename":          1,
+    "mode":              1,
+    "output_type":       1,
+    "section_count":     1,
+    "words_per_section": 1,
+    "depth_level":       1,
+    "tone":              1,
+    "topic":             1,
+    "created_at":        1,
+    "saved_at":          1,
+}
+
+HISTORY_PAGE_SIZE = 50
+
+BODY_CODEC = "zlib"
+BODY_LEVEL = 6
+_WORD_RE = re.compile(r"\w{2,}")
+
+
+def ensure_indexes(db):
+    # (user_id, saved_at) serves both the equality match and the sort, so
+    # listing never falls back to an in-memory SORT stage.
+    db["blogs"].create_index([("user_id", 1), ("saved_at", -1)])
+    # user_id prefix on the text index: every search scans one user's postings
+    # only, so latency tracks that user's matches, not the whole collection.
+    db["blog_search"].create_index(
+        [("user_id", 1), ("blog_title", "text"), ("topic", "text"), ("search_text", "text")],
+        weights={"blog_title": 10, "topic": 5, "search_text": 1},
+        default_language="english",
+        name="blog_search_text",
+    )
+    if "blogs_search" in db["blogs"].index_information():
+        _move_search_text(db)
+
+
+def _move_search_text(db):
+    """One-off: move search data out of `blogs` (the old `blogs_search` layout) into `blog_search`.
+
+    The old text index is dropped last, so a migration cut short is picked up again
+    by the next ensure_indexes(); every step is idempotent.
+    """
+    legacy = {"$or": [{"search_text": {"$exists": True}}, {"markdown": {"$exists": True}}]}
+    fields = {"user_id": 1, "saved_at": 1, "blog_title": 1, "topic": 1, "search_text": 1, "markdown": 1}
+    for doc in db["blogs"].find(legacy, fields):
+        text = doc.get("search_text") or _search_text(doc.get("markdown", ""))
+        db["blog_search"].replace_one({"_id": doc["_id"]}, _search_entry(doc, text), upsert=True)
+        db["blogs"].update_one({"_id": doc["_id"]}, {"$unset": {"search_text": ""}})
+    try:
+        db["blogs"].drop_index("blogs_search")
+    except OperationFailure as e:
+        if e.code != 27:                    # IndexNotFound: another process finished first
+            raise
+
+
+def list_entry(doc: dict) -> dict:
+    """Reduce a saved document to what a listing query would have returned."""
+    return {k: doc[k] for k in ("_id", *BLOG_LIST_FIELDS) if k in doc}
+
+
+def _compress(md: str) -> bytes:
+    return zlib.compress(md.encode("utf-8"), BODY_LEVEL)
+
+
+def _decompress(body: dict) -> str:
+    if body.get("codec") != BODY_CODEC:
+        raise ValueError(f"Unknown body codec: {body.get('codec')!r}")
+    return zlib.decompress(body["data"]).decode("utf-8")
+
+
+def _search_text(md: str) -> str:
+    # Distinct words only: the text index ignores repetition, so this keeps search
+    # over the body without storing the body twice.
+    return " ".join(sorted(set(_WORD_RE.findall(md.lower()))))
+
+
+def _search_entry(doc: dict, search_text: str) -> dict:
+    # saved_at is kept here too so search can sort and page without reading `blogs`.
+    return {
+        "_id":         doc["_id"],
+        "user_id":     doc["user_id"],
+        "saved_at":    doc.get("saved_at"),
+        "blog_title":  doc.get("blog_title", ""),
+        "topic":       doc.get("topic", ""),
+        "search_text": search_text,
+    }
+
+
+def build_entry(topic: str, settings: dict, blog_title: str, md: str, mode: str,
+                run_stats: dict, degradations: list) -> dict:
+    """The document save_blog stores for one finished run (`settings` as in user settings)."""
+    filename = (
+        "".join(c if c.isalnum() or c in (" ", "_", "-") else "" for c in blog_title)
+        .strip().lower().replace(" ", "_") + ".md"
+    )
+    return {
+        "blog_title":        blog_title,
+        "markdown":          md,
+        "filename":          filename,
+        "mode":              mode,
+        "output_type":       settings.get("output_type", "Study Guide"),
+        "section_count":     settings.get("section_count", 5),
+        "words_per_section": settings.get("words_per_section", 300),
+        "depth_level":       settings.get("depth_level", "Balanced"),
+        "tone":              settings.get("tone", "Educational"),
+        "topic":             topic,
+        "created_at":        datetime.now().strftime("%b %d %Y, %H:%M"),
+        "run_stats":         run_stats,
+        "degradations":      degradations,
+    }
+
+
+def save_blog(db, user_id: str, entry: dict, writer=None, blog_id=None) -> dict:
+    """Insert a finished document and return it with `_id` (str) and `saved_at` set.
+
+    The body and search entry are written first, so a `blogs` entry never points at a
+    missing body. With a `writer` (ace_writeback.WriteBehind) the inserts are queued and this
+    returns without touching the database. A caller-chosen `blog_id` (ObjectId)
+    makes a repeated save fail with DuplicateKeyError instead of saving twice.
+    """
+    md = entry.get("markdown", "")
+    oid = blog_id or ObjectId()
+    body = {
+        "_id": oid,
+        "user_id": user_id,
+        "codec": BODY_CODEC,
+        "data": Binary(_compress(md)),
+    }
+    meta = {k: v for k, v in entry.items() if k != "markdown"}
+    doc = {
+        **meta,
+        "_id": oid,
+        "user_id": user_id,
+        "saved_at": datetime.now(timezone.utc),
+        "body_bytes": len(md.encode("utf-8")),
+    }
+    search = _search_entry(doc, _search_text(md))
+    with ace_metrics.mongo_op("save_blog"):
+        if writer is not None:
+            writer.insert("blog_bodies", body)
+            writer.insert("blog_search", search)
+            writer.insert("blogs", dict(doc))
+        else:
+            db["blog_bodies"].insert_one(body)
+            db["blog_search"].insert_one(search)
+            db["blogs"].insert_one(dict(doc))
+    return {**doc, "_id": str(oid), "markdown": md}
+
+
+def load_blogs(db, user_id: str, before=None, limit: int = HISTORY_PAGE_SIZE) -> list:
+    """Return one page of history metadata, newest first.
+
+    `before` is the `saved_at` of the last entry already shown (keyset pagination),
+    so deeper pages cost the same as the first one.
+    """
+    query = {"user_id": user_id}
+    if before is not None:
+        query["saved_at"] = {"$lt": before}
+    out = []
+    with ace_metrics.mongo_op("load_blogs"):
+        cursor = db["blogs"].find(query, BLOG_LIST_FIELDS).sort("saved_at", -1).limit(limit)
+        for b in cursor:
+            b["_id"] = str(b["_id"])
+            out.append(b)
+    return out
+
+
+def search_blogs(db, user_id: str, query: str, after: dict = None, limit: int = HISTORY_PAGE_SIZE) -> list:
+    """Ranked full-text search over title, topic and body; returns metadata + `score`.
+
+    Results are ordered by (score, saved_at, _id), all descending. `after` is the last
+    result already shown (keyset pagination, like `load_blogs`), so deleting a shown
+    result never shifts the next page. Matching runs on `blog_search`; only the page's
+    hits are joined to their `blogs` metadata.
+    """
+    pipeline = [
+        {"$match": {"user_id": user_id, "$text": {"$search": query}}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if after is not None:
+        score, saved_at, oid = after["score"], after["saved_at"], ObjectId(after["_id"])
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": score}},
+            {"score": score, "saved_at": {"$lt": saved_at}},
+            {"score": score, "saved_at": saved_at, "_id": {"$lt": oid}},
+        ]}})
+    pipeline += [
+        {"$sort": {"score": -1, "saved_at": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": {"score": 1}},
+        {"$lookup": {"from": "blogs", "localField": "_id", "foreignField": "_id", "as": "meta"}},
+        {"$unwind": "$meta"},               # drops hits whose `blogs` entry is gone
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$meta", {"score": "$score"}]}}},
+        {"$project": {**BLOG_LIST_FIELDS, "score": 1}},
+    ]
+    out = []
+    for b in db["blog_search"].aggregate(pipeline):
+        b["_id"] = str(b["_id"])
+        out.append(b)
+    return out
+
+
+def load_blog(db, user_id: str, blog_id: str):
+    """Fetch one full document (with `markdown` decompressed) for viewing or download."""
+    oid = ObjectId(blog_id)
+    doc = db["blogs"].find_one({"_id": oid, "user_id": user_id})
+    if not doc:
+        return None
+    if "markdown" not in doc:
+        body = db["blog_bodies"].find_one({"_id": oid, "user_id": user_id})
+        doc["markdown"] = _decompress(body) if body else ""
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+
+def copy_blog(db, user_id: str, blog_id: str, to_user: str, writer=None):
+    """Save a copy of another user's document into `to_user`'s history (coalesced runs)."""
+    doc = load_blog(db, user_id, blog_id)
+    return None if doc is None else save_blog(db, to_user, doc, writer=writer)
+
+
+def delete_blog(db, user_id: str, blog_id: str, writer=None):
+    # Goes through the same writer as saves so a delete can't overtake a queued insert.
+    oid = ObjectId(blog_id)
+    if writer is not None:
+        writer.delete("blogs", {"_id": oid, "user_id": user_id})
+        writer.delete("blog_bodies", {"_id": oid, "user_id": user_id})
+        writer.delete("blog_search", {"_id": oid, "user_id": user_id})
+        return
+    db["blogs"].delete_one({"_id": oid, "user_id": user_id})
+    db["blog_bodies"].delete_one({"_id": oid, "user_id": user_id})
+    db["blog_search"].delete_one({"_id": oid, "user_id": user_id})
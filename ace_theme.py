@@ -0,0 +1,960 @@
+"""
+ace_theme.py — Theme palettes, stylesheet and static markup for streamlit_app.py
+Everything here depends only on the dark/light flag, so it is built once per
+theme per process and reused on every rerun instead of re-formatting ~650 lines
+of CSS each time a button is clicked.
+"""
+import json
+import re
+from functools import lru_cache
+from types import SimpleNamespace
+
+# ═════════════════════════════════════════════════════════════════════════════
+# PALETTES
+# ═════════════════════════════════════════════════════════════════════════════
+
+_DARK = {
+    "bg_main":       "#080810",
+    "bg_card":       "#0f0f1a",
+    "bg_card2":      "#131325",
+    "bg_sidebar":    "#0b0b16",
+    "text_primary":  "#ede8ff",
+    "text_sec":      "#8b86a8",
+    "text_muted":    "#4a465e",
+    "border_col":    "rgba(120,100,255,0.1)",
+    "border_input":  "rgba(120,100,255,0.18)",
+    "input_bg":      "#0f0f1a",
+    "input_text":    "#ede8ff",
+    "accent":        "#7c5cfc",
+    "accent2":       "#a855f7",
+    "accent_light":  "#c4a8ff",
+    "accent_soft":   "rgba(124,92,252,0.12)",
+    "hero_sub":      "#5c586e",
+    "hist_label":    "#2e2a40",
+    "md_p":          "#9e9ab8",
+    "md_h2":         "#c8c4e0",
+    "md_code_bg":    "rgba(124,92,252,0.15)",
+    "md_code_c":     "#c8a8f8",
+    "md_pre_bg":     "#07070f",
+    "alert_bg":      "rgba(124,92,252,0.08)",
+    "alert_border":  "rgba(124,92,252,0.2)",
+    "alert_text":    "#c8b4f8",
+    "mode_icon":     "☀️",
+    "mode_label":    "Light",
+    "chip_bg":       "rgba(124,92,252,0.08)",
+    "chip_border":   "rgba(124,92,252,0.2)",
+    "pipeline_run":  "#7c5cfc",
+    "pipeline_done": "rgba(80,220,130,0.4)",
+    "auth_bg_from":  "#0a0818",
+    "auth_bg_to":    "#130f28",
+    "glow1":         "rgba(124,92,252,0.35)",
+    "glow2":         "rgba(168,85,247,0.2)",
+    "noise_opacity": "0.03",
+    "card_shadow":   "0 32px 80px rgba(0,0,0,0.6), 0 0 0 1px rgba(124,92,252,0.1)",
+    "divider_col":   "rgba(124,92,252,0.12)",
+    "tab_active_bg": "rgba(124,92,252,0.15)",
+    "input_shadow":  "0 0 0 3px rgba(124,92,252,0.2)",
+    "btn_shadow":    "0 8px 32px rgba(124,92,252,0.4)",
+    "eyebrow_color": "#7c5cfc",
+    "tag_bg":        "rgba(124,92,252,0.1)",
+}
+
+_LIGHT = {
+    "bg_main":       "#f7f5ff",
+    "bg_card":       "#ffffff",
+    "bg_card2":      "#f0eeff",
+    "bg_sidebar":    "#f2f0ff",
+    "text_primary":  "#1a1535",
+    "text_sec":      "#5a5478",
+    "text_muted":    "#9490b0",
+    "border_col":    "rgba(98,64,232,0.1)",
+    "border_input":  "rgba(98,64,232,0.2)",
+    "input_bg":      "#ffffff",
+    "input_text":    "#1a1535",
+    "accent":        "#6240e8",
+    "accent2":       "#9333ea",
+    "accent_light":  "#7c5cf0",
+    "accent_soft":   "rgba(98,64,232,0.08)",
+    "hero_sub":      "#7a7694",
+    "hist_label":    "#c4c0d8",
+    "md_p":          "#4a4668",
+    "md_h2":         "#2a2448",
+    "md_code_bg":    "rgba(98,64,232,0.07)",
+    "md_code_c":     "#5a3cc8",
+    "md_pre_bg":     "#f5f3ff",
+    "alert_bg":      "rgba(98,64,232,0.05)",
+    "alert_border":  "rgba(98,64,232,0.15)",
+    "alert_text":    "#5a3cc8",
+    "mode_icon":     "🌙",
+    "mode_label":    "Dark",
+    "chip_bg":       "rgba(98,64,232,0.06)",
+    "chip_border":   "rgba(98,64,232,0.14)",
+    "pipeline_run":  "#6240e8",
+    "pipeline_done": "rgba(40,180,90,0.35)",
+    "auth_bg_from":  "#f0eeff",
+    "auth_bg_to":    "#e8e4ff",
+    "glow1":         "rgba(98,64,232,0.12)",
+    "glow2":         "rgba(147,51,234,0.08)",
+    "noise_opacity": "0.02",
+    "card_shadow":   "0 24px 64px rgba(98,64,232,0.12), 0 0 0 1px rgba(98,64,232,0.08)",
+    "divider_col":   "rgba(98,64,232,0.1)",
+    "tab_active_bg": "rgba(98,64,232,0.08)",
+    "input_shadow":  "0 0 0 3px rgba(98,64,232,0.12)",
+    "btn_shadow":    "0 8px 28px rgba(98,64,232,0.35)",
+    "eyebrow_color": "#6240e8",
+    "tag_bg":        "rgba(98,64,232,0.07)",
+}
+
+
+@lru_cache(maxsize=2)
+def palette(dark: bool) -> SimpleNamespace:
+    return SimpleNamespace(**(_DARK if dark else _LIGHT))
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# STYLESHEET
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _build_css(dark: bool) -> str:
+    t = palette(dark)
+    return f"""
+@import url('https://fonts.googleapis.com/css2?family=Fraunces:ital,opsz,wght@0,9..144,300;0,9..144,400;0,9..144,500;0,9..144,600;1,9..144,300;1,9..144,400&family=DM+Mono:wght@300;400;500&family=Plus+Jakarta+Sans:wght@300;400;500;600;700&display=swap');
+
+*, *::before, *::after {{ box-sizing: border-box; margin: 0; padding: 0; }}
+
+html, body, [data-testid="stAppViewContainer"] {{
+    background: {t.bg_main};
+    color: {t.text_primary};
+    font-family: 'Plus Jakarta Sans', sans-serif;
+    transition: background 0.4s ease, color 0.4s ease;
+}}
+
+[data-testid="stAppViewContainer"] {{
+    background: {t.bg_main};
+    background-image:
+        radial-gradient(ellipse 90% 50% at 20% -5%, {t.glow1} 0%, transparent 65%),
+        radial-gradient(ellipse 60% 40% at 85% 90%, {t.glow2} 0%, transparent 60%),
+        radial-gradient(ellipse 40% 30% at 60% 50%, rgba(124,92,252,0.03) 0%, transparent 70%);
+}}
+
+/* Sidebar */
+[data-testid="stSidebar"] {{
+    background: {t.bg_sidebar} !important;
+    border-right: 1px solid {t.border_col} !important;
+    transition: background 0.4s ease;
+}}
+[data-testid="stSidebar"] > div {{ padding: 1.4rem 1rem 2rem; }}
+
+/* Hide Streamlit chrome */
+#MainMenu, footer, header {{ display: none !important; }}
+.block-container {{
+    padding: 2rem 2.5rem 5rem;
+    max-width: 1120px;
+}}
+
+/* ── Typography ── */
+h1, h2, h3 {{
+    font-family: 'Fraunces', serif;
+    letter-spacing: -0.02em;
+}}
+
+/* ═══════════════════════════════════════════
+   AUTH PAGE — Complete redesign
+═══════════════════════════════════════════ */
+
+.auth-page-wrapper {{
+    min-height: 100vh;
+    display: flex;
+    align-items: stretch;
+}}
+
+/* Auth card */
+.auth-card {{
+    width: 100%;
+    max-width: 480px;
+    margin: 3vh auto 0;
+    background: {t.bg_card};
+    border: 1px solid {t.border_col};
+    border-radius: 24px;
+    padding: 3rem 3rem 2.5rem;
+    box-shadow: {t.card_shadow};
+    position: relative;
+    overflow: hidden;
+    transition: background 0.4s;
+}}
+
+.auth-card::before {{
+    content: '';
+    position: absolute;
+    top: 0; left: 0; right: 0;
+    height: 3px;
+    background: linear-gradient(90deg, {t.accent} 0%, {t.accent2} 50%, {t.accent_light} 100%);
+    border-radius: 24px 24px 0 0;
+}}
+
+.auth-card::after {{
+    content: '';
+    position: absolute;
+    top: -80px; right: -80px;
+    width: 200px; height: 200px;
+    border-radius: 50%;
+    background: radial-gradient(circle, {t.glow1} 0%, transparent 70%);
+    pointer-events: none;
+}}
+
+.auth-badge {{
+    display: inline-flex;
+    align-items: center;
+    gap: 0.4rem;
+    background: {t.tag_bg};
+    border: 1px solid {t.border_col};
+    border-radius: 100px;
+    padding: 0.25rem 0.75rem;
+    font-family: 'DM Mono', monospace;
+    font-size: 0.62rem;
+    letter-spacing: 0.14em;
+    text-transform: uppercase;
+    color: {t.accent_light};
+    margin-bottom: 1.2rem;
+}}
+
+.auth-badge .dot {{
+    width: 5px; height: 5px;
+    border-radius: 50%;
+    background: {t.accent};
+    box-shadow: 0 0 6px {t.accent};
+    animation: pulse-dot 2s ease-in-out infinite;
+}}
+
+@keyframes pulse-dot {{
+    0%, 100% {{ opacity: 1; transform: scale(1); }}
+    50% {{ opacity: 0.5; transform: scale(0.7); }}
+}}
+
+.auth-headline {{
+    font-family: 'Fraunces', serif;
+    font-size: 2.6rem;
+    font-weight: 400;
+    line-height: 1.08;
+    color: {t.text_primary};
+    margin-bottom: 0.5rem;
+    letter-spacing: -0.03em;
+}}
+
+.auth-headline em {{
+    font-style: italic;
+    background: linear-gradient(135deg, {t.accent} 0%, {t.accent2} 100%);
+    -webkit-background-clip: text;
+    -webkit-text-fill-color: transparent;
+    background-clip: text;
+}}
+
+.auth-sub {{
+    font-size: 0.88rem;
+    color: {t.text_muted};
+    margin-bottom: 2rem;
+    line-height: 1.6;
+    font-weight: 400;
+}}
+
+.auth-divider {{
+    height: 1px;
+    background: linear-gradient(90deg, transparent, {t.divider_col}, transparent);
+    margin: 1.5rem 0;
+}}
+
+/* Feature tags under auth */
+.auth-features {{
+    display: flex;
+    gap: 0.5rem;
+    flex-wrap: wrap;
+    margin-top: 1.5rem;
+}}
+.auth-feature-tag {{
+    font-family: 'DM Mono', monospace;
+    font-size: 0.6rem;
+    padding: 0.2rem 0.6rem;
+    border-radius: 100px;
+    background: {t.tag_bg};
+    color: {t.text_muted};
+    border: 1px solid {t.border_col};
+    letter-spacing: 0.05em;
+}}
+
+/* ── Tabs (auth) ── */
+[data-testid="stTabs"] [data-baseweb="tab-list"] {{
+    background: {"rgba(255,255,255,0.03)" if dark else "rgba(98,64,232,0.04)"} !important;
+    border-radius: 12px !important;
+    padding: 4px !important;
+    gap: 2px !important;
+    border: 1px solid {t.border_col} !important;
+    margin-bottom: 1.2rem !important;
+}}
+
+[data-testid="stTabs"] [data-baseweb="tab"] {{
+    font-family: 'Plus Jakarta Sans', sans-serif !important;
+    font-size: 0.82rem !important;
+    font-weight: 500 !important;
+    color: {t.text_muted} !important;
+    letter-spacing: 0.02em !important;
+    border-radius: 8px !important;
+    padding: 0.5rem 1.2rem !important;
+    transition: all 0.2s !important;
+}}
+
+[data-testid="stTabs"] [aria-selected="true"] {{
+    color: {t.text_primary} !important;
+    background: {t.tab_active_bg} !important;
+    font-weight: 600 !important;
+}}
+
+/* ── Inputs (enhanced) ── */
+.stTextInput input, .stTextArea textarea, .stNumberInput input {{
+    background: {"rgba(255,255,255,0.03)" if dark else "#faf9ff"} !important;
+    border: 1.5px solid {t.border_input} !important;
+    border-radius: 12px !important;
+    color: {t.input_text} !important;
+    font-family: 'Plus Jakarta Sans', sans-serif !important;
+    font-size: 0.9rem !important;
+    padding: 0.75rem 1rem !important;
+    transition: all 0.25s !important;
+    caret-color: {t.accent} !important;
+}}
+
+.stTextInput input:focus, .stTextArea textarea:focus {{
+    border-color: {t.accent} !important;
+    box-shadow: {t.input_shadow} !important;
+    background: {"rgba(124,92,252,0.04)" if dark else "#fff"} !important;
+    outline: none !important;
+}}
+
+.stTextInput label, .stTextArea label, .stNumberInput label {{
+    color: {t.text_sec} !important;
+    font-size: 0.72rem !important;
+    font-family: 'DM Mono', monospace !important;
+    letter-spacing: 0.09em !important;
+    text-transform: uppercase !important;
+    font-weight: 500 !important;
+    margin-bottom: 0.3rem !important;
+}}
+
+/* ── Buttons (primary) ── */
+.stButton > button {{
+    background: linear-gradient(135deg, {t.accent} 0%, {t.accent2} 100%) !important;
+    border: none !important;
+    border-radius: 12px !important;
+    color: #ffffff !important;
+    font-family: 'Plus Jakarta Sans', sans-serif !important;
+    font-weight: 600 !important;
+    font-size: 0.9rem !important;
+    padding: 0.7rem 1.8rem !important;
+    cursor: pointer !important;
+    transition: all 0.25s ease !important;
+    box-shadow: {t.btn_shadow} !important;
+    letter-spacing: 0.01em !important;
+    position: relative !important;
+    overflow: hidden !important;
+}}
+
+.stButton > button::after {{
+    content: '' !important;
+    position: absolute !important;
+    inset: 0 !important;
+    background: linear-gradient(135deg, rgba(255,255,255,0.15) 0%, transparent 60%) !important;
+    pointer-events: none !important;
+}}
+
+.stButton > button:hover {{
+    transform: translateY(-2px) !important;
+    box-shadow: 0 12px 40px rgba(124,92,252,0.5) !important;
+    filter: brightness(1.05) !important;
+}}
+
+.stButton > button:active {{
+    transform: translateY(0) !important;
+    box-shadow: 0 4px 16px rgba(124,92,252,0.3) !important;
+}}
+
+/* Ghost / secondary buttons */
+.stButton > button[kind="secondary"] {{
+    background: {"rgba(255,255,255,0.04)" if dark else "rgba(255,255,255,0.9)"} !important;
+    border: 1.5px solid {t.border_col} !important;
+    color: {t.text_sec} !important;
+    box-shadow: none !important;
+    font-weight: 500 !important;
+}}
+
+.stButton > button[kind="secondary"]:hover {{
+    background: {t.chip_bg} !important;
+    border-color: {t.accent} !important;
+    color: {t.accent_light} !important;
+}}
+
+/* Download button */
+.stDownloadButton > button {{
+    background: {"rgba(255,255,255,0.04)" if dark else "rgba(98,64,232,0.04)"} !important;
+    border: 1.5px solid {t.chip_border} !important;
+    border-radius: 10px !important;
+    color: {t.accent_light} !important;
+    font-family: 'DM Mono', monospace !important;
+    font-size: 0.75rem !important;
+    padding: 0.5rem 1.2rem !important;
+    letter-spacing: 0.04em !important;
+    transition: all 0.2s !important;
+    box-shadow: none !important;
+}}
+
+.stDownloadButton > button:hover {{
+    background: {t.accent_soft} !important;
+    border-color: {t.accent} !important;
+    transform: translateY(-1px) !important;
+}}
+
+/* ══════════════════════════════════════════
+   HERO SECTION
+══════════════════════════════════════════ */
+.hero {{
+    padding: 3.5rem 0 2.5rem;
+    border-bottom: 1px solid {t.border_col};
+    margin-bottom: 2.5rem;
+    position: relative;
+}}
+
+.hero-eyebrow {{
+    display: inline-flex;
+    align-items: center;
+    gap: 0.45rem;
+    font-family: 'DM Mono', monospace;
+    font-size: 0.65rem;
+    letter-spacing: 0.2em;
+    text-transform: uppercase;
+    color: {t.eyebrow_color};
+    margin-bottom: 1rem;
+    padding: 0.25rem 0.75rem;
+    background: {t.tag_bg};
+    border-radius: 100px;
+    border: 1px solid {t.border_col};
+}}
+
+.hero-title {{
+    font-family: 'Fraunces', serif;
+    font-size: clamp(2.6rem, 5.5vw, 4rem);
+    font-weight: 400;
+    line-height: 1.08;
+    color: {t.text_primary};
+    margin: 0 0 0.75rem;
+    letter-spacing: -0.03em;
+}}
+
+.hero-title em {{
+    font-style: italic;
+    background: linear-gradient(135deg, {t.accent} 0%, {t.accent2} 100%);
+    -webkit-background-clip: text;
+    -webkit-text-fill-color: transparent;
+    background-clip: text;
+}}
+
+.hero-sub {{
+    font-size: 0.95rem;
+    color: {t.hero_sub};
+    font-weight: 400;
+    line-height: 1.6;
+    max-width: 520px;
+}}
+
+/* ══════════════════════════════════════════
+   PIPELINE CARDS
+══════════════════════════════════════════ */
+.pipeline-card {{
+    background: {t.bg_card};
+    border: 1px solid {t.border_col};
+    border-radius: 14px;
+    padding: 1rem 1.4rem;
+    margin-bottom: 0.65rem;
+    display: flex;
+    align-items: center;
+    gap: 1rem;
+    transition: border-color 0.3s, background 0.3s, box-shadow 0.3s;
+}}
+
+.pipeline-card.active {{
+    border-color: {t.accent};
+    box-shadow: 0 0 0 1px {t.accent_soft}, 0 8px 24px {t.accent_soft};
+    background: {"rgba(124,92,252,0.04)" if dark else "rgba(98,64,232,0.03)"};
+}}
+
+.pipeline-card.done {{
+    border-color: {"rgba(80,220,130,0.3)" if dark else "rgba(40,180,90,0.25)"};
+    background: {"rgba(80,220,130,0.03)" if dark else "rgba(40,180,90,0.02)"};
+}}
+
+.pipeline-icon {{ font-size: 1.15rem; flex-shrink: 0; }}
+.pipeline-label {{
+    font-family: 'DM Mono', monospace;
+    font-size: 0.68rem;
+    color: {t.text_muted};
+    letter-spacing: 0.08em;
+    text-transform: uppercase;
+    margin-bottom: 0.1rem;
+}}
+.pipeline-value {{ font-size: 0.85rem; color: {t.text_sec}; }}
+
+.badge {{
+    margin-left: auto;
+    font-family: 'DM Mono', monospace;
+    font-size: 0.62rem;
+    padding: 0.2rem 0.6rem;
+    border-radius: 100px;
+    letter-spacing: 0.06em;
+    font-weight: 500;
+}}
+.badge-pending {{ background: {"rgba(255,255,255,0.05)" if dark else "rgba(0,0,0,0.05)"}; color: {t.text_muted}; }}
+.badge-running {{
+    background: rgba(124,92,252,0.2);
+    color: {t.accent_light};
+    animation: badge-pulse 1.5s ease-in-out infinite;
+}}
+@keyframes badge-pulse {{
+    0%, 100% {{ opacity: 1; }}
+    50% {{ opacity: 0.6; }}
+}}
+.badge-done    {{ background: {"rgba(80,220,130,0.15)" if dark else "rgba(40,180,90,0.12)"}; color: {"#60d890" if dark else "#28b45a"}; }}
+.badge-skipped {{ background: {"rgba(255,180,50,0.1)" if dark else "rgba(220,140,20,0.1)"}; color: {"#e0a040" if dark else "#c07820"}; }}
+
+/* ══════════════════════════════════════════
+   OUTPUT / MARKDOWN AREA
+══════════════════════════════════════════ */
+.output-header {{
+    display: flex;
+    align-items: baseline;
+    gap: 1rem;
+    margin-bottom: 1.4rem;
+    flex-wrap: wrap;
+}}
+.output-title {{
+    font-family: 'Fraunces', serif;
+    font-size: 1.7rem;
+    color: {t.text_primary};
+    font-weight: 400;
+    letter-spacing: -0.02em;
+}}
+.output-meta {{
+    font-family: 'DM Mono', monospace;
+    font-size: 0.65rem;
+    color: {t.text_muted};
+    letter-spacing: 0.08em;
+}}
+
+.markdown-container {{
+    background: {t.bg_card};
+    border: 1px solid {t.border_col};
+    border-radius: 16px;
+    padding: 2.2rem;
+    line-height: 1.8;
+    transition: background 0.4s ease;
+}}
+.markdown-container.md-section {{
+    padding: 1.2rem 2.2rem;
+    margin-bottom: 0.4rem;
+}}
+.markdown-container h1 {{
+    font-family: 'Fraunces', serif;
+    font-size: 2rem;
+    color: {t.text_primary};
+    margin-bottom: 1.5rem;
+    font-weight: 400;
+    letter-spacing: -0.025em;
+}}
+.markdown-container h2 {{
+    font-family: 'Fraunces', serif;
+    font-size: 1.3rem;
+    color: {t.md_h2};
+    border-bottom: 1px solid {t.border_col};
+    padding-bottom: 0.4rem;
+    margin-top: 2.2rem;
+    margin-bottom: 0.8rem;
+    font-weight: 400;
+}}
+.markdown-container p  {{ color: {t.md_p}; margin-bottom: 1rem; font-size: 0.95rem; }}
+.markdown-container code {{
+    background: {t.md_code_bg};
+    border-radius: 5px;
+    padding: 0.12em 0.45em;
+    font-family: 'DM Mono', monospace;
+    font-size: 0.83em;
+    color: {t.md_code_c};
+}}
+.markdown-container pre {{
+    background: {t.md_pre_bg};
+    border: 1px solid {t.border_col};
+    border-radius: 10px;
+    padding: 1.4rem;
+    overflow-x: auto;
+    margin: 1rem 0;
+}}
+.markdown-container pre code {{ background: transparent; color: {t.md_code_c}; }}
+.markdown-container ul, .markdown-container ol {{
+    color: {t.md_p};
+    padding-left: 1.6rem;
+    margin-bottom: 1rem;
+}}
+.markdown-container li {{ margin-bottom: 0.35rem; font-size: 0.95rem; }}
+.markdown-container a {{
+    color: {t.accent};
+    text-decoration: none;
+    border-bottom: 1px solid {t.accent_soft};
+    transition: border-color 0.2s;
+}}
+.markdown-container a:hover {{ border-color: {t.accent}; }}
+
+/* ══════════════════════════════════════════
+   SIDEBAR — USER CHIP
+══════════════════════════════════════════ */
+.user-chip {{
+    display: flex;
+    align-items: center;
+    gap: 0.7rem;
+    background: {t.chip_bg};
+    border: 1px solid {t.chip_border};
+    border-radius: 14px;
+    padding: 0.7rem 0.95rem;
+    margin-bottom: 0.75rem;
+    transition: background 0.4s;
+}}
+.user-avatar {{
+    width: 34px; height: 34px; border-radius: 50%;
+    background: linear-gradient(135deg, {t.accent} 0%, {t.accent2} 100%);
+    display: flex; align-items: center; justify-content: center;
+    font-size: 0.7rem; font-weight: 700; color: #fff;
+    flex-shrink: 0;
+    box-shadow: 0 4px 12px {t.accent_soft};
+}}
+.user-name  {{
+    font-size: 0.85rem;
+    color: {t.text_primary};
+    font-weight: 600;
+    line-height: 1.25;
+    font-family: 'Plus Jakarta Sans', sans-serif;
+}}
+.user-email {{
+    font-family: 'DM Mono', monospace;
+    font-size: 0.58rem;
+    color: {t.text_muted};
+    margin-top: 0.05rem;
+}}
+
+/* ══════════════════════════════════════════
+   SIDEBAR HISTORY CARDS
+══════════════════════════════════════════ */
+.hist-section-label {{
+    font-family: 'DM Mono', monospace;
+    font-size: 0.6rem;
+    letter-spacing: 0.16em;
+    text-transform: uppercase;
+    color: {t.hist_label};
+    margin-bottom: 0.7rem;
+    padding: 0 0.1rem;
+}}
+
+.hist-card {{
+    background: {t.bg_card};
+    border: 1px solid {t.border_col};
+    border-radius: 12px;
+    padding: 0.75rem 0.9rem 0.6rem;
+    margin-bottom: 0.5rem;
+    transition: border-color 0.2s, background 0.2s;
+}}
+
+.hist-card.active {{
+    border-color: {t.accent};
+    background: {"rgba(124,92,252,0.05)" if dark else "rgba(98,64,232,0.04)"};
+    box-shadow: 0 0 0 1px {t.accent_soft};
+}}
+
+/* ══════════════════════════════════════════
+   SETTINGS SECTION LABEL
+══════════════════════════════════════════ */
+.settings-label {{
+    font-family: 'DM Mono', monospace;
+    font-size: 0.6rem;
+    letter-spacing: 0.16em;
+    text-transform: uppercase;
+    color: {t.hist_label};
+    margin-bottom: 0.5rem;
+    padding: 0 0.1rem;
+}}
+
+/* Expanders */
+[data-testid="stExpander"] {{
+    background: {"rgba(255,255,255,0.02)" if dark else "rgba(98,64,232,0.02)"} !important;
+    border: 1px solid {t.border_col} !important;
+    border-radius: 12px !important;
+    margin-bottom: 0.5rem !important;
+    transition: background 0.3s !important;
+}}
+
+[data-testid="stExpander"]:hover {{
+    border-color: {t.chip_border} !important;
+}}
+
+[data-testid="stExpander"] summary {{
+    font-family: 'Plus Jakarta Sans', sans-serif !important;
+    font-size: 0.82rem !important;
+    font-weight: 500 !important;
+    color: {t.text_sec} !important;
+    padding: 0.6rem 0.9rem !important;
+}}
+
+/* Alerts */
+[data-testid="stAlert"] {{
+    background: {t.alert_bg} !important;
+    border: 1px solid {t.alert_border} !important;
+    border-radius: 12px !important;
+    color: {t.alert_text} !important;
+    font-family: 'Plus Jakarta Sans', sans-serif !important;
+    font-size: 0.88rem !important;
+}}
+
+/* HR */
+hr {{
+    border: none !important;
+    border-top: 1px solid {t.divider_col} !important;
+    margin: 1rem 0 !important;
+}}
+
+/* Spinner */
+[data-testid="stSpinner"] > div > div {{
+    border-top-color: {t.accent} !important;
+}}
+
+/* Radio */
+[data-testid="stRadio"] label {{
+    font-size: 0.88rem !important;
+    color: {t.text_sec} !important;
+    font-family: 'Plus Jakarta Sans', sans-serif !important;
+}}
+
+/* Sliders */
+[data-testid="stSlider"] [data-baseweb="slider"] [data-testid*="StyledThumb"] {{
+    background: {t.accent} !important;
+    border-color: {t.accent} !important;
+}}
+
+/* Select slider */
+[data-testid="stSlider"] [data-baseweb="slider"] [data-testid*="StyledTrackHighlight"] {{
+    background: linear-gradient(90deg, {t.accent}, {t.accent2}) !important;
+}}
+
+/* Sidebar toggle button */
+.sidebar-toggle {{
+    position: fixed;
+    top: 50%; left: 0;
+    transform: translateY(-50%);
+    z-index: 9999;
+    background: linear-gradient(135deg, {t.accent}, {t.accent2});
+    color: white;
+    border: none;
+    border-radius: 0 10px 10px 0;
+    width: 22px; height: 60px;
+    cursor: pointer;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    font-size: 0.65rem;
+    transition: all 0.2s;
+    box-shadow: 3px 0 16px {t.glow1};
+}}
+
+/* Mode pill */
+.mode-closed_book {{ background: rgba(80,200,255,0.1); color: {"#60c8f8" if dark else "#0890c8"}; }}
+.mode-hybrid      {{ background: rgba(255,180,50,0.1);  color: {"#e0a040" if dark else "#c07820"}; }}
+.mode-open_book   {{ background: rgba(80,220,130,0.1);  color: {"#60d890" if dark else "#28b45a"}; }}
+"""
+
+
+def _minify(css: str) -> str:
+    # Comments and indentation are ~20% of the payload; keep selectors intact
+    # (whitespace before ':' is significant in selectors, so it is left alone).
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};])\s*", r"\1", css)
+    return css.strip()
+
+
+@lru_cache(maxsize=2)
+def theme_css(dark: bool) -> str:
+    """The full `<style>` block for one theme — built and minified once per process."""
+    return f"<style>{_minify(_build_css(dark))}</style>"
+
+
+# Sent runs per theme before the stylesheet is left to the copy in the page head:
+# the second run covers a first run cut short before its script ran in the browser.
+THEME_SEND_RUNS = 2
+
+
+@lru_cache(maxsize=2)
+def theme_head_js(dark: bool) -> str:
+    """Script that puts the stylesheet in the parent page's <head>, replacing the other theme's.
+
+    Streamlit drops elements a rerun does not send again, but not what a script added
+    to the page, so after this the stylesheet no longer has to be sent on every rerun.
+    """
+    css = json.dumps(_minify(_build_css(dark))).replace("</", "<\\/")
+    return (
+        "<script>(function(){"
+        "var pd=window.parent.document,s=pd.getElementById('ce-theme');"
+        "if(!s){s=pd.createElement('style');s.id='ce-theme';pd.head.appendChild(s);}"
+        f"s.textContent={css};"
+        "})();</script>"
+    )
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# STATIC MARKUP
+# ═════════════════════════════════════════════════════════════════════════════
+
+# Reads the token saved in localStorage and reloads the page with ?_token=...
+AUTH_REDIRECT_JS = """
+<script>
+(function() {
+    if (sessionStorage.getItem('ce_redirect_tried')) return;
+    sessionStorage.setItem('ce_redirect_tried', '1');
+    const token = localStorage.getItem('content_engine_token');
+    if (!token) return;
+    try {
+        const parentParams = new URLSearchParams(window.parent.location.search);
+        if (!parentParams.has('_token')) {
+            parentParams.set('_token', token);
+            window.parent.location.replace(
+                window.parent.location.pathname + '?' + parentParams.toString()
+            );
+        }
+    } catch(e) { console.warn('CE: could not access parent location', e); }
+})();
+</script>
+"""
+
+AUTH_CARD_HTML = """
+<div class="auth-card">
+    <div class="auth-badge">
+        <span class="dot"></span>
+        Study &amp; Content Engine
+    </div>
+"""
+
+AUTH_FEATURES_HTML = """
+<div class="auth-features">
+    <span class="auth-feature-tag">✦ AI-Powered Research</span>
+    <span class="auth-feature-tag">📖 Study Guides</span>
+    <span class="auth-feature-tag">🔬 Deep Analysis</span>
+    <span class="auth-feature-tag">💾 Cloud Saved</span>
+    <span class="auth-feature-tag">⚡ Instant Generate</span>
+</div>
+"""
+
+HERO_HTML = """
+<div class="hero">
+    <div class="hero-eyebrow">✦ Study &amp; Content Engine</div>
+"""
+
+
+# History pill colours per output type: (background, text) for dark / light.
+_TYPE_COLORS = {
+    "Study Guide":   (("#1a1035", "#b89cfa"), ("#ede8ff", "#6240e8")),
+    "Blog Post":     (("#0d1f12", "#60d890"), ("#e6fff0", "#28a85a")),
+    "Deep Research": (("#1a1210", "#f0a060"), ("#fff3e6", "#c07020")),
+    "Quick Summary": (("#0d1828", "#60c8f8"), ("#e6f4ff", "#0878c8")),
+}
+_TYPE_COLOR_DEFAULT = (("#1a1a2e", "#9a96c0"), ("#f0eeff", "#6240e8"))
+
+
+@lru_cache(maxsize=1024)
+def history_meta_html(ts: str, otype: str, size_info: str, dark: bool) -> str:
+    """Timestamp + type pill + size line under a history entry; cached per distinct entry."""
+    t = palette(dark)
+    bg, fg = _TYPE_COLORS.get(otype, _TYPE_COLOR_DEFAULT)[0 if dark else 1]
+    pill_html = f'<span style="background:{bg};color:{fg};font-family:\'DM Mono\',monospace;font-size:0.55rem;padding:0.12rem 0.5rem;border-radius:100px;font-weight:500;">{otype}</span>' if otype else ""
+    size_html = f'<span style="color:{t.text_muted};font-size:0.58rem;font-family:\'DM Mono\',monospace;">{size_info}</span>' if size_info else ""
+    return (
+        f'<div style="font-family:\'DM Mono\',monospace;font-size:0.58rem;color:{t.text_muted};'
+        f'margin-top:0.2rem;display:flex;align-items:center;gap:0.4rem;flex-wrap:wrap;">'
+        f'{ts} {pill_html} {size_html}</div>'
+    )
+
+
+# Sidebar knob: simple, robust implementation.
+# Shows a hamburger button when sidebar is collapsed. Polls every 300ms — lightweight.
+@lru_cache(maxsize=2)
+def sidebar_js(dark: bool) -> str:
+    t = palette(dark)
+    return (
+        "<script>(function(){"
+        "var p=window.parent,pd=p.document;"
+        "var KNOB='ce-sidebar-knob';"
+
+        # ---- create knob once ----
+        "if(!pd.getElementById(KNOB)){"
+        "var b=pd.createElement('button');"
+        "b.id=KNOB;"
+        "b.innerHTML='&#9776;';"
+        "b.title='Open sidebar';"
+        "b.style.cssText='"
+        "position:fixed;top:50%;left:0;transform:translateY(-50%);"
+        "z-index:2147483647;"
+        "background:linear-gradient(135deg," + t.accent + "," + t.accent2 + ");"
+        "color:#fff;border:none;border-radius:0 10px 10px 0;"
+        "width:26px;height:60px;cursor:pointer;"
+        "display:none;align-items:center;justify-content:center;"
+        "font-size:1rem;padding:0;line-height:1;"
+        "box-shadow:3px 0 16px rgba(124,92,252,.45);"
+        "transition:width .15s;"
+        "';"
+        "b.onmouseenter=function(){b.style.width='34px';};"
+        "b.onmouseleave=function(){b.style.width='26px';};"
+        "pd.body.appendChild(b);}"
+
+        # ---- always update gradient (theme may have changed) ----
+        "var knob=pd.getElementById(KNOB);"
+        "knob.style.background='linear-gradient(135deg," + t.accent + "," + t.accent2 + ")';"
+
+        # ---- click: find & click Streamlit's own toggle ----
+        "knob.onclick=function(){"
+        "var found=false;"
+        "var tries=["
+        "'button[data-testid=\"collapsedControl\"]',"
+        "'[data-testid=\"stSidebarCollapsedControl\"] button',"
+        "'button[aria-label=\"open sidebar\"]',"
+        "'button[aria-label=\"Open sidebar\"]',"
+        "'button[aria-label=\"close sidebar\"]',"
+        "'button[aria-label=\"Close sidebar\"]'"
+        "];"
+        "for(var i=0;i<tries.length;i++){"
+        "var el=pd.querySelector(tries[i]);"
+        "if(el){el.click();found=true;break;}}"
+        # fallback: find button adjacent to sidebar in DOM
+        "if(!found){"
+        "var sb=pd.querySelector('[data-testid=\"stSidebar\"]');"
+        "if(sb&&sb.nextElementSibling){"
+        "var fbtn=sb.nextElementSibling.querySelector('button');"
+        "if(fbtn)fbtn.click();}}"
+        "};"
+
+        # ---- poll every 300ms to show/hide knob ----
+        # clear old interval stored on window.parent
+        "if(p.__ce_iv__)clearInterval(p.__ce_iv__);"
+        "p.__ce_iv__=setInterval(function(){"
+        "var sb=pd.querySelector('[data-testid=\"stSidebar\"]');"
+        "if(!sb)return;"
+        "var w=sb.getBoundingClientRect().width;"
+        "knob.style.display=w<50?'flex':'none';"
+        "},300);"
+
+        # ---- run once immediately ----
+        "(function(){"
+        "var sb=pd.querySelector('[data-testid=\"stSidebar\"]');"
+        "if(!sb)return;"
+        "knob.style.display=sb.getBoundingClientRect().width<50?'flex':'none';"
+        "})();"
+
+        "})();</script>"
+    )
@@ -0,0 +1,269 @@
+"""
+ace_writeback.py — Write-behind queue for MongoDB writes off the request path
+Callers enqueue inserts/updates/deletes and return immediately; a daemon thread
+batches them per collection with `bulk_write` (ordered, so per-collection order is
+kept) and flushes on `flush()`, `close()` and interpreter exit.
+
+An op is appended (and fsynced) to a local journal (ACE_WRITEBACK_JOURNAL) before the
+enqueue returns, so an acknowledged save survives a MongoDB outage and a process
+restart: the journal is replayed on start and truncated once everything in it is
+written. Every op is idempotent (client-side `_id`s, `$set` updates), so replaying
+one that did land is harmless. Transient errors (connection loss, elections) are
+retried with backoff for up to ACE_WRITEBACK_RETRY_S. An op that still fails, or is
+rejected outright, is dead-lettered: logged, appended to `<journal>.dead`, and kept
+for `take_failures()` so the app can tell the user.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import bson
+from bson import ObjectId, json_util
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+
+import ace_metrics
+from ace_config import cfg
+
+try:
+    import fcntl
+except ImportError:          # Windows: no journal locking
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+_DUPLICATE_KEY = 11000
+# Server codes pymongo itself treats as retryable (elections, shutdowns, stepdowns).
+_RETRYABLE_CODES = {6, 7, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+_MAX_BACKOFF = 5.0
+_MAX_FAILURES = 1000       # dead letters kept for take_failures(); all of them go to <journal>.dead
+
+
+class _Entry:
+    __slots__ = ("seq", "coll", "kind", "spec", "user_id")
+
+    def __init__(self, seq: int, coll: str, kind: str, spec: dict):
+        self.seq, self.coll, self.kind, self.spec = seq, coll, kind, spec
+        self.user_id = (spec.get("doc") or spec.get("filter") or {}).get("user_id")
+
+    def op(self):
+        s = self.spec
+        if self.kind == "insert":
+            return InsertOne(s["doc"])
+        if self.kind == "update":
+            return UpdateOne(s["filter"], s["update"], upsert=s.get("upsert", False))
+        return DeleteOne(s["filter"])
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, ConnectionFailure):
+        return True
+    if isinstance(e, BulkWriteError):
+        errors = e.details.get("writeErrors", [])
+        return not errors or errors[0].get("code") in _RETRYABLE_CODES
+    if isinstance(e, OperationFailure):
+        return e.has_error_label("RetryableWriteError") or e.code in _RETRYABLE_CODES
+    return False
+
+
+class WriteBehind:
+    def __init__(self, db, max_batch: int = 200, flush_interval: float = 0.2,
+                 retry_for: float = None, journal: str = None):
+        self.db = db
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.retry_for = cfg.writeback_retry_s if retry_for is None else retry_for
+        self._q: queue.Queue = queue.Queue()
+        self._closed = False
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()           # journal appends / truncation, dead letters
+        self._seq = 0
+        self._written_seq = 0
+        self._failures: list = []
+        self._journal = None
+        self._dead_path = None
+        self._open_journal(cfg.writeback_journal if journal is None else journal)
+        self._thread = threading.Thread(target=self._run, name="ace-writeback", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ── enqueue ──────────────────────────────────────────────────────────────
+    def insert(self, coll: str, doc: dict) -> ObjectId:
+        # Client-side _id makes a retried insert idempotent (duplicate key == already written).
+        doc.setdefault("_id", ObjectId())
+        self._put(coll, "insert", {"doc": doc})
+        return doc["_id"]
+
+    def update(self, coll: str, filter: dict, update: dict, upsert: bool = False):
+        self._put(coll, "update", {"filter": filter, "update": update, "upsert": upsert})
+
+    def delete(self, coll: str, filter: dict):
+        self._put(coll, "delete", {"filter": filter})
+
+    def _put(self, coll: str, kind: str, spec: dict):
+        if self._closed:
+            raise RuntimeError("WriteBehind is closed")
+        with self._lock:
+            self._seq += 1
+            entry = _Entry(self._seq, coll, kind, spec)
+            if self._journal is not None:
+                self._journal.write(bson.encode({"seq": entry.seq, "coll": coll, "kind": kind, "spec": spec}))
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+            self._q.put(entry)
+
+    # ── journal ──────────────────────────────────────────────────────────────
+    def _open_journal(self, path: str):
+        if not path:
+            return
+        f = open(path, "ab+")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:             # another process owns it: keep a journal of our own
+                f.close()
+                path = f"{path}.{os.getpid()}"
+                f = open(path, "ab+")
+        self._journal, self._dead_path = f, f"{path}.dead"
+        f.seek(0)
+        replayed = 0
+        try:
+            for rec in bson.decode_file_iter(f):
+                self._seq = max(self._seq, rec["seq"])
+                self._q.put(_Entry(rec["seq"], rec["coll"], rec["kind"], rec["spec"]))
+                replayed += 1
+        except bson.errors.InvalidBSON:
+            log.warning("write-behind: ignoring a torn record at the end of %s", path)
+        if replayed:
+            log.info("write-behind: replaying %d queued op(s) from %s", replayed, path)
+
+    def _written(self, seq: int):
+        """Everything up to `seq` is written or dead-lettered; drop the journal once it is all done."""
+        with self._lock:
+            self._written_seq = max(self._written_seq, seq)
+            if self._journal is not None and self._written_seq == self._seq:
+                self._journal.truncate(0)
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+
+    # ── dead letters ─────────────────────────────────────────────────────────
+    def _dead(self, entries: list, error: Exception):
+        log.error("write-behind: dead-lettering %d op(s) on %s: %s", len(entries), entries[0].coll, error)
+        now = datetime.now(timezone.utc)
+        rows = [{"coll": e.coll, "kind": e.kind, "user_id": e.user_id, "error": str(error)[:500], "at": now}
+                for e in entries]
+        with self._lock:
+            self._failures = (self._failures + rows)[-_MAX_FAILURES:]
+            if self._dead_path:
+                try:
+                    with open(self._dead_path, "a", encoding="utf-8") as f:
+                        for e, row in zip(entries, rows):
+                            f.write(json_util.dumps({**row, "spec": e.spec}) + "\n")
+                except OSError:
+                    log.exception("write-behind: could not record dead letters in %s", self._dead_path)
+
+    def take_failures(self, user_id: str) -> list:
+        """Dead-lettered ops for `user_id` ({coll, kind, error, at}), removed once returned."""
+        with self._lock:
+            mine = [f for f in self._failures if f["user_id"] == user_id]
+            if mine:
+                self._failures = [f for f in self._failures if f["user_id"] != user_id]
+        return mine
+
+    # ── flush / shutdown ─────────────────────────────────────────────────────
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until everything enqueued before this call is written. Returns False on timeout."""
+        done = threading.Event()
+        self._q.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Flush, then stop. Ops still unwritten stay in the journal for the next start."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._stopping.set()
+        self._q.put(None)
+        self._thread.join(timeout)
+        with self._lock:
+            if self._journal is not None and not self._thread.is_alive():
+                self._journal.close()           # releases the lock for the next process
+                self._journal = None
+
+    # ── worker ───────────────────────────────────────────────────────────────
+    def _run(self):
+        while True:
+            batch, waiters, stop = [], [], False
+            item = self._q.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)        # flush marker: write what we have now
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                if not self._write(batch):
+                    return                      # stopping mid-retry: the journal keeps the rest
+                self._written(batch[-1].seq)
+            for w in waiters:
+                w.set()
+            if stop:
+                return
+
+    def _write(self, batch: list) -> bool:
+        """Write `batch`, dead-lettering what cannot be written. False if stopped mid-retry."""
+        by_coll: dict = {}
+        for e in batch:
+            by_coll.setdefault(e.coll, []).append(e)
+        for coll, entries in by_coll.items():
+            give_up = time.monotonic() + self.retry_for
+            attempt = 0
+            while entries:
+                try:
+                    with ace_metrics.mongo_op(f"writeback_{coll}"):
+                        self.db[coll].bulk_write([e.op() for e in entries], ordered=True)
+                    break
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    failed = errors[0]["index"] if errors else 0
+                    if errors and errors[0].get("code") == _DUPLICATE_KEY:
+                        # Already applied by an earlier attempt — carry on with the rest.
+                        entries = entries[failed + 1:]
+                        continue
+                    if errors and not _retryable(e):
+                        self._dead(entries[failed:failed + 1], e)
+                        entries = entries[failed + 1:]
+                        continue
+                    entries, err = entries[failed:], e      # ops before `failed` landed
+                except Exception as e:
+                    if not _retryable(e):
+                        self._dead(entries, e)
+                        break
+                    err = e
+                attempt += 1
+                if time.monotonic() >= give_up:
+                    self._dead(entries, err)
+                    break
+                if attempt == 1:
+                    log.warning("write-behind: %s unavailable, retrying for up to %g s: %s",
+                                coll, self.retry_for, err)
+                if self._stopping.wait(min(_MAX_BACKOFF, 0.2 * 2 ** (attempt - 1))):
+                    return False
+        return True
@@ -0,0 +1,77 @@
+"""
+Storage and bytes-over-wire for inline vs compressed out-of-line Markdown bodies.
+
+    python benchmarks/bench_body_storage.py
+    python benchmarks/bench_body_storage.py path/to/*.md
+
+The corpus defaults to the generated guides in Notebooks/*.md. For each document
+it compares the old inline `blogs` document with the metadata-only `blogs` document,
+its zlib `blog_bodies` entry and its `blog_search` entry, using the same helpers
+ace_store.save_blog uses. Listing history reads `blogs` only; opening a document
+reads `blogs` and `blog_bodies`.
+"""
+import glob
+import os
+import sys
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bson
+from bson import Binary, ObjectId
+
+import ace_store
+
+
+def sizes(md: str):
+    meta = {
+        "blog_title": md.splitlines()[0].lstrip("# ") if md else "Untitled",
+        "filename": "doc.md", "mode": "hybrid", "output_type": "Study Guide",
+        "section_count": 5, "words_per_section": 300, "depth_level": "Deep",
+        "tone": "Educational", "topic": "self-attention", "created_at": "Jan 01 2026, 10:00",
+        "user_id": "bench-user",
+    }
+    oid = ObjectId()
+    inline = len(bson.encode({"_id": oid, **meta, "markdown": md}))
+    doc = {"_id": oid, **meta, "saved_at": datetime.now(timezone.utc), "body_bytes": len(md.encode())}
+    blogs = len(bson.encode(doc))
+    body = len(bson.encode({
+        "_id": oid, "user_id": "bench-user", "codec": ace_store.BODY_CODEC,
+        "data": Binary(ace_store._compress(md)),
+    }))
+    words = ace_store._search_text(md)
+    search = len(bson.encode(ace_store._search_entry(doc, words)))
+    with_words = len(bson.encode({**doc, "search_text": words}))   # search_text kept in `blogs`
+    return inline, blogs, body, search, with_words
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(ROOT, "Notebooks", "*.md")))
+    if not paths:
+        sys.exit("no Markdown files found")
+
+    tot_inline = tot_blogs = tot_body = tot_search = tot_with_words = 0
+    print(f"{'document':<48} {'inline':>9} {'blogs':>9} {'body':>9} {'search':>9}")
+    for p in paths:
+        md = open(p, encoding="utf-8").read()
+        inline, blogs, body, search, with_words = sizes(md)
+        tot_inline += inline
+        tot_blogs += blogs
+        tot_body += body
+        tot_search += search
+        tot_with_words += with_words
+        print(f"{os.path.basename(p)[:48]:<48} {inline:>9,} {blogs:>9,} {body:>9,} {search:>9,}")
+
+    n = len(paths)
+    stored = tot_blogs + tot_body + tot_search
+    print(f"{'total':<48} {tot_inline:>9,} {tot_blogs:>9,} {tot_body:>9,} {tot_search:>9,}")
+    print(f"storage: {tot_inline:,} B inline -> {stored:,} B ({1 - stored / tot_inline:.0%} smaller)")
+    print(f"metadata-only blogs: {tot_blogs / n:,.0f} B avg per entry "
+          f"({tot_inline / n:,.0f} B with the body inline, {tot_with_words / n:,.0f} B with search_text)")
+    print(f"opening a document (wire): {tot_inline / n:,.0f} B -> "
+          f"{(tot_blogs + tot_body) / n:,.0f} B avg per document")
+
+
+if __name__ == "__main__":
+    main()
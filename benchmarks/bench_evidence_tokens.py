@@ -0,0 +1,100 @@
+"""
+Worker-prompt evidence per run, before and after per-section BM25 selection.
+
+    python benchmarks/bench_evidence_tokens.py
+    python benchmarks/bench_evidence_tokens.py --sections 8 --evidence 40 --k 6
+
+Builds a synthetic research run: evidence items drawn from several subtopics and
+a plan whose sections each cover one subtopic. "before" sends the first 20 items
+to every section (the old worker behaviour); "after" sends ace_evidence's top-k.
+Tokens are estimated at 4 characters per token for the evidence block only, since
+the rest of the worker prompt is unchanged. Precision is the share of items sent
+to a section that come from that section's subtopic.
+"""
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ace_evidence
+
+SUBTOPICS = {
+    "indexing":    ["b-tree index", "covering index", "index selectivity", "composite key order"],
+    "replication": ["replica set", "oplog lag", "read preference", "failover election"],
+    "sharding":    ["shard key", "chunk migration", "balancer", "hashed sharding"],
+    "caching":     ["cache hit ratio", "ttl eviction", "write-through cache", "cache stampede"],
+    "security":    ["tls certificates", "role based access", "audit log", "encryption at rest"],
+    "backups":     ["point in time restore", "snapshot backup", "backup retention", "restore drill"],
+    "monitoring":  ["slow query log", "latency percentiles", "alert thresholds", "profiler sampling"],
+    "schema":      ["document embedding", "schema validation", "reference pattern", "array growth"],
+}
+FILLER = "database performance production guide overview notes team practical".split()
+
+
+def make_run(n_sections: int, n_evidence: int, seed: int = 7):
+    rnd = random.Random(seed)
+    names = list(SUBTOPICS)[:n_sections]
+    evidence = []
+    for i in range(n_evidence):
+        label = names[i % len(names)]
+        phrase = rnd.choice(SUBTOPICS[label])
+        evidence.append({
+            "title":        f"{phrase.title()}: {' '.join(rnd.sample(FILLER, 3))}",
+            "url":          f"https://example.com/{label}/{i}",
+            "published_at": "2025-0%d-1%d" % (rnd.randint(1, 9), rnd.randint(0, 9)),
+            "snippet":      f"How {phrase} affects {' '.join(rnd.sample(FILLER, 4))} in practice.",
+            "source":       "example.com",
+            "_label":       label,
+        })
+    tasks = []
+    for i, label in enumerate(names):
+        terms = SUBTOPICS[label]
+        tasks.append({
+            "id": i + 1, "title": f"{label.title()} in production",
+            "goal": f"Understand {terms[0]} and {terms[1]}.",
+            "bullets": [f"Explain {t}" for t in terms[:3]],
+            "tags": [label], "requires_research": True,
+            "_label": label,
+        })
+    return evidence, tasks
+
+
+def evidence_block(items: list) -> str:
+    # Same line format as worker_node.
+    return "\n".join(f"- {e['title']} | {e['url']} | {e['published_at'] or 'date:unknown'}" for e in items[:20])
+
+
+def measure(selected_per_task: list, tasks: list):
+    tokens = sum(len(evidence_block(items)) / 4 for items in selected_per_task)
+    sent = sum(len(items) for items in selected_per_task)
+    relevant = sum(
+        sum(e["_label"] == t["_label"] for e in items)
+        for items, t in zip(selected_per_task, tasks)
+    )
+    return int(tokens), sent, (relevant / sent if sent else 0.0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sections", type=int, default=6)
+    ap.add_argument("--evidence", type=int, default=30)
+    ap.add_argument("--k", type=int, default=6)
+    args = ap.parse_args()
+
+    evidence, tasks = make_run(args.sections, args.evidence)
+    before = [evidence[:20] for _ in tasks]
+    index = ace_evidence.EvidenceIndex(evidence)
+    after = [index.top_k(t, args.k) for t in tasks]
+
+    print(f"{args.sections} sections, {args.evidence} evidence items, k={args.k}")
+    print(f"{'':8} {'evidence tokens/run':>20} {'items sent':>11} {'precision':>10}")
+    for name, sel in (("before", before), ("after", after)):
+        tokens, sent, precision = measure(sel, tasks)
+        print(f"{name:8} {tokens:>20,} {sent:>11} {precision:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
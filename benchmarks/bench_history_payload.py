@@ -0,0 +1,104 @@
+"""
+Bytes transferred at login: full `blogs` documents vs the metadata projection.
+
+    python benchmarks/bench_history_payload.py                  # offline BSON estimate
+    python benchmarks/bench_history_payload.py --mongo-uri URI  # measured on a scratch DB
+
+The offline mode encodes a synthetic corpus with `bson` and applies the same
+projection locally; the live mode seeds a throwaway database and sums the raw
+BSON size of what the driver actually receives.
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+import ace_store
+
+WORDS = "attention transformer gradient token embedding layer softmax query key value".split()
+
+
+def make_corpus(n_docs: int, words: int, user_id: str = "bench-user") -> list:
+    rng = random.Random(7)
+    now = datetime.now(timezone.utc)
+    docs = []
+    for i in range(n_docs):
+        body = " ".join(rng.choice(WORDS) for _ in range(words))
+        docs.append({
+            "blog_title":        f"Guide #{i}: {rng.choice(WORDS).title()} in depth",
+            "markdown":          f"# Guide #{i}\n\n{body}\n",
+            "filename":          f"guide_{i}.md",
+            "mode":              "hybrid",
+            "output_type":       "Study Guide",
+            "section_count":     10,
+            "words_per_section": words // 10,
+            "depth_level":       "Exhaustive",
+            "tone":              "Educational",
+            "topic":             f"topic {i}",
+            "created_at":        (now - timedelta(minutes=i)).strftime("%b %d %Y, %H:%M"),
+            "user_id":           user_id,
+            "saved_at":          now - timedelta(minutes=i),
+        })
+    return docs
+
+
+def offline(docs: list, page: int):
+    newest = sorted(docs, key=lambda d: d["saved_at"], reverse=True)[:page]
+    full = sum(len(bson.encode(d)) for d in newest)
+    keep = set(ace_store.BLOG_LIST_FIELDS) | {"_id"}
+    projected = sum(len(bson.encode({k: v for k, v in d.items() if k in keep})) for d in newest)
+    return full, projected
+
+
+def live(uri: str, docs: list, page: int):
+    from pymongo import MongoClient
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=6000)
+    db = client["ace_bench_history"]
+    try:
+        db["blogs"].drop()
+        ace_store.ensure_indexes(db)
+        db["blogs"].insert_many([dict(d) for d in docs])
+        raw = db.get_collection("blogs", codec_options=CodecOptions(document_class=RawBSONDocument))
+        query = {"user_id": docs[0]["user_id"]}
+        full = sum(len(d.raw) for d in raw.find(query).sort("saved_at", -1).limit(page))
+        projected = sum(
+            len(d.raw)
+            for d in raw.find(query, ace_store.BLOG_LIST_FIELDS).sort("saved_at", -1).limit(page)
+        )
+        plan = db["blogs"].find(query, ace_store.BLOG_LIST_FIELDS).sort("saved_at", -1).limit(page).explain()
+        winning = plan.get("queryPlanner", {}).get("winningPlan", {})
+        return full, projected, "SORT" in str(winning)
+    finally:
+        client.drop_database("ace_bench_history")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--docs", type=int, default=300)
+    ap.add_argument("--words", type=int, default=10_000)
+    ap.add_argument("--mongo-uri", default="")
+    args = ap.parse_args()
+
+    docs = make_corpus(args.docs, args.words)
+    page = ace_store.HISTORY_PAGE_SIZE
+    full, projected = offline(docs, page)
+    print(f"corpus: {args.docs} docs x {args.words} words, first page = {page}")
+    print(f"offline  full={full / 1024:,.1f} KiB  projected={projected / 1024:,.1f} KiB  "
+          f"({full / max(projected, 1):,.0f}x less)")
+
+    if args.mongo_uri:
+        full, projected, in_mem_sort = live(args.mongo_uri, docs, page)
+        print(f"live     full={full / 1024:,.1f} KiB  projected={projected / 1024:,.1f} KiB  "
+              f"in-memory SORT stage: {in_mem_sort}")
+
+
+if __name__ == "__main__":
+    main()
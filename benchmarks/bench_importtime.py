@@ -0,0 +1,79 @@
+"""
+Cold-start import profile (python -X importtime) for the app's entry points.
+
+    python benchmarks/bench_importtime.py                    # both profiles, top 15 modules each
+    python benchmarks/bench_importtime.py --target-ms 1500   # fail if the page profile is slower
+
+"page" is everything streamlit_app.py imports before drawing the auth page and
+history; it must stay under --target-ms and must not pull in the LLM stack.
+"backend" is ACE_backend, which the app imports on a background thread. Each
+profile runs in a fresh interpreter; the best of --runs is reported. Exits 1 if
+the page profile misses the target or imports a forbidden module.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    "page": "import streamlit, pymongo, ace_auth, ace_config, ace_evidence_store, ace_flight, ace_images, ace_jobs, ace_metrics, ace_quota, ace_render, ace_theme, ace_writeback, ace_store",
+    "backend": "import ACE_backend",
+}
+# Must not load while the auth page / history render.
+FORBIDDEN_ON_PAGE = ("langgraph", "langchain_core", "langchain_google_genai", "langchain_tavily",
+                     "bcrypt", "markdown", "nh3", "ACE_backend")
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile(code: str):
+    """Return (total_us, {module: cumulative_us}) for one fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    cumulative, total = {}, 0
+    for m in _LINE_RE.finditer(proc.stderr):
+        self_us, cum_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        cumulative[name] = cum_us
+        if len(indent) == 1:             # top-level import: cumulative already includes children
+            total += cum_us
+    return total, cumulative
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--target-ms", type=float, default=1500.0, help="budget for the page profile")
+    args = ap.parse_args()
+
+    failed = False
+    for name, code in PROFILES.items():
+        try:
+            total, cumulative = min((profile(code) for _ in range(args.runs)), key=lambda r: r[0])
+        except RuntimeError as e:
+            print(f"{name}: could not import ({e})")
+            failed |= name == "page"
+            continue
+        print(f"\n{name}: {total / 1000:.0f}ms cold import  ({code})")
+        for mod, us in sorted(cumulative.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"  {us / 1000:8.1f}ms  {mod}")
+        if name == "page":
+            leaked = sorted({m.split(".")[0] for m in cumulative} & set(FORBIDDEN_ON_PAGE))
+            if leaked:
+                print(f"  FAIL: page imports {', '.join(leaked)}")
+                failed = True
+            verdict = "ok" if total / 1000 <= args.target_ms else "FAIL"
+            failed |= verdict == "FAIL"
+            print(f"  target {args.target_ms:.0f}ms: {verdict}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
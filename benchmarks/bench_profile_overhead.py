@@ -0,0 +1,60 @@
+"""
+Cost of the ace_profile hooks: graph runs with profiling off, sample and cprofile.
+
+    python benchmarks/bench_profile_overhead.py             # 30 runs per mode
+    python benchmarks/bench_profile_overhead.py --runs 100
+
+Runs the full graph with the fake providers at zero latency, so the pipeline's own
+Python is all that is measured: the setting where a hook's cost would show most.
+With profiling off, the only added cost is the wrapper on each node call, which is
+printed at the end. Profile artefacts go to a temp dir.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--runs", type=int, default=30)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        "ACE_PROVIDER": "fake", "ACE_FAKE_LATENCY": "0", "ACE_SECTION_COUNT": "5",
+        "ACE_DEPTH_LEVEL": "Quick", "ACE_IMAGES": "0", "ACE_PROFILE_DIR": tmp,
+    })
+    os.chdir(tmp)                    # the reducer writes one .md per run
+    import ACE_backend
+    import ace_profile
+
+    def one(mode):
+        t0 = time.perf_counter()
+        with ace_profile.session("bench", mode=mode):
+            ACE_backend.app.invoke({"topic": "Profiling overhead"})
+        return (time.perf_counter() - t0) * 1000
+
+    one("")                          # warm imports and caches
+    print(f"{args.runs} graph runs per mode (fake provider, zero latency)")
+    print(f"{'mode':>9} {'median ms':>10} {'p90 ms':>8}")
+    for mode in ("", "sample", "cprofile"):
+        times = sorted(one(mode) for _ in range(args.runs))
+        print(f"{mode or 'off':>9} {statistics.median(times):>10.1f} {times[int(len(times) * 0.9) - 1]:>8.1f}")
+
+    def bare(x):
+        return x
+    wrapped = ace_profile.wrap("bench", bare)
+    n = 1_000_000
+    cost = (timeit.timeit(lambda: wrapped(1), number=n) - timeit.timeit(lambda: bare(1), number=n)) / n
+    print(f"wrapped node, no session: +{cost * 1e9:.0f} ns per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Cost of viewing a 10,000-word saved guide, before and after ace_render.
+
+    python benchmarks/bench_render.py                # render/cache time + bytes sent per rerun
+    python benchmarks/bench_render.py --apptest      # also time real reruns via streamlit.testing
+
+"before" sends the whole Markdown with st.markdown on every rerun (the browser
+re-parses it each time); "after" serves cached sanitized HTML and, for long
+documents, only the sections that are open (one by default). Needs `markdown`
+and `nh3`; --apptest also needs streamlit.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ace_render
+
+WORDS = ("latency throughput index cache replica shard query cursor batch write read "
+         "document schema field vector token stream buffer lock thread process queue").split()
+
+
+def make_guide(words: int = 10_000, sections: int = 20, seed: int = 3) -> str:
+    rnd = random.Random(seed)
+    per = words // sections
+    out = ["# A Long Study Guide", ""]
+    for i in range(sections):
+        out += [f"## Section {i + 1}: {rnd.choice(WORDS).title()} in practice", ""]
+        left = per
+        while left > 0:
+            n = min(left, rnd.randint(40, 90))
+            out += [" ".join(rnd.choice(WORDS) for _ in range(n)) + ".", ""]
+            left -= n
+            if rnd.random() < 0.25:
+                out += [f"- **{rnd.choice(WORDS)}**: `{rnd.choice(WORDS)}()` {rnd.choice(WORDS)}"
+                        for _ in range(3)] + [""]
+        out += ["```python", f"def {rnd.choice(WORDS)}(x):", "    return x * 2", "```", ""]
+    return "\n".join(out)
+
+
+def sent_after(doc: dict, opened: set) -> int:
+    n = sum(len(p[1]) for p in doc["preamble"] if p[0] == "html")
+    for i, sec in enumerate(doc["sections"]):
+        n += len(sec["title"]) + 32                       # the section's toggle button
+        if i in opened:
+            n += sum(len(p[1]) for p in sec["parts"] if p[0] == "html")
+    return n
+
+
+def bench_offline(md: str, reruns: int):
+    print(f"document: {len(md.split()):,} words, {len(md.encode()):,} bytes of Markdown")
+    t0 = time.perf_counter()
+    doc = ace_render.render(md)
+    first = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(reruns):
+        ace_render.render(md)
+    cached = (time.perf_counter() - t0) / reruns
+    print(f"render: first view {first * 1000:.1f}ms, cached rerun {cached * 1e6:.1f}us "
+          f"({len(doc['sections'])} sections, lazy={doc['lazy']})")
+    before = len(md.encode())
+    for label, opened in (("1 open", {0}), ("3 open", {0, 1, 2}), ("all open", set(range(len(doc["sections"]))))):
+        after = sent_after(doc, opened)
+        print(f"bytes/rerun  before {before:>8,}   after ({label:>8}) {after:>8,}  ({after / before - 1:+.0%})")
+
+
+def bench_apptest(md: str, reruns: int):
+    from streamlit.testing.v1 import AppTest
+
+    def before_script():
+        import streamlit as st
+        st.markdown(st.session_state["md"])
+
+    def after_script():
+        import streamlit as st
+        import ace_render
+        doc = ace_render.render(st.session_state["md"])
+        for i, sec in enumerate(doc["sections"]):
+            st.button(sec["title"], key=f"s{i}")
+            if i == 0:
+                st.html("".join(p[1] for p in sec["parts"] if p[0] == "html"))
+
+    for name, script in (("before", before_script), ("after", after_script)):
+        at = AppTest.from_function(script, default_timeout=30)
+        at.session_state["md"] = md
+        at.run()
+        times = []
+        for _ in range(reruns):
+            t0 = time.perf_counter()
+            at.run()
+            times.append(time.perf_counter() - t0)
+        times.sort()
+        print(f"apptest {name:6}: {reruns} reruns, median {times[len(times) // 2] * 1000:.1f}ms, "
+              f"max {times[-1] * 1000:.1f}ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--words", type=int, default=10_000)
+    ap.add_argument("--reruns", type=int, default=200)
+    ap.add_argument("--apptest", action="store_true")
+    args = ap.parse_args()
+
+    md = make_guide(args.words)
+    bench_offline(md, args.reruns)
+    if args.apptest:
+        bench_apptest(md, min(args.reruns, 50))
+
+
+if __name__ == "__main__":
+    main()
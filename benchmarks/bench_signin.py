@@ -0,0 +1,78 @@
+"""
+Sign-in throughput under concurrent load: inline bcrypt vs the bounded ace_auth pool.
+
+    python benchmarks/bench_signin.py --users 64 --rounds 10
+
+Each simulated user performs one password check. "inline" hashes on the caller's
+thread with no limit (the old behaviour); "pool" goes through ace_auth.check_pw.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+
+
+def run(label: str, check, users: int, pw: bytes, hashed: bytes):
+    latencies, busy = [], 0
+    lock = threading.Lock()
+    start = threading.Barrier(users + 1)
+
+    def one():
+        nonlocal busy
+        start.wait()
+        t0 = time.perf_counter()
+        try:
+            check(pw, hashed)
+        except Exception:          # ace_auth.AuthBusy
+            with lock:
+                busy += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=one) for _ in range(users)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    lat = sorted(latencies) or [0.0]
+    p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+    print(f"{label:<7} ok={len(latencies):>4} busy={busy:>4} wall={wall:6.2f}s "
+          f"throughput={len(latencies) / wall:6.1f}/s p50={statistics.median(lat) * 1000:7.1f}ms "
+          f"p95={p95 * 1000:7.1f}ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--users", type=int, default=64)
+    ap.add_argument("--rounds", type=int, default=10)
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    ap.add_argument("--queue", type=int, default=32)
+    args = ap.parse_args()
+
+    os.environ["ACE_BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["ACE_BCRYPT_WORKERS"] = str(args.workers)
+    os.environ["ACE_BCRYPT_QUEUE"] = str(args.queue)
+    import ace_auth
+
+    pw = b"correct horse battery staple"
+    hashed = bcrypt.hashpw(pw, bcrypt.gensalt(rounds=args.rounds))
+    print(f"{args.users} concurrent sign-ins, rounds={args.rounds}, "
+          f"pool workers={args.workers} queue={args.queue}, cores={os.cpu_count()}")
+
+    run("inline", lambda p, h: bcrypt.checkpw(p, h), args.users, pw, hashed)
+    run("pool", lambda p, h: ace_auth.check_pw(p.decode(), h.decode()), args.users, pw, hashed)
+
+
+if __name__ == "__main__":
+    main()
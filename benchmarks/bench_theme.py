@@ -0,0 +1,111 @@
+"""
+Per-rerun cost of the theme stylesheet and static markup, before and after ace_theme.
+
+    python benchmarks/bench_theme.py                 # payload build time + bytes per rerun
+    python benchmarks/bench_theme.py --apptest       # also time real reruns of the auth page
+
+"before" re-formats the f-string CSS on every rerun (the old behaviour); "after"
+reuses the memoised, minified per-theme payload. The session line counts the bytes
+a session of --reruns reruns sends when the stylesheet goes out on every rerun vs
+only on the first THEME_SEND_RUNS runs per theme. --apptest needs streamlit and a
+reachable MONGO_URI; it reports wall time per script run via streamlit.testing and
+the bytes of the elements each run sent, with the stylesheet's share.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ace_theme
+
+
+def static_payload(css: str, dark: bool) -> list:
+    # What a signed-in rerun sends regardless of user data: stylesheet, sidebar knob, hero.
+    return [css, ace_theme.sidebar_js(dark), ace_theme.HERO_HTML]
+
+
+def stylesheet_bytes(dark: bool, run: int) -> int:
+    """Stylesheet bytes sent on a session's `run`-th run (0-based) since its theme was set."""
+    if run >= ace_theme.THEME_SEND_RUNS:
+        return 0
+    return len(ace_theme.theme_css(dark).encode()) + len(ace_theme.theme_head_js(dark).encode())
+
+
+def bench_session(reruns: int):
+    # One session: `reruns` runs, switching theme halfway.
+    half = max(1, reruns // 2)
+    every = sum(len(ace_theme.theme_css(i < half).encode()) for i in range(reruns))
+    sent = sum(stylesheet_bytes(i < half, i if i < half else i - half) for i in range(reruns))
+    print(f"session of {reruns} runs, one theme switch: stylesheet {every / reruns:,.0f} B/run -> "
+          f"{sent / reruns:,.0f} B/run ({sent:,} B in total, 0 B on steady-state reruns)")
+
+
+def bench_payload(reruns: int):
+    for dark in (True, False):
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            before = static_payload(f"<style>{ace_theme._build_css(dark)}</style>", dark)
+        t_before = (time.perf_counter() - t0) / reruns
+
+        ace_theme.theme_css.cache_clear()
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            after = static_payload(ace_theme.theme_css(dark), dark)
+        t_after = (time.perf_counter() - t0) / reruns
+
+        b_before = sum(len(p.encode()) for p in before)
+        b_after = sum(len(p.encode()) for p in after)
+        name = "dark " if dark else "light"
+        print(f"{name}  build/rerun {t_before * 1e6:8.1f}us -> {t_after * 1e6:6.2f}us   "
+              f"bytes/rerun {b_before:,} -> {b_after:,} ({1 - b_after / b_before:.0%} smaller)")
+
+
+def bench_apptest(reruns: int):
+    from streamlit.testing.v1 import AppTest
+
+    def sent(node) -> tuple:
+        # (all element bytes, stylesheet bytes) of what this run left on the page.
+        total = css = 0
+        proto = getattr(node, "proto", None)
+        if proto is not None:
+            total = proto.ByteSize()
+            text = str(proto)
+            css = total if "<style>" in text or "ce-theme" in text else 0
+        for child in getattr(node, "children", {}).values():
+            t, c = sent(child)
+            total, css = total + t, css + c
+        return total, css
+
+    at = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=30)
+    at.run()
+    print(f"apptest auth page, first run: {sent(at._tree)[0]:,} B ({sent(at._tree)[1]:,} B stylesheet)")
+    times, sizes = [], []
+    for _ in range(reruns):
+        t0 = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - t0)
+        sizes.append(sent(at._tree))
+    times.sort()
+    steady = sizes[ace_theme.THEME_SEND_RUNS:] or sizes
+    print(f"apptest auth page: {reruns} reruns, median {times[len(times) // 2] * 1000:.1f}ms, "
+          f"max {times[-1] * 1000:.1f}ms, steady-state {steady[-1][0]:,} B/rerun "
+          f"({steady[-1][1]:,} B stylesheet)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--reruns", type=int, default=200)
+    ap.add_argument("--apptest", action="store_true")
+    args = ap.parse_args()
+
+    bench_payload(args.reruns)
+    bench_session(args.reruns)
+    if args.apptest:
+        bench_apptest(min(args.reruns, 50))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,27 @@ Enhanced UI version with improved light mode, auth page, and visual polish.
 All logic preserved, only UI/CSS enhanced.
 """
 
-import sys, os, secrets
-from datetime import datetime, timezone, timedelta
+import sys, os, time, threading, importlib
+from datetime import datetime, timezone
 
-import bcrypt
 import streamlit as st
 from pymongo import MongoClient
-from bson import ObjectId
-from dotenv import load_dotenv
+
+# Only light modules here: the auth page and history never load the LLM stack
+# (ACE_backend → langgraph / langchain), which is warmed in the background instead.
+import ace_auth
+import ace_config
+import ace_evidence_store
+import ace_flight
+import ace_images
+import ace_jobs
+import ace_metrics
+import ace_profile
+import ace_quota
+import ace_render
+import ace_theme
+import ace_writeback
+import ace_store
 
 # ── Page config ───────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -29,751 +42,29 @@ if "sidebar_open" not in st.session_state:
 
 dark = st.session_state.dark_mode
 
-# ── Color palette ─────────────────────────────────────────────────────────────
-if dark:
-    bg_main        = "#080810"
-    bg_card        = "#0f0f1a"
-    bg_card2       = "#131325"
-    bg_sidebar     = "#0b0b16"
-    text_primary   = "#ede8ff"
-    text_sec       = "#8b86a8"
-    text_muted     = "#4a465e"
-    border_col     = "rgba(120,100,255,0.1)"
-    border_input   = "rgba(120,100,255,0.18)"
-    input_bg       = "#0f0f1a"
-    input_text     = "#ede8ff"
-    accent         = "#7c5cfc"
-    accent2        = "#a855f7"
-    accent_light   = "#c4a8ff"
-    accent_soft    = "rgba(124,92,252,0.12)"
-    hero_sub       = "#5c586e"
-    hist_label     = "#2e2a40"
-    md_p           = "#9e9ab8"
-    md_h2          = "#c8c4e0"
-    md_code_bg     = "rgba(124,92,252,0.15)"
-    md_code_c      = "#c8a8f8"
-    md_pre_bg      = "#07070f"
-    alert_bg       = "rgba(124,92,252,0.08)"
-    alert_border   = "rgba(124,92,252,0.2)"
-    alert_text     = "#c8b4f8"
-    mode_icon      = "☀️"
-    mode_label     = "Light"
-    chip_bg        = "rgba(124,92,252,0.08)"
-    chip_border    = "rgba(124,92,252,0.2)"
-    pipeline_run   = "#7c5cfc"
-    pipeline_done  = "rgba(80,220,130,0.4)"
-    auth_bg_from   = "#0a0818"
-    auth_bg_to     = "#130f28"
-    glow1          = "rgba(124,92,252,0.35)"
-    glow2          = "rgba(168,85,247,0.2)"
-    noise_opacity  = "0.03"
-    card_shadow    = "0 32px 80px rgba(0,0,0,0.6), 0 0 0 1px rgba(124,92,252,0.1)"
-    divider_col    = "rgba(124,92,252,0.12)"
-    tab_active_bg  = "rgba(124,92,252,0.15)"
-    input_shadow   = "0 0 0 3px rgba(124,92,252,0.2)"
-    btn_shadow     = "0 8px 32px rgba(124,92,252,0.4)"
-    eyebrow_color  = "#7c5cfc"
-    tag_bg         = "rgba(124,92,252,0.1)"
-else:
-    bg_main        = "#f7f5ff"
-    bg_card        = "#ffffff"
-    bg_card2       = "#f0eeff"
-    bg_sidebar     = "#f2f0ff"
-    text_primary   = "#1a1535"
-    text_sec       = "#5a5478"
-    text_muted     = "#9490b0"
-    border_col     = "rgba(98,64,232,0.1)"
-    border_input   = "rgba(98,64,232,0.2)"
-    input_bg       = "#ffffff"
-    input_text     = "#1a1535"
-    accent         = "#6240e8"
-    accent2        = "#9333ea"
-    accent_light   = "#7c5cf0"
-    accent_soft    = "rgba(98,64,232,0.08)"
-    hero_sub       = "#7a7694"
-    hist_label     = "#c4c0d8"
-    md_p           = "#4a4668"
-    md_h2          = "#2a2448"
-    md_code_bg     = "rgba(98,64,232,0.07)"
-    md_code_c      = "#5a3cc8"
-    md_pre_bg      = "#f5f3ff"
-    alert_bg       = "rgba(98,64,232,0.05)"
-    alert_border   = "rgba(98,64,232,0.15)"
-    alert_text     = "#5a3cc8"
-    mode_icon      = "🌙"
-    mode_label     = "Dark"
-    chip_bg        = "rgba(98,64,232,0.06)"
-    chip_border    = "rgba(98,64,232,0.14)"
-    pipeline_run   = "#6240e8"
-    pipeline_done  = "rgba(40,180,90,0.35)"
-    auth_bg_from   = "#f0eeff"
-    auth_bg_to     = "#e8e4ff"
-    glow1          = "rgba(98,64,232,0.12)"
-    glow2          = "rgba(147,51,234,0.08)"
-    noise_opacity  = "0.02"
-    card_shadow    = "0 24px 64px rgba(98,64,232,0.12), 0 0 0 1px rgba(98,64,232,0.08)"
-    divider_col    = "rgba(98,64,232,0.1)"
-    tab_active_bg  = "rgba(98,64,232,0.08)"
-    input_shadow   = "0 0 0 3px rgba(98,64,232,0.12)"
-    btn_shadow     = "0 8px 28px rgba(98,64,232,0.35)"
-    eyebrow_color  = "#6240e8"
-    tag_bg         = "rgba(98,64,232,0.07)"
-
-# ── Comprehensive CSS ─────────────────────────────────────────────────────────
-st.markdown(f"""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Fraunces:ital,opsz,wght@0,9..144,300;0,9..144,400;0,9..144,500;0,9..144,600;1,9..144,300;1,9..144,400&family=DM+Mono:wght@300;400;500&family=Plus+Jakarta+Sans:wght@300;400;500;600;700&display=swap');
-
-*, *::before, *::after {{ box-sizing: border-box; margin: 0; padding: 0; }}
-
-html, body, [data-testid="stAppViewContainer"] {{
-    background: {bg_main};
-    color: {text_primary};
-    font-family: 'Plus Jakarta Sans', sans-serif;
-    transition: background 0.4s ease, color 0.4s ease;
-}}
-
-[data-testid="stAppViewContainer"] {{
-    background: {bg_main};
-    background-image:
-        radial-gradient(ellipse 90% 50% at 20% -5%, {glow1} 0%, transparent 65%),
-        radial-gradient(ellipse 60% 40% at 85% 90%, {glow2} 0%, transparent 60%),
-        radial-gradient(ellipse 40% 30% at 60% 50%, rgba(124,92,252,0.03) 0%, transparent 70%);
-}}
-
-/* Sidebar */
-[data-testid="stSidebar"] {{
-    background: {bg_sidebar} !important;
-    border-right: 1px solid {border_col} !important;
-    transition: background 0.4s ease;
-}}
-[data-testid="stSidebar"] > div {{ padding: 1.4rem 1rem 2rem; }}
-
-/* Hide Streamlit chrome */
-#MainMenu, footer, header {{ display: none !important; }}
-.block-container {{
-    padding: 2rem 2.5rem 5rem;
-    max-width: 1120px;
-}}
-
-/* ── Typography ── */
-h1, h2, h3 {{
-    font-family: 'Fraunces', serif;
-    letter-spacing: -0.02em;
-}}
-
-/* ═══════════════════════════════════════════
-   AUTH PAGE — Complete redesign
-═══════════════════════════════════════════ */
-
-.auth-page-wrapper {{
-    min-height: 100vh;
-    display: flex;
-    align-items: stretch;
-}}
-
-/* Auth card */
-.auth-card {{
-    width: 100%;
-    max-width: 480px;
-    margin: 3vh auto 0;
-    background: {bg_card};
-    border: 1px solid {border_col};
-    border-radius: 24px;
-    padding: 3rem 3rem 2.5rem;
-    box-shadow: {card_shadow};
-    position: relative;
-    overflow: hidden;
-    transition: background 0.4s;
-}}
-
-.auth-card::before {{
-    content: '';
-    position: absolute;
-    top: 0; left: 0; right: 0;
-    height: 3px;
-    background: linear-gradient(90deg, {accent} 0%, {accent2} 50%, {accent_light} 100%);
-    border-radius: 24px 24px 0 0;
-}}
-
-.auth-card::after {{
-    content: '';
-    position: absolute;
-    top: -80px; right: -80px;
-    width: 200px; height: 200px;
-    border-radius: 50%;
-    background: radial-gradient(circle, {glow1} 0%, transparent 70%);
-    pointer-events: none;
-}}
-
-.auth-badge {{
-    display: inline-flex;
-    align-items: center;
-    gap: 0.4rem;
-    background: {tag_bg};
-    border: 1px solid {border_col};
-    border-radius: 100px;
-    padding: 0.25rem 0.75rem;
-    font-family: 'DM Mono', monospace;
-    font-size: 0.62rem;
-    letter-spacing: 0.14em;
-    text-transform: uppercase;
-    color: {accent_light};
-    margin-bottom: 1.2rem;
-}}
-
-.auth-badge .dot {{
-    width: 5px; height: 5px;
-    border-radius: 50%;
-    background: {accent};
-    box-shadow: 0 0 6px {accent};
-    animation: pulse-dot 2s ease-in-out infinite;
-}}
-
-@keyframes pulse-dot {{
-    0%, 100% {{ opacity: 1; transform: scale(1); }}
-    50% {{ opacity: 0.5; transform: scale(0.7); }}
-}}
-
-.auth-headline {{
-    font-family: 'Fraunces', serif;
-    font-size: 2.6rem;
-    font-weight: 400;
-    line-height: 1.08;
-    color: {text_primary};
-    margin-bottom: 0.5rem;
-    letter-spacing: -0.03em;
-}}
-
-.auth-headline em {{
-    font-style: italic;
-    background: linear-gradient(135deg, {accent} 0%, {accent2} 100%);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    background-clip: text;
-}}
-
-.auth-sub {{
-    font-size: 0.88rem;
-    color: {text_muted};
-    margin-bottom: 2rem;
-    line-height: 1.6;
-    font-weight: 400;
-}}
-
-.auth-divider {{
-    height: 1px;
-    background: linear-gradient(90deg, transparent, {divider_col}, transparent);
-    margin: 1.5rem 0;
-}}
-
-/* Feature tags under auth */
-.auth-features {{
-    display: flex;
-    gap: 0.5rem;
-    flex-wrap: wrap;
-    margin-top: 1.5rem;
-}}
-.auth-feature-tag {{
-    font-family: 'DM Mono', monospace;
-    font-size: 0.6rem;
-    padding: 0.2rem 0.6rem;
-    border-radius: 100px;
-    background: {tag_bg};
-    color: {text_muted};
-    border: 1px solid {border_col};
-    letter-spacing: 0.05em;
-}}
-
-/* ── Tabs (auth) ── */
-[data-testid="stTabs"] [data-baseweb="tab-list"] {{
-    background: {"rgba(255,255,255,0.03)" if dark else "rgba(98,64,232,0.04)"} !important;
-    border-radius: 12px !important;
-    padding: 4px !important;
-    gap: 2px !important;
-    border: 1px solid {border_col} !important;
-    margin-bottom: 1.2rem !important;
-}}
-
-[data-testid="stTabs"] [data-baseweb="tab"] {{
-    font-family: 'Plus Jakarta Sans', sans-serif !important;
-    font-size: 0.82rem !important;
-    font-weight: 500 !important;
-    color: {text_muted} !important;
-    letter-spacing: 0.02em !important;
-    border-radius: 8px !important;
-    padding: 0.5rem 1.2rem !important;
-    transition: all 0.2s !important;
-}}
-
-[data-testid="stTabs"] [aria-selected="true"] {{
-    color: {text_primary} !important;
-    background: {tab_active_bg} !important;
-    font-weight: 600 !important;
-}}
-
-/* ── Inputs (enhanced) ── */
-.stTextInput input, .stTextArea textarea, .stNumberInput input {{
-    background: {"rgba(255,255,255,0.03)" if dark else "#faf9ff"} !important;
-    border: 1.5px solid {border_input} !important;
-    border-radius: 12px !important;
-    color: {input_text} !important;
-    font-family: 'Plus Jakarta Sans', sans-serif !important;
-    font-size: 0.9rem !important;
-    padding: 0.75rem 1rem !important;
-    transition: all 0.25s !important;
-    caret-color: {accent} !important;
-}}
-
-.stTextInput input:focus, .stTextArea textarea:focus {{
-    border-color: {accent} !important;
-    box-shadow: {input_shadow} !important;
-    background: {"rgba(124,92,252,0.04)" if dark else "#fff"} !important;
-    outline: none !important;
-}}
-
-.stTextInput label, .stTextArea label, .stNumberInput label {{
-    color: {text_sec} !important;
-    font-size: 0.72rem !important;
-    font-family: 'DM Mono', monospace !important;
-    letter-spacing: 0.09em !important;
-    text-transform: uppercase !important;
-    font-weight: 500 !important;
-    margin-bottom: 0.3rem !important;
-}}
-
-/* ── Buttons (primary) ── */
-.stButton > button {{
-    background: linear-gradient(135deg, {accent} 0%, {accent2} 100%) !important;
-    border: none !important;
-    border-radius: 12px !important;
-    color: #ffffff !important;
-    font-family: 'Plus Jakarta Sans', sans-serif !important;
-    font-weight: 600 !important;
-    font-size: 0.9rem !important;
-    padding: 0.7rem 1.8rem !important;
-    cursor: pointer !important;
-    transition: all 0.25s ease !important;
-    box-shadow: {btn_shadow} !important;
-    letter-spacing: 0.01em !important;
-    position: relative !important;
-    overflow: hidden !important;
-}}
-
-.stButton > button::after {{
-    content: '' !important;
-    position: absolute !important;
-    inset: 0 !important;
-    background: linear-gradient(135deg, rgba(255,255,255,0.15) 0%, transparent 60%) !important;
-    pointer-events: none !important;
-}}
-
-.stButton > button:hover {{
-    transform: translateY(-2px) !important;
-    box-shadow: 0 12px 40px rgba(124,92,252,0.5) !important;
-    filter: brightness(1.05) !important;
-}}
-
-.stButton > button:active {{
-    transform: translateY(0) !important;
-    box-shadow: 0 4px 16px rgba(124,92,252,0.3) !important;
-}}
-
-/* Ghost / secondary buttons */
-.stButton > button[kind="secondary"] {{
-    background: {"rgba(255,255,255,0.04)" if dark else "rgba(255,255,255,0.9)"} !important;
-    border: 1.5px solid {border_col} !important;
-    color: {text_sec} !important;
-    box-shadow: none !important;
-    font-weight: 500 !important;
-}}
-
-.stButton > button[kind="secondary"]:hover {{
-    background: {chip_bg} !important;
-    border-color: {accent} !important;
-    color: {accent_light} !important;
-}}
-
-/* Download button */
-.stDownloadButton > button {{
-    background: {"rgba(255,255,255,0.04)" if dark else "rgba(98,64,232,0.04)"} !important;
-    border: 1.5px solid {chip_border} !important;
-    border-radius: 10px !important;
-    color: {accent_light} !important;
-    font-family: 'DM Mono', monospace !important;
-    font-size: 0.75rem !important;
-    padding: 0.5rem 1.2rem !important;
-    letter-spacing: 0.04em !important;
-    transition: all 0.2s !important;
-    box-shadow: none !important;
-}}
-
-.stDownloadButton > button:hover {{
-    background: {accent_soft} !important;
-    border-color: {accent} !important;
-    transform: translateY(-1px) !important;
-}}
-
-/* ══════════════════════════════════════════
-   HERO SECTION
-══════════════════════════════════════════ */
-.hero {{
-    padding: 3.5rem 0 2.5rem;
-    border-bottom: 1px solid {border_col};
-    margin-bottom: 2.5rem;
-    position: relative;
-}}
-
-.hero-eyebrow {{
-    display: inline-flex;
-    align-items: center;
-    gap: 0.45rem;
-    font-family: 'DM Mono', monospace;
-    font-size: 0.65rem;
-    letter-spacing: 0.2em;
-    text-transform: uppercase;
-    color: {eyebrow_color};
-    margin-bottom: 1rem;
-    padding: 0.25rem 0.75rem;
-    background: {tag_bg};
-    border-radius: 100px;
-    border: 1px solid {border_col};
-}}
-
-.hero-title {{
-    font-family: 'Fraunces', serif;
-    font-size: clamp(2.6rem, 5.5vw, 4rem);
-    font-weight: 400;
-    line-height: 1.08;
-    color: {text_primary};
-    margin: 0 0 0.75rem;
-    letter-spacing: -0.03em;
-}}
-
-.hero-title em {{
-    font-style: italic;
-    background: linear-gradient(135deg, {accent} 0%, {accent2} 100%);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    background-clip: text;
-}}
-
-.hero-sub {{
-    font-size: 0.95rem;
-    color: {hero_sub};
-    font-weight: 400;
-    line-height: 1.6;
-    max-width: 520px;
-}}
-
-/* ══════════════════════════════════════════
-   PIPELINE CARDS
-══════════════════════════════════════════ */
-.pipeline-card {{
-    background: {bg_card};
-    border: 1px solid {border_col};
-    border-radius: 14px;
-    padding: 1rem 1.4rem;
-    margin-bottom: 0.65rem;
-    display: flex;
-    align-items: center;
-    gap: 1rem;
-    transition: border-color 0.3s, background 0.3s, box-shadow 0.3s;
-}}
-
-.pipeline-card.active {{
-    border-color: {accent};
-    box-shadow: 0 0 0 1px {accent_soft}, 0 8px 24px {accent_soft};
-    background: {"rgba(124,92,252,0.04)" if dark else "rgba(98,64,232,0.03)"};
-}}
-
-.pipeline-card.done {{
-    border-color: {"rgba(80,220,130,0.3)" if dark else "rgba(40,180,90,0.25)"};
-    background: {"rgba(80,220,130,0.03)" if dark else "rgba(40,180,90,0.02)"};
-}}
-
-.pipeline-icon {{ font-size: 1.15rem; flex-shrink: 0; }}
-.pipeline-label {{
-    font-family: 'DM Mono', monospace;
-    font-size: 0.68rem;
-    color: {text_muted};
-    letter-spacing: 0.08em;
-    text-transform: uppercase;
-    margin-bottom: 0.1rem;
-}}
-.pipeline-value {{ font-size: 0.85rem; color: {text_sec}; }}
-
-.badge {{
-    margin-left: auto;
-    font-family: 'DM Mono', monospace;
-    font-size: 0.62rem;
-    padding: 0.2rem 0.6rem;
-    border-radius: 100px;
-    letter-spacing: 0.06em;
-    font-weight: 500;
-}}
-.badge-pending {{ background: {"rgba(255,255,255,0.05)" if dark else "rgba(0,0,0,0.05)"}; color: {text_muted}; }}
-.badge-running {{
-    background: rgba(124,92,252,0.2);
-    color: {accent_light};
-    animation: badge-pulse 1.5s ease-in-out infinite;
-}}
-@keyframes badge-pulse {{
-    0%, 100% {{ opacity: 1; }}
-    50% {{ opacity: 0.6; }}
-}}
-.badge-done    {{ background: {"rgba(80,220,130,0.15)" if dark else "rgba(40,180,90,0.12)"}; color: {"#60d890" if dark else "#28b45a"}; }}
-.badge-skipped {{ background: {"rgba(255,180,50,0.1)" if dark else "rgba(220,140,20,0.1)"}; color: {"#e0a040" if dark else "#c07820"}; }}
-
-/* ══════════════════════════════════════════
-   OUTPUT / MARKDOWN AREA
-══════════════════════════════════════════ */
-.output-header {{
-    display: flex;
-    align-items: baseline;
-    gap: 1rem;
-    margin-bottom: 1.4rem;
-    flex-wrap: wrap;
-}}
-.output-title {{
-    font-family: 'Fraunces', serif;
-    font-size: 1.7rem;
-    color: {text_primary};
-    font-weight: 400;
-    letter-spacing: -0.02em;
-}}
-.output-meta {{
-    font-family: 'DM Mono', monospace;
-    font-size: 0.65rem;
-    color: {text_muted};
-    letter-spacing: 0.08em;
-}}
-
-.markdown-container {{
-    background: {bg_card};
-    border: 1px solid {border_col};
-    border-radius: 16px;
-    padding: 2.2rem;
-    line-height: 1.8;
-    transition: background 0.4s ease;
-}}
-.markdown-container h1 {{
-    font-family: 'Fraunces', serif;
-    font-size: 2rem;
-    color: {text_primary};
-    margin-bottom: 1.5rem;
-    font-weight: 400;
-    letter-spacing: -0.025em;
-}}
-.markdown-container h2 {{
-    font-family: 'Fraunces', serif;
-    font-size: 1.3rem;
-    color: {md_h2};
-    border-bottom: 1px solid {border_col};
-    padding-bottom: 0.4rem;
-    margin-top: 2.2rem;
-    margin-bottom: 0.8rem;
-    font-weight: 400;
-}}
-.markdown-container p  {{ color: {md_p}; margin-bottom: 1rem; font-size: 0.95rem; }}
-.markdown-container code {{
-    background: {md_code_bg};
-    border-radius: 5px;
-    padding: 0.12em 0.45em;
-    font-family: 'DM Mono', monospace;
-    font-size: 0.83em;
-    color: {md_code_c};
-}}
-.markdown-container pre {{
-    background: {md_pre_bg};
-    border: 1px solid {border_col};
-    border-radius: 10px;
-    padding: 1.4rem;
-    overflow-x: auto;
-    margin: 1rem 0;
-}}
-.markdown-container pre code {{ background: transparent; color: {md_code_c}; }}
-.markdown-container ul, .markdown-container ol {{
-    color: {md_p};
-    padding-left: 1.6rem;
-    margin-bottom: 1rem;
-}}
-.markdown-container li {{ margin-bottom: 0.35rem; font-size: 0.95rem; }}
-.markdown-container a {{
-    color: {accent};
-    text-decoration: none;
-    border-bottom: 1px solid {accent_soft};
-    transition: border-color 0.2s;
-}}
-.markdown-container a:hover {{ border-color: {accent}; }}
-
-/* ══════════════════════════════════════════
-   SIDEBAR — USER CHIP
-══════════════════════════════════════════ */
-.user-chip {{
-    display: flex;
-    align-items: center;
-    gap: 0.7rem;
-    background: {chip_bg};
-    border: 1px solid {chip_border};
-    border-radius: 14px;
-    padding: 0.7rem 0.95rem;
-    margin-bottom: 0.75rem;
-    transition: background 0.4s;
-}}
-.user-avatar {{
-    width: 34px; height: 34px; border-radius: 50%;
-    background: linear-gradient(135deg, {accent} 0%, {accent2} 100%);
-    display: flex; align-items: center; justify-content: center;
-    font-size: 0.7rem; font-weight: 700; color: #fff;
-    flex-shrink: 0;
-    box-shadow: 0 4px 12px {accent_soft};
-}}
-.user-name  {{
-    font-size: 0.85rem;
-    color: {text_primary};
-    font-weight: 600;
-    line-height: 1.25;
-    font-family: 'Plus Jakarta Sans', sans-serif;
-}}
-.user-email {{
-    font-family: 'DM Mono', monospace;
-    font-size: 0.58rem;
-    color: {text_muted};
-    margin-top: 0.05rem;
-}}
-
-/* ══════════════════════════════════════════
-   SIDEBAR HISTORY CARDS
-══════════════════════════════════════════ */
-.hist-section-label {{
-    font-family: 'DM Mono', monospace;
-    font-size: 0.6rem;
-    letter-spacing: 0.16em;
-    text-transform: uppercase;
-    color: {hist_label};
-    margin-bottom: 0.7rem;
-    padding: 0 0.1rem;
-}}
-
-.hist-card {{
-    background: {bg_card};
-    border: 1px solid {border_col};
-    border-radius: 12px;
-    padding: 0.75rem 0.9rem 0.6rem;
-    margin-bottom: 0.5rem;
-    transition: border-color 0.2s, background 0.2s;
-}}
-
-.hist-card.active {{
-    border-color: {accent};
-    background: {"rgba(124,92,252,0.05)" if dark else "rgba(98,64,232,0.04)"};
-    box-shadow: 0 0 0 1px {accent_soft};
-}}
-
-/* ══════════════════════════════════════════
-   SETTINGS SECTION LABEL
-══════════════════════════════════════════ */
-.settings-label {{
-    font-family: 'DM Mono', monospace;
-    font-size: 0.6rem;
-    letter-spacing: 0.16em;
-    text-transform: uppercase;
-    color: {hist_label};
-    margin-bottom: 0.5rem;
-    padding: 0 0.1rem;
-}}
-
-/* Expanders */
-[data-testid="stExpander"] {{
-    background: {"rgba(255,255,255,0.02)" if dark else "rgba(98,64,232,0.02)"} !important;
-    border: 1px solid {border_col} !important;
-    border-radius: 12px !important;
-    margin-bottom: 0.5rem !important;
-    transition: background 0.3s !important;
-}}
-
-[data-testid="stExpander"]:hover {{
-    border-color: {chip_border} !important;
-}}
-
-[data-testid="stExpander"] summary {{
-    font-family: 'Plus Jakarta Sans', sans-serif !important;
-    font-size: 0.82rem !important;
-    font-weight: 500 !important;
-    color: {text_sec} !important;
-    padding: 0.6rem 0.9rem !important;
-}}
-
-/* Alerts */
-[data-testid="stAlert"] {{
-    background: {alert_bg} !important;
-    border: 1px solid {alert_border} !important;
-    border-radius: 12px !important;
-    color: {alert_text} !important;
-    font-family: 'Plus Jakarta Sans', sans-serif !important;
-    font-size: 0.88rem !important;
-}}
-
-/* HR */
-hr {{
-    border: none !important;
-    border-top: 1px solid {divider_col} !important;
-    margin: 1rem 0 !important;
-}}
-
-/* Spinner */
-[data-testid="stSpinner"] > div > div {{
-    border-top-color: {accent} !important;
-}}
-
-/* Radio */
-[data-testid="stRadio"] label {{
-    font-size: 0.88rem !important;
-    color: {text_sec} !important;
-    font-family: 'Plus Jakarta Sans', sans-serif !important;
-}}
-
-/* Sliders */
-[data-testid="stSlider"] [data-baseweb="slider"] [data-testid*="StyledThumb"] {{
-    background: {accent} !important;
-    border-color: {accent} !important;
-}}
-
-/* Select slider */
-[data-testid="stSlider"] [data-baseweb="slider"] [data-testid*="StyledTrackHighlight"] {{
-    background: linear-gradient(90deg, {accent}, {accent2}) !important;
-}}
-
-/* Sidebar toggle button */
-.sidebar-toggle {{
-    position: fixed;
-    top: 50%; left: 0;
-    transform: translateY(-50%);
-    z-index: 9999;
-    background: linear-gradient(135deg, {accent}, {accent2});
-    color: white;
-    border: none;
-    border-radius: 0 10px 10px 0;
-    width: 22px; height: 60px;
-    cursor: pointer;
-    display: flex;
-    align-items: center;
-    justify-content: center;
-    font-size: 0.65rem;
-    transition: all 0.2s;
-    box-shadow: 3px 0 16px {glow1};
-}}
-
-/* Mode pill */
-.mode-closed_book {{ background: rgba(80,200,255,0.1); color: {"#60c8f8" if dark else "#0890c8"}; }}
-.mode-hybrid      {{ background: rgba(255,180,50,0.1);  color: {"#e0a040" if dark else "#c07820"}; }}
-.mode-open_book   {{ background: rgba(80,220,130,0.1);  color: {"#60d890" if dark else "#28b45a"}; }}
-</style>
-""", unsafe_allow_html=True)
+# ── Theme (palette + stylesheet are built once per theme, see ace_theme.py) ───
+theme        = ace_theme.palette(dark)
+accent       = theme.accent
+accent2      = theme.accent2
+accent_light = theme.accent_light
+text_muted   = theme.text_muted
+mode_icon    = theme.mode_icon
+mode_label   = theme.mode_label
+
+# The stylesheet (~16 KB) goes out only on a session's or theme's first runs: inline for
+# the first paint, and into the page <head>, where it outlives the reruns that don't send it.
+# The empty slot keeps later elements at the same positions either way.
+_css_sent = st.session_state.get("theme_css_sent")          # (dark, runs sent on)
+_css_runs = _css_sent[1] if _css_sent and _css_sent[0] == dark else 0
+_css_slot = st.empty()
+if _css_runs < ace_theme.THEME_SEND_RUNS:
+    with _css_slot.container():
+        st.markdown(ace_theme.theme_css(dark), unsafe_allow_html=True)
+        st.components.v1.html(ace_theme.theme_head_js(dark), height=0)
+    st.session_state.theme_css_sent = (dark, _css_runs + 1)
 
 # ── MongoDB ───────────────────────────────────────────────────────────────────
-load_dotenv()
+# .env is loaded by ace_config (imported via ace_auth).
 
 @st.cache_resource
 def get_db():
@@ -784,51 +75,101 @@ def get_db():
     client = MongoClient(uri, serverSelectionTimeoutMS=6000)
     db = client["content_engine"]
     db["users"].create_index("email", unique=True)
-    db["blogs"].create_index("user_id")
+    ace_store.ensure_indexes(db)
+    ace_jobs.ensure_indexes(db)
+    ace_quota.ensure_indexes(db)
     db["sessions"].create_index("token", unique=True)
     db["sessions"].create_index("expires_at", expireAfterSeconds=0)
     return db
 
 db = get_db()
+ace_images.set_store(db)     # images from queue workers live in MongoDB, not on this host
 
-# ── Auth helpers ──────────────────────────────────────────────────────────────
-def hash_pw(pw: str) -> str:
-    return bcrypt.hashpw(pw.encode(), bcrypt.gensalt()).decode()
+@st.cache_resource
+def get_writer():
+    # One write-behind queue per server process; journaled locally, flushed at interpreter exit.
+    return ace_writeback.WriteBehind(db)
 
-def check_pw(pw: str, hashed: str) -> bool:
-    return bcrypt.checkpw(pw.encode(), hashed.encode())
+writer = get_writer()
 
-def create_session(user_id: str) -> str:
-    token = secrets.token_urlsafe(32)
-    db["sessions"].insert_one({
-        "token": token,
-        "user_id": user_id,
-        "created_at": datetime.now(timezone.utc),
-        "expires_at": datetime.now(timezone.utc) + timedelta(days=30),
-    })
-    return token
+@st.cache_resource
+def get_evidence_store():
+    # Research evidence shared by every run and user (ace_evidence_store.py).
+    store = ace_evidence_store.EvidenceStore(db)
+    store.ensure_indexes()
+    return store
+
+evidence_store = get_evidence_store()
+
+@st.cache_resource
+def start_metrics() -> bool:
+    # Prometheus /metrics for this server process when ACE_METRICS_PORT is set (ace_metrics.py).
+    return ace_metrics.serve()
+
+start_metrics()
+
+# ── LLM backend (imported once per process, warmed in the background) ────────
+@st.cache_resource
+def _backend_warmup() -> threading.Thread:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    t = threading.Thread(target=_import_backend, name="ace-warmup", daemon=True)
+    t.start()
+    return t
+
+def _import_backend():
+    try:
+        importlib.import_module("ACE_backend")
+    except Exception:
+        pass            # load_backend() imports again and reports the error
+
+def warm_backend():
+    """Start importing ACE_backend (langgraph, langchain, Gemini client) off the request path."""
+    _backend_warmup()
+
+def load_backend():
+    # The backend reads its settings from os.environ per call, so one import serves every run.
+    _backend_warmup().join()
+    backend = importlib.import_module("ACE_backend")
+    backend.EVIDENCE_STORE = evidence_store
+    return backend
+
+def _metered_stream(engine_stream, run_input, charge):
+    # Runs on the flight's thread; the run counts as active (ace_metrics) until the stream ends.
+    # `charge(llm_calls)` bills the payer here rather than on the page: the flight outlives a
+    # rerun or closed tab, which stops the page script before it could charge.
+    calls = []
+    with ace_metrics.run():
+        try:
+            for event in engine_stream(run_input, on_late=charge):
+                for update in event.values():
+                    if isinstance(update, dict):
+                        calls.extend(update.get("llm_calls", []))
+                yield event
+        finally:
+            charge(calls)
+
+# ── Auth helpers ──────────────────────────────────────────────────────────────
+def create_session(user: dict) -> str:
+    return ace_auth.create_session(db, user, writer=writer)
 
 def get_user_from_token(token: str):
-    if not token:
-        return None
-    session = db["sessions"].find_one({"token": token, "expires_at": {"$gt": datetime.now(timezone.utc)}})
-    if not session:
-        return None
-    user = db["users"].find_one({"_id": ObjectId(session["user_id"])})
-    return user
+    return ace_auth.get_user_from_token(db, token)
 
 def delete_session(token: str):
-    if token:
-        db["sessions"].delete_one({"token": token})
+    ace_auth.delete_session(db, token, writer=writer)
 
 def do_signup(name, email, pw):
     email = email.strip().lower()
     if db["users"].find_one({"email": email}):
         return None, "Email already registered."
+    try:
+        pw_hash = ace_auth.hash_pw(pw)
+    except ace_auth.AuthBusy as e:
+        return None, str(e)
     doc = {
         "name": name.strip(),
         "email": email,
-        "password_hash": hash_pw(pw),
+        "password_hash": pw_hash,
         "created_at": datetime.now(timezone.utc),
     }
     res = db["users"].insert_one(doc)
@@ -838,26 +179,36 @@ def do_signup(name, email, pw):
 def do_login(email, pw):
     email = email.strip().lower()
     user = db["users"].find_one({"email": email})
-    if not user:
-        return None, "No account found with that email."
-    if not check_pw(pw, user["password_hash"]):
-        return None, "Incorrect password."
+    try:
+        # Same message and roughly the same latency whether or not the email exists.
+        if not user:
+            ace_auth.reject_unknown_email()
+            return None, "Incorrect email or password."
+        if not ace_auth.check_pw(pw, user["password_hash"]):
+            return None, "Incorrect email or password."
+    except ace_auth.AuthBusy as e:
+        return None, str(e)
     return user, None
 
-# ── Blog DB helpers ───────────────────────────────────────────────────────────
-def save_blog(user_id: str, entry: dict):
-    doc = {**entry, "user_id": user_id, "saved_at": datetime.now(timezone.utc)}
-    db["blogs"].insert_one(doc)
+# ── Blog DB helpers (see ace_store.py) ────────────────────────────────────────
+def save_blog(user_id: str, entry: dict) -> dict:
+    return ace_store.save_blog(db, user_id, entry, writer=writer)
 
-def load_blogs(user_id: str) -> list:
-    out = []
-    for b in db["blogs"].find({"user_id": user_id}).sort("saved_at", -1).limit(50):
-        b["_id"] = str(b["_id"])
-        out.append(b)
-    return out
+def load_blogs(user_id: str, before=None) -> list:
+    return ace_store.load_blogs(db, user_id, before=before)
 
-def delete_blog(blog_id: str):
-    db["blogs"].delete_one({"_id": ObjectId(blog_id)})
+def search_blogs(user_id: str, query: str, after: dict = None) -> list:
+    return ace_store.search_blogs(db, user_id, query, after=after)
+
+def load_blog(user_id: str, blog_id: str):
+    doc = ace_store.load_blog(db, user_id, blog_id)
+    if doc is None and writer.flush():
+        # Opened before its queued insert landed — retry once after flushing.
+        doc = ace_store.load_blog(db, user_id, blog_id)
+    return doc
+
+def delete_blog(user_id: str, blog_id: str):
+    ace_store.delete_blog(db, user_id, blog_id, writer=writer)
 
 # ── User settings DB helpers ──────────────────────────────────────────────────
 DEFAULT_SETTINGS = {
@@ -869,6 +220,8 @@ DEFAULT_SETTINGS = {
     "depth_level":       "Balanced",
     "tone":              "Educational",
     "extra_instruction": "",
+    "time_budget":       0,
+    "images":            False,
 }
 
 def load_settings(user_id: str) -> dict:
@@ -878,7 +231,8 @@ def load_settings(user_id: str) -> dict:
     return {k: doc.get(k, v) for k, v in DEFAULT_SETTINGS.items()}
 
 def save_settings(user_id: str, cfg: dict):
-    db["user_settings"].update_one(
+    writer.update(
+        "user_settings",
         {"user_id": user_id},
         {"$set": {**cfg, "user_id": user_id, "updated_at": datetime.now(timezone.utc)}},
         upsert=True,
@@ -890,7 +244,14 @@ _defaults = {
     "session_token":  None,
     "history":        [],
     "history_loaded": False,
+    "history_more":   False,
+    "history_page":   0,
+    "search_query":   "",
+    "search_results": [],
+    "search_more":    False,
     "viewing_id":     None,
+    "viewing_doc":    None,
+    "open_sections":  {},       # content hash -> indices of expanded sections (long docs)
     "current_result": None,
     "settings":       None,
     "settings_open":  False,
@@ -900,6 +261,10 @@ for k, v in _defaults.items():
     if k not in st.session_state:
         st.session_state[k] = v
 
+# Sidebar shows one fixed-size window of history at a time, so the widget count
+# per rerun stays constant however many guides a user has.
+HISTORY_WINDOW = 12
+
 # ── Auto-login from token in query params ─────────────────────────────────────
 if st.session_state.user is None:
     token_from_url = st.query_params.get("_token", "")
@@ -920,25 +285,7 @@ if st.session_state.user is None:
 # ══════════════════════════════════════════════════════════════════════════════
 if st.session_state.user is None:
     # JS: read localStorage token and redirect
-    st.components.v1.html("""
-    <script>
-    (function() {
-        if (sessionStorage.getItem('ce_redirect_tried')) return;
-        sessionStorage.setItem('ce_redirect_tried', '1');
-        const token = localStorage.getItem('content_engine_token');
-        if (!token) return;
-        try {
-            const parentParams = new URLSearchParams(window.parent.location.search);
-            if (!parentParams.has('_token')) {
-                parentParams.set('_token', token);
-                window.parent.location.replace(
-                    window.parent.location.pathname + '?' + parentParams.toString()
-                );
-            }
-        } catch(e) { console.warn('CE: could not access parent location', e); }
-    })();
-    </script>
-    """, height=0)
+    st.components.v1.html(ace_theme.AUTH_REDIRECT_JS, height=0)
 
     # Theme toggle — top right
     _, col_theme = st.columns([5, 1])
@@ -948,20 +295,7 @@ if st.session_state.user is None:
             st.rerun()
 
     # ── Auth card markup ──────────────────────────────────────────────────────
-    st.markdown(f"""
-    <div class="auth-card">
-        <div class="auth-badge">
-            <span class="dot"></span>
-            Study &amp; Content Engine
-        </div>
-        <h1 class="auth-headline">Learn deeper.<br><em>Study smarter.</em></h1>
-        <p class="auth-sub">
-            Generate detailed study guides, deep-dive research, and structured content 
-            — from any subject, instantly.
-        </p>
-        <div class="auth-divider"></div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(ace_theme.AUTH_CARD_HTML, unsafe_allow_html=True)
 
     # Streamlit inputs rendered inside the card visually via CSS proximity
     tab_in, tab_up = st.tabs(["✦  Sign In", "Create Account"])
@@ -977,7 +311,7 @@ if st.session_state.user is None:
                 if err:
                     st.error(err)
                 else:
-                    token = create_session(str(u["_id"]))
+                    token = create_session(u)
                     st.session_state.user = {"id": str(u["_id"]), "name": u["name"], "email": u["email"]}
                     st.session_state.session_token = token
                     st.session_state.history_loaded = False
@@ -1005,7 +339,7 @@ if st.session_state.user is None:
                 if err:
                     st.error(err)
                 else:
-                    token = create_session(str(u["_id"]))
+                    token = create_session(u)
                     st.session_state.user = {"id": str(u["_id"]), "name": u["name"], "email": u["email"]}
                     st.session_state.session_token = token
                     st.session_state.history_loaded = False
@@ -1017,15 +351,7 @@ if st.session_state.user is None:
                     st.rerun()
 
     # Feature tags at the bottom
-    st.markdown(f"""
-    <div class="auth-features">
-        <span class="auth-feature-tag">✦ AI-Powered Research</span>
-        <span class="auth-feature-tag">📖 Study Guides</span>
-        <span class="auth-feature-tag">🔬 Deep Analysis</span>
-        <span class="auth-feature-tag">💾 Cloud Saved</span>
-        <span class="auth-feature-tag">⚡ Instant Generate</span>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(ace_theme.AUTH_FEATURES_HTML, unsafe_allow_html=True)
 
     st.stop()
 
@@ -1048,86 +374,24 @@ if token:
 
 if not st.session_state.history_loaded:
     st.session_state.history = load_blogs(user["id"])
+    st.session_state.history_more = len(st.session_state.history) == ace_store.HISTORY_PAGE_SIZE
+    st.session_state.history_page = 0
     st.session_state.history_loaded = True
 
 history = st.session_state.history
 
-# Sidebar knob: simple, robust implementation.
-# Shows a hamburger button when sidebar is collapsed. Polls every 300ms — lightweight.
-def _build_sidebar_js(accent_color, accent2_color):
-    return (
-        "<script>(function(){"
-        "var p=window.parent,pd=p.document;"
-        "var KNOB='ce-sidebar-knob';"
-
-        # ---- create knob once ----
-        "if(!pd.getElementById(KNOB)){"
-        "var b=pd.createElement('button');"
-        "b.id=KNOB;"
-        "b.innerHTML='&#9776;';"
-        "b.title='Open sidebar';"
-        "b.style.cssText='"
-        "position:fixed;top:50%;left:0;transform:translateY(-50%);"
-        "z-index:2147483647;"
-        "background:linear-gradient(135deg," + accent_color + "," + accent2_color + ");"
-        "color:#fff;border:none;border-radius:0 10px 10px 0;"
-        "width:26px;height:60px;cursor:pointer;"
-        "display:none;align-items:center;justify-content:center;"
-        "font-size:1rem;padding:0;line-height:1;"
-        "box-shadow:3px 0 16px rgba(124,92,252,.45);"
-        "transition:width .15s;"
-        "';"
-        "b.onmouseenter=function(){b.style.width='34px';};"
-        "b.onmouseleave=function(){b.style.width='26px';};"
-        "pd.body.appendChild(b);}"
-
-        # ---- always update gradient (theme may have changed) ----
-        "var knob=pd.getElementById(KNOB);"
-        "knob.style.background='linear-gradient(135deg," + accent_color + "," + accent2_color + ")';"
-
-        # ---- click: find & click Streamlit's own toggle ----
-        "knob.onclick=function(){"
-        "var found=false;"
-        "var tries=["
-        "'button[data-testid=\"collapsedControl\"]',"
-        "'[data-testid=\"stSidebarCollapsedControl\"] button',"
-        "'button[aria-label=\"open sidebar\"]',"
-        "'button[aria-label=\"Open sidebar\"]',"
-        "'button[aria-label=\"close sidebar\"]',"
-        "'button[aria-label=\"Close sidebar\"]'"
-        "];"
-        "for(var i=0;i<tries.length;i++){"
-        "var el=pd.querySelector(tries[i]);"
-        "if(el){el.click();found=true;break;}}"
-        # fallback: find button adjacent to sidebar in DOM
-        "if(!found){"
-        "var sb=pd.querySelector('[data-testid=\"stSidebar\"]');"
-        "if(sb&&sb.nextElementSibling){"
-        "var fbtn=sb.nextElementSibling.querySelector('button');"
-        "if(fbtn)fbtn.click();}}"
-        "};"
-
-        # ---- poll every 300ms to show/hide knob ----
-        # clear old interval stored on window.parent
-        "if(p.__ce_iv__)clearInterval(p.__ce_iv__);"
-        "p.__ce_iv__=setInterval(function(){"
-        "var sb=pd.querySelector('[data-testid=\"stSidebar\"]');"
-        "if(!sb)return;"
-        "var w=sb.getBoundingClientRect().width;"
-        "knob.style.display=w<50?'flex':'none';"
-        "},300);"
-
-        # ---- run once immediately ----
-        "(function(){"
-        "var sb=pd.querySelector('[data-testid=\"stSidebar\"]');"
-        "if(!sb)return;"
-        "knob.style.display=sb.getBoundingClientRect().width<50?'flex':'none';"
-        "})();"
-
-        "})();</script>"
+# Queued writes that could not be saved even after retrying (ace_writeback dead letters).
+_WRITE_LABELS = {"blogs": "a saved document", "blog_bodies": "a document body",
+                 "blog_search": "a document's search entry",
+                 "user_settings": "your settings", "sessions": "a sign-in session"}
+for _failed in writer.take_failures(user["id"]):
+    st.error(
+        f"Could not save {_WRITE_LABELS.get(_failed['coll'], _failed['coll'])} "
+        f"({_failed['kind']}, {_failed['at']:%H:%M:%S} UTC): the database rejected it or stayed "
+        "unreachable. Please try again."
     )
 
-st.components.v1.html(_build_sidebar_js(accent, accent2), height=0)
+st.components.v1.html(ace_theme.sidebar_js(dark), height=0)
 if st.session_state.settings is None:
     st.session_state.settings = load_settings(user["id"])
 
@@ -1269,6 +533,25 @@ with st.sidebar:
             f'<div style="font-size:0.72rem;color:{text_muted};">{depth_desc[new_depth]}</div>',
             unsafe_allow_html=True,
         )
+        budget_labels = {0: "No limit", 60: "1 min", 120: "2 min", 300: "5 min"}
+        new_time_budget = st.select_slider(
+            "Time Budget",
+            options=list(budget_labels),
+            value=int(cfg.get("time_budget", 0)) if int(cfg.get("time_budget", 0)) in budget_labels else 0,
+            format_func=budget_labels.get,
+            key="s_time_budget",
+        )
+        st.markdown(
+            f'<div style="font-size:0.72rem;color:{text_muted};">'
+            f'⏱ Research, section count and length are trimmed to finish in time</div>',
+            unsafe_allow_html=True,
+        )
+        new_images = st.toggle(
+            "Generate diagrams",
+            value=bool(cfg.get("images", False)),
+            key="s_images",
+            help="Up to 2 images, generated while sections are written. Text appears first.",
+        )
 
     with st.expander("🎨 Tone & Style", expanded=False):
         new_tone = st.radio(
@@ -1319,6 +602,8 @@ with st.sidebar:
             "depth_level":       new_depth,
             "tone":              new_tone,
             "extra_instruction": new_extra.strip(),
+            "time_budget":       new_time_budget,
+            "images":            new_images,
         }
         save_settings(user["id"], updated)
         st.session_state.settings = updated
@@ -1328,19 +613,40 @@ with st.sidebar:
     st.markdown("---")
 
     # ── History ───────────────────────────────────────────────────────────────
+    query = st.text_input(
+        "Search history",
+        key="hist_search",
+        placeholder="🔎 Search titles, topics, text…",
+        label_visibility="collapsed",
+    ).strip()
+    if query != st.session_state.search_query:
+        st.session_state.search_query = query
+        st.session_state.search_results = search_blogs(user["id"], query) if query else []
+        st.session_state.search_more = len(st.session_state.search_results) == ace_store.HISTORY_PAGE_SIZE
+        st.session_state.history_page = 0
+
+    searching = bool(query)
+    listing   = st.session_state.search_results if searching else history
+    more      = st.session_state.search_more if searching else st.session_state.history_more
+
     st.markdown(
-        f'<div class="hist-section-label">Study History ({len(history)})</div>',
+        f'<div class="hist-section-label">{"Search Results" if searching else "Study History"} '
+        f'({len(listing)}{"+" if more else ""})</div>',
         unsafe_allow_html=True,
     )
 
-    if not history:
+    if not listing:
+        empty_msg = "No matches in your history." if searching else "No guides yet — generate your first!"
         st.markdown(
             f'<div style="font-family:\'DM Mono\',monospace;font-size:0.72rem;'
-            f'color:{text_muted};padding:0.4rem 0.1rem;">No guides yet — generate your first!</div>',
+            f'color:{text_muted};padding:0.4rem 0.1rem;">{empty_msg}</div>',
             unsafe_allow_html=True,
         )
     else:
-        for entry in history:
+        last_page = max(0, (len(listing) - 1) // HISTORY_WINDOW)
+        page      = min(st.session_state.history_page, last_page)
+        start     = page * HISTORY_WINDOW
+        for entry in listing[start:start + HISTORY_WINDOW]:
             title   = entry.get("blog_title", "Untitled")
             ts      = entry.get("created_at", "")
             bid     = entry["_id"]
@@ -1378,44 +684,51 @@ with st.sidebar:
                 col_yes, col_no = st.columns(2)
                 with col_yes:
                     if st.button("✓ Yes", key=f"yes_{bid}", use_container_width=True):
-                        delete_blog(bid)
+                        delete_blog(user["id"], bid)
                         st.session_state.history = [h for h in history if h["_id"] != bid]
+                        st.session_state.search_results = [
+                            h for h in st.session_state.search_results if h["_id"] != bid
+                        ]
                         st.session_state.confirm_delete = None
                         if st.session_state.viewing_id == bid:
                             st.session_state.viewing_id = None
+                            st.session_state.viewing_doc = None
                         st.rerun()
                 with col_no:
                     if st.button("✗ No", key=f"no_{bid}", use_container_width=True):
                         st.session_state.confirm_delete = None
                         st.rerun()
 
-            # Type pill colors
-            type_color = {
-                "Study Guide":   ("#1a1035", "#b89cfa") if dark else ("#ede8ff", "#6240e8"),
-                "Blog Post":     ("#0d1f12", "#60d890") if dark else ("#e6fff0", "#28a85a"),
-                "Deep Research": ("#1a1210", "#f0a060") if dark else ("#fff3e6", "#c07020"),
-                "Quick Summary": ("#0d1828", "#60c8f8") if dark else ("#e6f4ff", "#0878c8"),
-            }.get(otype, ("#1a1a2e", "#9a96c0") if dark else ("#f0eeff", "#6240e8"))
-
-            pill_html = f'<span style="background:{type_color[0]};color:{type_color[1]};font-family:\'DM Mono\',monospace;font-size:0.55rem;padding:0.12rem 0.5rem;border-radius:100px;font-weight:500;">{otype}</span>' if otype else ""
-            size_html = f'<span style="color:{text_muted};font-size:0.58rem;font-family:\'DM Mono\',monospace;">{size_info}</span>' if size_info else ""
-
             st.markdown(
-                f'<div style="font-family:\'DM Mono\',monospace;font-size:0.58rem;color:{text_muted};'
-                f'margin-top:0.2rem;display:flex;align-items:center;gap:0.4rem;flex-wrap:wrap;">'
-                f'{ts} {pill_html} {size_html}</div>',
+                ace_theme.history_meta_html(ts, otype, size_info, dark),
                 unsafe_allow_html=True,
             )
             st.markdown("</div>", unsafe_allow_html=True)
 
+        has_next = start + HISTORY_WINDOW < len(listing) or more
+        if page > 0 or has_next:
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if page > 0 and st.button("‹ Newer", key="hist_prev", use_container_width=True):
+                    st.session_state.history_page = page - 1
+                    st.rerun()
+            with col_next:
+                if has_next and st.button("Load more ›", key="hist_more", use_container_width=True):
+                    # Only go back to Mongo once the locally loaded pages run out.
+                    if start + 2 * HISTORY_WINDOW > len(listing) and more:
+                        if searching:
+                            older = search_blogs(user["id"], query, after=listing[-1] if listing else None)
+                            st.session_state.search_results = listing + older
+                            st.session_state.search_more = len(older) == ace_store.HISTORY_PAGE_SIZE
+                        else:
+                            older = load_blogs(user["id"], before=history[-1].get("saved_at"))
+                            st.session_state.history = history + older
+                            st.session_state.history_more = len(older) == ace_store.HISTORY_PAGE_SIZE
+                    st.session_state.history_page = page + 1
+                    st.rerun()
+
 # ── Hero ──────────────────────────────────────────────────────────────────────
-st.markdown(f"""
-<div class="hero">
-    <div class="hero-eyebrow">✦ Study &amp; Content Engine</div>
-    <h1 class="hero-title">Learn deeper.<br><em>Study smarter.</em></h1>
-    <p class="hero-sub">Generate detailed study guides, topic deep-dives &amp; structured content — from any subject, instantly.</p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(ace_theme.HERO_HTML, unsafe_allow_html=True)
 
 # ── Blog renderer ─────────────────────────────────────────────────────────────
 def render_blog(entry: dict, label: str = ""):
@@ -1447,9 +760,87 @@ def render_blog(entry: dict, label: str = ""):
             "↓ Download", data=md, file_name=fn,
             mime="text/markdown", use_container_width=True,
         )
-    st.markdown('<div class="markdown-container">', unsafe_allow_html=True)
-    st.markdown(md)
-    st.markdown('</div>', unsafe_allow_html=True)
+    if entry.get("degradations"):
+        st.warning("⏱ Trimmed to fit the time budget: " + "; ".join(entry["degradations"]))
+    run_stats = entry.get("run_stats")
+    if run_stats:
+        with st.expander("⏱ Run stats — latency & cost per stage", expanded=False):
+            total_s    = sum(s["seconds"] for s in run_stats.values())
+            total_cost = sum(s["cost_usd"] for s in run_stats.values())
+            rows = ""
+            for node, s in run_stats.items():
+                cap_note = f' · {s["cap_hits"]} at cap' if s.get("cap_hits") else ""
+                if s.get("hedges"):
+                    cap_note += f' · {s["hedges"]} hedged, {s["hedge_wins"]} won'
+                if s.get("repairs") or s.get("retries"):
+                    cap_note += f' · {s.get("repairs", 0)} repaired locally, {s.get("retries", 0)} retried'
+                if s.get("late"):
+                    cap_note += f' · {s["late"]} finished after their node (hedge losers, timeouts)'
+                rows += (
+                    f'<div>{node:<13} {", ".join(s["models"]):<24} {s["calls"]:>3}× '
+                    f'{s["seconds"]:>7.1f}s {s["input_tokens"]:>7,}→{s["output_tokens"]:<7,} tok '
+                    f'${s["cost_usd"]:.4f}{cap_note}</div>'
+                )
+            st.markdown(
+                f'<div style="font-family:\'DM Mono\',monospace;font-size:0.68rem;color:{text_muted};'
+                f'white-space:pre;">{rows}<div>{"total":<13} {"":<24} {"":>4} {total_s:>7.1f}s '
+                f'(summed; workers overlap) ${total_cost:.4f}</div></div>',
+                unsafe_allow_html=True,
+            )
+            profile = entry.get("profile")
+            if profile:
+                shares = " · ".join(f"{k} {v:.1f}s" for k, v in profile.get("breakdown_seconds", {}).items())
+                st.caption(f"Profile ({profile['mode']}): {shares or 'no samples'} — {profile['artefacts'][-1]}")
+    render_body(md)
+
+
+def _render_parts(parts: list, heading: str = "", cls: str = "markdown-container"):
+    html = heading
+    for part in parts:
+        if part[0] == "html":
+            html += part[1]
+            continue
+        if html:
+            st.html(f'<div class="{cls}">{html}</div>')
+            html = ""
+        if ace_images.ensure(part[1]):
+            st.image(part[1], caption=part[3] or part[2])
+    if html:
+        st.html(f'<div class="{cls}">{html}</div>')
+
+
+def render_body(md: str):
+    """Document body from the cached per-section HTML (see ace_render.py).
+
+    Long documents show one row per section; only open sections are sent to the browser.
+    """
+    doc = ace_render.render(md)
+    if not doc["lazy"]:
+        parts = list(doc["preamble"])
+        for sec in doc["sections"]:
+            parts += [("html", sec["heading"])] + sec["parts"]
+        _render_parts(parts)
+        return
+
+    if doc["preamble"]:
+        _render_parts(doc["preamble"], cls="markdown-container md-section")
+    opened = st.session_state.open_sections.setdefault(doc["hash"], {0})
+    c1, c2, _ = st.columns([1, 1, 4])
+    if c1.button("Expand all", key=f"exp_{doc['hash']}", use_container_width=True):
+        opened.update(range(len(doc["sections"])))
+        st.rerun()
+    if c2.button("Collapse all", key=f"col_{doc['hash']}", use_container_width=True):
+        opened.clear()
+        st.rerun()
+    for i, sec in enumerate(doc["sections"]):
+        is_open = i in opened
+        arrow = "▾" if is_open else "▸"
+        if st.button(f"{arrow}  {sec['title']}  ·  {sec['words']:,} words",
+                     key=f"sec_{doc['hash']}_{i}", use_container_width=True):
+            opened.symmetric_difference_update({i})
+            st.rerun()
+        if is_open:
+            _render_parts(sec["parts"], cls="markdown-container md-section")
 
 # ── Routing ───────────────────────────────────────────────────────────────────
 viewing_history = (
@@ -1458,7 +849,11 @@ viewing_history = (
 )
 
 if viewing_history:
-    entry = next((h for h in history if h["_id"] == st.session_state.viewing_id), None)
+    # History rows carry metadata only — fetch the body once when an entry is opened.
+    entry = st.session_state.viewing_doc
+    if entry is None or entry["_id"] != st.session_state.viewing_id:
+        entry = load_blog(user["id"], st.session_state.viewing_id)
+        st.session_state.viewing_doc = entry
     if entry:
         render_blog(entry, label="from history")
     else:
@@ -1466,6 +861,7 @@ if viewing_history:
     st.markdown("---")
     if st.button("← Back to Generator"):
         st.session_state.viewing_id = None
+        st.session_state.viewing_doc = None
         st.rerun()
 
 elif st.session_state.current_result:
@@ -1506,6 +902,8 @@ else:
             unsafe_allow_html=True,
         )
 
+    warm_backend()
+
     if generate:
         if not topic.strip():
             st.warning("Please enter a topic before generating.")
@@ -1514,27 +912,28 @@ else:
             if not active_key:
                 st.error("⚠️ No Google API key found. Add your Gemini key in ⚙️ Settings → 🔑 API Keys (sidebar).")
                 st.stop()
+            own_key = bool(cfg.get("gemini_api_key", "").strip())
+            try:
+                ace_quota.check(db, user["id"], cfg.get("depth_level", "Balanced"), own_key=own_key)
+            except ace_quota.QuotaExceeded as e:
+                st.warning(f"⏳ {e}")
+                st.stop()
 
             os.environ["GOOGLE_API_KEY"]        = active_key
             os.environ["GEMINI_API_KEY"]        = active_key
             tavily_key = cfg.get("tavily_api_key", "").strip() or os.getenv("TAVILY_API_KEY", "")
             if tavily_key:
                 os.environ["TAVILY_API_KEY"]    = tavily_key
-            os.environ["ACE_OUTPUT_TYPE"]       = cfg.get("output_type", "Study Guide")
-            os.environ["ACE_SECTION_COUNT"]     = str(cfg.get("section_count", 5))
-            os.environ["ACE_WORDS_PER_SECTION"] = str(cfg.get("words_per_section", 300))
-            os.environ["ACE_DEPTH_LEVEL"]       = cfg.get("depth_level", "Balanced")
-            os.environ["ACE_TONE"]              = cfg.get("tone", "Educational")
-            os.environ["ACE_EXTRA_INSTRUCTION"] = cfg.get("extra_instruction", "")
+            ace_config.apply_settings(cfg)
 
-            try:
-                sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-                if "ACE_backend" in sys.modules:
-                    del sys.modules["ACE_backend"]
-                from ACE_backend import app as engine_app  # type: ignore
-            except ImportError:
-                st.error("**ACE_backend.py not found.** Place it in the same folder as app.py.")
-                st.stop()
+            queued = ace_config.cfg.job_queue     # ace_jobs workers run the graph, not this process
+            if not queued:
+                try:
+                    backend = load_backend()
+                    engine_stream, summarize_llm_calls = backend.stream, backend.summarize_llm_calls
+                except ImportError:
+                    st.error("**ACE_backend.py not found.** Place it in the same folder as app.py.")
+                    st.stop()
 
             otype   = cfg.get("output_type", "Study Guide")
             nsec    = cfg.get("section_count", 5)
@@ -1584,64 +983,132 @@ else:
                     unsafe_allow_html=True,
                 )
 
+            run_key = ace_flight.run_key(topic.strip(), cfg)
+            if queued:
+                cards = {key: (icon, label) for key, icon, label, _ in stages}
+                job_id = ace_jobs.enqueue(db, user["id"], topic.strip(), cfg, run_key=run_key)
+                upd("router", "🔀", "Router", "Queued — waiting for a worker…", "running")
+
+                def on_progress(stage, detail):
+                    if stage in cards:
+                        upd(stage, *cards[stage], detail, "done")
+
+                waiting_since = time.monotonic()
+
+                def on_poll(job):
+                    # Touching the page each poll also lets Streamlit stop this script when the user moves on.
+                    if job["status"] == ace_jobs.QUEUED:
+                        upd("router", "🔀", "Router",
+                            f"Queued — waiting for a worker… {time.monotonic() - waiting_since:.0f} s", "running")
+
+                with st.spinner(""):
+                    job = ace_jobs.wait(db, job_id, user["id"], on_progress=on_progress, on_poll=on_poll,
+                                        timeout=ace_config.cfg.job_wait,
+                                        claim_timeout=ace_config.cfg.job_claim_wait)
+                if job["status"] in (ace_jobs.QUEUED, ace_jobs.RUNNING):
+                    if job["status"] == ace_jobs.QUEUED and not job["attempts"]:
+                        st.warning(f"No worker has picked up this job yet (id `{job_id}`). Workers may be down; "
+                                   "it stays queued and runs when one starts.")
+                    else:
+                        mine = " and will appear in your history when done" if job["user_id"] == user["id"] else ""
+                        st.warning(f"Job `{job_id}` is still {job['status']} (attempt {job['attempts']}). "
+                                   f"It keeps running in the background{mine}.")
+                    st.stop()
+                if job["status"] != ace_jobs.DONE:
+                    last = job["errors"][-1]["error"] if job.get("errors") else "unknown error"
+                    st.error(f"Pipeline error after {job['attempts']} attempt(s): {last}")
+                    st.stop()
+                if job["user_id"] == user["id"]:
+                    saved = load_blog(user["id"], str(job["blog_id"]))
+                else:   # coalesced onto another user's identical job
+                    saved = ace_store.copy_blog(db, job["user_id"], str(job["blog_id"]), user["id"], writer=writer)
+                if saved is None:
+                    # e.g. the job's owner deleted the result before we copied it.
+                    st.error(f"Job `{job_id}` finished, but its result could not be found. Please generate it again.")
+                    st.stop()
+                ace_render.render(saved["markdown"])
+                st.session_state.history = [ace_store.list_entry(saved)] + history
+                st.session_state.history_page = 0
+                st.session_state.current_result = saved
+                st.rerun()
+
             result_md = None
             plan_obj  = None
             mode_used = "closed_book"
-
-            with st.spinner(""):
-                try:
-                    upd("router", "🔀", "Router", "Routing topic…", "running")
-                    for event in engine_app.stream({"topic": topic.strip()}, stream_mode="updates"):
-                        if "router" in event:
-                            r = event["router"]
-                            mode_used = r.get("mode", "closed_book")
-                            needs_res = r.get("needs_research", False)
-                            upd("router", "🔀", "Router", f"Mode: {mode_used.replace('_',' ')}", "done")
-                            if needs_res:
-                                upd("research", "🔍", "Research", "Fetching live evidence…", "running")
-                            else:
-                                upd("research", "🔍", "Research", "Skipped (closed-book)", "skipped")
-                        if "research" in event:
-                            ev = event["research"].get("evidence", [])
-                            upd("research", "🔍", "Research", f"Retrieved {len(ev)} evidence items", "done")
-                            upd("orchestrator", "📐", "Planner", "Creating outline…", "running")
-                        if "orchestrator" in event:
-                            plan_obj = event["orchestrator"].get("plan")
-                            n = len(plan_obj.tasks) if plan_obj else "?"
-                            upd("orchestrator", "📐", "Planner", f"Plan ready · {n} sections", "done")
-                            upd("worker", "✍️", "Writer", f"Writing {n} sections in parallel…", "running")
-                        if "reducer" in event:
-                            upd("worker",  "✍️",  "Writer",    "All sections written", "done")
-                            upd("reducer", "🗜️", "Assembler", "Merging Markdown…", "running")
-                            result_md = event["reducer"].get("final")
-                            upd("reducer", "🗜️", "Assembler", "Blog assembled ✓", "done")
-                except Exception as e:
-                    st.error(f"Pipeline error: {e}")
-                    st.stop()
+            llm_calls = []
+            degradations = []
+            images = []
+            run_input = {"topic": topic.strip()}
+            if int(cfg.get("time_budget", 0)):
+                run_input["deadline"] = time.time() + int(cfg["time_budget"])
+
+            # Opt-in (ACE_PROFILE): per-node profiles plus this loop's own time, incl. rendering.
+            with ace_profile.session(topic.strip()) as prof, ace_profile.track("streamlit", profile=False):
+                # An identical run already in progress (another tab or user) is followed, not repeated.
+                def charge(calls, user_id=user["id"], depth=cfg.get("depth_level", "Balanced")):
+                    ace_quota.charge(db, user_id, depth, ace_quota.tokens_used(calls), own_key=own_key)
+
+                flight, leader = ace_flight.join(run_key, lambda: _metered_stream(engine_stream, run_input, charge))
+                if not leader:
+                    st.info("The same topic with the same settings is already being generated — following that run.")
+
+                with st.spinner(""):
+                    try:
+                        upd("router", "🔀", "Router", "Routing topic…", "running")
+                        for event in flight.subscribe():
+                            for update in event.values():
+                                if isinstance(update, dict):
+                                    llm_calls.extend(update.get("llm_calls", []))
+                                    degradations.extend(update.get("degradations", []))
+                            if "router" in event:
+                                r = event["router"]
+                                mode_used = r.get("mode", "closed_book")
+                                needs_res = r.get("needs_research", False)
+                                upd("router", "🔀", "Router", f"Mode: {mode_used.replace('_',' ')}", "done")
+                                if needs_res:
+                                    upd("research", "🔍", "Research", "Fetching live evidence…", "running")
+                                else:
+                                    upd("research", "🔍", "Research", "Skipped (closed-book)", "skipped")
+                            if "research" in event:
+                                ev = event["research"].get("evidence", [])
+                                upd("research", "🔍", "Research", f"Retrieved {len(ev)} evidence items", "done")
+                                upd("orchestrator", "📐", "Planner", "Creating outline…", "running")
+                            if "orchestrator" in event:
+                                plan_obj = event["orchestrator"].get("plan")
+                                n = len(plan_obj.tasks) if plan_obj else "?"
+                                upd("orchestrator", "📐", "Planner", f"Plan ready · {n} sections", "done")
+                                upd("worker", "✍️", "Writer", f"Writing {n} sections in parallel…", "running")
+                            if "reducer" in event:
+                                upd("worker",  "✍️",  "Writer",    "All sections written", "done")
+                                upd("reducer", "🗜️", "Assembler", "Merging Markdown…", "running")
+                                result_md = event["reducer"].get("final")
+                                upd("reducer", "🗜️", "Assembler", "Blog assembled ✓", "done")
+                            if "images" in event:
+                                images = event["images"].get("images", [])
+                    except Exception as e:
+                        st.error(f"Pipeline error: {e}")
+                        st.stop()
+
+                if result_md and images:
+                    # Text first: show it now, then fill in images as they finish.
+                    preview = st.empty()
+                    preview.markdown(ace_images.place(result_md, images)[0])
+                    with st.spinner(f"Adding {len(images)} image(s)…"):
+                        result_md, missing = ace_images.place(result_md, images, timeout=ace_config.cfg.image_wait)
+                    if missing:
+                        degradations.append(f"{len(missing)} image(s) not ready in time — left out")
 
             if result_md and plan_obj:
-                blog_title = plan_obj.blog_title
-                filename = (
-                    "".join(c if c.isalnum() or c in (" ", "_", "-") else "" for c in blog_title)
-                    .strip().lower().replace(" ", "_") + ".md"
-                )
-                entry = {
-                    "blog_title":        blog_title,
-                    "markdown":          result_md,
-                    "filename":          filename,
-                    "mode":              mode_used,
-                    "output_type":       cfg.get("output_type", "Study Guide"),
-                    "section_count":     cfg.get("section_count", 5),
-                    "words_per_section": cfg.get("words_per_section", 300),
-                    "depth_level":       cfg.get("depth_level", "Balanced"),
-                    "tone":              cfg.get("tone", "Educational"),
-                    "topic":             topic.strip(),
-                    "created_at":        datetime.now().strftime("%b %d %Y, %H:%M"),
-                }
-                save_blog(user["id"], entry)
-                refreshed = load_blogs(user["id"])
-                st.session_state.history = refreshed
-                st.session_state.current_result = refreshed[0]
+                entry = ace_store.build_entry(topic.strip(), cfg, plan_obj.blog_title, result_md, mode_used,
+                                              summarize_llm_calls(llm_calls), degradations)
+                if prof is not None:
+                    entry["profile"] = ace_profile.summary(prof)
+                saved = save_blog(user["id"], entry)
+                ace_render.render(result_md)    # warm the HTML cache for the view after rerun
+                # Optimistic: show the entry now instead of re-querying after the queued write.
+                st.session_state.history = [ace_store.list_entry(saved)] + history
+                st.session_state.history_page = 0
+                st.session_state.current_result = saved
                 st.rerun()
             else:
                 st.error("No output produced. Check your API keys and backend.")
\ No newline at end of file
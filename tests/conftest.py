@@ -0,0 +1,9 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient(tz_aware=True)["content_engine"]
+
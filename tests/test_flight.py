@@ -0,0 +1,97 @@
+import contextvars
+import threading
+
+import pytest
+
+import ace_flight
+
+
+def _gated(events, gate: threading.Event, error=None):
+    """A start() whose pipeline yields `events[0]`, waits for `gate`, then the rest (or raises)."""
+    calls = []
+
+    def start():
+        calls.append(1)
+
+        def run():
+            yield events[0]
+            gate.wait(5)
+            yield from events[1:]
+            if error is not None:
+                raise error
+        return run()
+    return start, calls
+
+
+def _collect(flight, out: list, errors: list):
+    try:
+        out.extend(flight.subscribe())
+    except Exception as e:
+        errors.append(e)
+
+
+def test_run_key_normalises_topic_and_separates_payers():
+    settings = {"output_type": "Study Guide", "section_count": 5}
+    key = ace_flight.run_key("  Self   Attention ", settings)
+    assert key == ace_flight.run_key("self attention", dict(settings, unrelated="x"))
+    assert key != ace_flight.run_key("self attention", dict(settings, section_count=6))
+    assert key != ace_flight.run_key("self attention", dict(settings, gemini_api_key="AIza-own"))
+    assert "AIza-own" not in str(ace_flight.payer({"gemini_api_key": "AIza-own"}))
+
+
+def test_follower_replays_from_the_start_then_follows_live():
+    gate = threading.Event()
+    start, calls = _gated(["router", "plan", "section 1", "section 2"], gate)
+    leader, is_leader = ace_flight.join("k-follow", start)
+    assert is_leader
+    lead_events = leader.subscribe()
+    assert next(lead_events) == "router"            # the leader is past the first update
+
+    follower, is_leader = ace_flight.join("k-follow", lambda: pytest.fail("started twice"))
+    assert follower is leader and not is_leader and leader.subscribers == 2
+    out, errors = [], []
+    t = threading.Thread(target=_collect, args=(follower, out, errors))
+    t.start()
+    gate.set()
+    t.join(5)
+    assert out == ["router", "plan", "section 1", "section 2"] and errors == []
+    assert list(lead_events) == ["plan", "section 1", "section 2"]
+    assert calls == [1] and ace_flight.in_flight() == 0
+
+
+def test_leader_error_reaches_every_subscriber():
+    gate = threading.Event()
+    start, _ = _gated(["router", "plan"], gate, error=RuntimeError("quota exhausted"))
+    leader, _ = ace_flight.join("k-error", start)
+    follower, _ = ace_flight.join("k-error", start)
+    results = [([], []), ([], [])]
+    threads = [threading.Thread(target=_collect, args=(f, *r)) for f, r in zip((leader, follower), results)]
+    for t in threads:
+        t.start()
+    gate.set()
+    for t in threads:
+        t.join(5)
+    for out, errors in results:
+        assert out == ["router", "plan"]
+        assert [str(e) for e in errors] == ["quota exhausted"]
+
+
+def test_finished_flight_is_not_joined_again():
+    first, _ = ace_flight.join("k-done", lambda: iter(["a"]))
+    assert list(first.subscribe()) == ["a"]
+    second, is_leader = ace_flight.join("k-done", lambda: iter(["b"]))
+    assert is_leader and second is not first
+    assert list(second.subscribe()) == ["b"]
+
+
+def test_pipeline_thread_runs_in_the_leader_context():
+    var = contextvars.ContextVar("session", default=None)
+    var.set("leader-session")
+    seen = []
+
+    def start():
+        seen.append(var.get())
+        return iter([])
+    flight, _ = ace_flight.join("k-ctx", start)
+    list(flight.subscribe())
+    assert seen == ["leader-session"]
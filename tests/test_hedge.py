@@ -0,0 +1,60 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ace_hedge
+import ace_ratelimit
+
+
+@pytest.fixture
+def one_thread(monkeypatch):
+    """A deadline pool with a single thread, held busy until the test releases it."""
+    pool = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    pool.submit(release.wait)
+    monkeypatch.setattr(ace_hedge, "_deadline_pool", pool)
+    monkeypatch.setattr(ace_hedge, "_pool", pool)
+    yield
+    release.set()
+    pool.shutdown()
+
+
+def test_call_with_timeout_returns_result():
+    assert ace_hedge.call_with_timeout(lambda: 42, 1.0) == (True, 42)
+
+
+def test_running_call_times_out_and_is_handed_to_late_calls():
+    with ace_hedge.collect_late() as late:
+        assert ace_hedge.call_with_timeout(lambda: time.sleep(0.2) or "late", 0.05, {"node": "x"}) == (False, None)
+        got = []
+        assert late.settle(1.0, lambda finished, unfinished: got.append(finished)) == []
+        time.sleep(0.4)
+    assert [(r, info["late"]) for r, info in got[0]] == [("late", "timed_out")]
+
+
+def test_queued_call_is_reported_as_starved(one_thread):
+    ran = []
+    with pytest.raises(ace_hedge.Starved):
+        ace_hedge.call_with_timeout(lambda: ran.append(1), 0.05)
+    assert not ran
+
+
+def test_hedged_call_starves_when_no_attempt_starts(one_thread):
+    with pytest.raises(ace_hedge.Starved):
+        ace_hedge.hedged_call(lambda: 1, 0.01, lambda: True, timeout=0.05)
+
+
+def test_hedged_call_times_out_when_attempts_run_too_long():
+    with pytest.raises(TimeoutError) as e:
+        ace_hedge.hedged_call(lambda: time.sleep(0.3), 0.01, lambda: True, timeout=0.05)
+    assert not isinstance(e.value, ace_hedge.Starved)
+
+
+def test_acquire_gives_up_at_its_timeout():
+    lim = ace_ratelimit.RateLimiter(per_minute=1, burst=1)
+    assert lim.acquire(timeout=0)
+    t0 = time.monotonic()
+    assert not lim.acquire(timeout=0.1)
+    assert 0.09 <= time.monotonic() - t0 < 0.5
@@ -0,0 +1,163 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import ace_jobs
+
+
+class Clock:
+    """Stand-in for `ace_jobs._now()`; tests move it forward explicitly."""
+
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock(datetime(2026, 1, 1, tzinfo=timezone.utc))
+    monkeypatch.setattr(ace_jobs, "_now", c)
+    return c
+
+
+@pytest.fixture
+def jobs_db(db):
+    ace_jobs.ensure_indexes(db)
+    return db
+
+
+def _enqueue(db, key=None):
+    return ace_jobs.enqueue(db, "u1", "Topic", {"depth_level": "Quick", "gemini_api_key": "secret"}, run_key=key)
+
+
+def test_enqueue_leaves_out_api_keys(jobs_db, clock):
+    job = jobs_db["jobs"].find_one({"_id": _enqueue(jobs_db)})
+    assert "gemini_api_key" not in job["settings"]
+    assert job["status"] == ace_jobs.QUEUED and job["attempts"] == 0
+
+
+def test_claim_race_has_one_winner(jobs_db, clock):
+    _enqueue(jobs_db)
+    start, won = threading.Barrier(8), []
+
+    def worker(i):
+        start.wait()
+        job = ace_jobs.claim(jobs_db, f"w{i}", lease=60, max_attempts=3)
+        if job is not None:
+            won.append(job)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(won) == 1
+    assert won[0]["status"] == ace_jobs.RUNNING and won[0]["attempts"] == 1
+
+
+def test_expired_lease_is_retaken_and_old_worker_is_fenced(jobs_db, clock):
+    job_id = _enqueue(jobs_db)
+    first = ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=3)
+    assert ace_jobs.claim(jobs_db, "w2", lease=30, max_attempts=3) is None     # still leased
+
+    clock.advance(31)
+    second = ace_jobs.claim(jobs_db, "w2", lease=30, max_attempts=3)
+    assert second["_id"] == first["_id"] == job_id
+    assert second["worker"] == "w2" and second["attempts"] == 2
+    # The first worker lost the lease: every write it tries is rejected.
+    assert not ace_jobs.heartbeat(jobs_db, job_id, "w1")
+    assert not ace_jobs.complete(jobs_db, job_id, "w1", job_id)
+    assert ace_jobs.fail(jobs_db, first, "w1", "late") == ""
+    assert ace_jobs.complete(jobs_db, job_id, "w2", job_id)
+
+
+def test_heartbeat_extends_the_lease(jobs_db, clock):
+    job_id = _enqueue(jobs_db)
+    ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=3)
+    clock.advance(20)
+    assert ace_jobs.heartbeat(jobs_db, job_id, "w1", lease=30, progress={"router": "done"})
+    clock.advance(20)
+    assert ace_jobs.claim(jobs_db, "w2", lease=30, max_attempts=3) is None
+    assert jobs_db["jobs"].find_one({"_id": job_id})["progress"] == {"router": "done"}
+
+
+def test_failure_requeues_with_exponential_backoff(jobs_db, clock):
+    job_id = _enqueue(jobs_db)
+    job = ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=5)
+    assert ace_jobs.fail(jobs_db, job, "w1", "boom", max_attempts=5) == ace_jobs.QUEUED
+
+    doc = jobs_db["jobs"].find_one({"_id": job_id})
+    assert doc["available_at"] == clock.now + timedelta(seconds=ace_jobs.RETRY_BACKOFF)
+    assert "worker" not in doc and doc["errors"][0]["error"] == "boom"
+    assert ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=5) is None      # backing off
+
+    clock.advance(ace_jobs.RETRY_BACKOFF)
+    job = ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=5)
+    assert job["attempts"] == 2
+    ace_jobs.fail(jobs_db, job, "w1", "boom again", max_attempts=5)
+    doc = jobs_db["jobs"].find_one({"_id": job_id})
+    assert doc["available_at"] == clock.now + timedelta(seconds=2 * ace_jobs.RETRY_BACKOFF)
+
+
+def test_last_failure_dead_letters_and_frees_the_run_key(jobs_db, clock):
+    job_id = _enqueue(jobs_db, key="k1")
+    job = ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=2)
+    ace_jobs.fail(jobs_db, job, "w1", "first", max_attempts=2)
+    clock.advance(ace_jobs.RETRY_BACKOFF)
+    job = ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=2)
+    assert ace_jobs.fail(jobs_db, job, "w1", "second", max_attempts=2) == ace_jobs.DEAD
+
+    doc = jobs_db["jobs"].find_one({"_id": job_id})
+    assert doc["status"] == ace_jobs.DEAD and "active_key" not in doc
+    assert [e["error"] for e in doc["errors"]] == ["first", "second"]
+    clock.advance(3600)
+    assert ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=2) is None
+    assert _enqueue(jobs_db, key="k1") != job_id          # a new request starts a new job
+
+
+def test_reap_dead_letters_an_expired_last_attempt(jobs_db, clock):
+    job_id = _enqueue(jobs_db)
+    ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=1)
+    clock.advance(31)
+    assert ace_jobs.claim(jobs_db, "w2", lease=30, max_attempts=1) is None      # out of attempts
+    assert ace_jobs.reap(jobs_db, max_attempts=1) == 1
+    doc = jobs_db["jobs"].find_one({"_id": job_id})
+    assert doc["status"] == ace_jobs.DEAD and "lease expired" in doc["errors"][-1]["error"]
+
+
+def test_requeue_gives_a_dead_job_fresh_attempts(jobs_db, clock):
+    job_id = _enqueue(jobs_db)
+    job = ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=1)
+    assert not ace_jobs.requeue(jobs_db, job_id)                 # only dead jobs
+    ace_jobs.fail(jobs_db, job, "w1", "boom", max_attempts=1)
+
+    assert ace_jobs.requeue(jobs_db, job_id)
+    doc = jobs_db["jobs"].find_one({"_id": job_id})
+    assert doc["status"] == ace_jobs.QUEUED and doc["attempts"] == 0 and doc["errors"]
+    assert ace_jobs.claim(jobs_db, "w2", lease=30, max_attempts=1)["_id"] == job_id
+
+
+def test_identical_requests_share_a_live_job(jobs_db, clock):
+    first = _enqueue(jobs_db, key="k1")
+    again = ace_jobs.enqueue(jobs_db, "u2", "topic", {}, run_key="k1")
+    assert again == first
+    assert jobs_db["jobs"].find_one({"_id": first})["subscribers"] == ["u2"]
+    assert ace_jobs.get_job(jobs_db, first, "u2") is not None
+    assert ace_jobs.get_job(jobs_db, first, "u3") is None
+
+    ace_jobs.claim(jobs_db, "w1", lease=30, max_attempts=3)
+    assert ace_jobs.complete(jobs_db, first, "w1", first)
+    assert _enqueue(jobs_db, key="k1") != first
+
+
+def test_wait_gives_up_when_no_worker_claims(jobs_db, clock):
+    job_id = _enqueue(jobs_db)
+    polled = []
+    job = ace_jobs.wait(jobs_db, job_id, "u1", poll=0.01, timeout=5, claim_timeout=0.05, on_poll=polled.append)
+    assert job["status"] == ace_jobs.QUEUED and polled
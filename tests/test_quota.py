@@ -0,0 +1,83 @@
+import pytest
+
+import ace_quota
+
+
+@pytest.fixture(autouse=True)
+def quota_env(monkeypatch):
+    monkeypatch.setenv("ACE_QUOTA", "1")
+    monkeypatch.setenv("ACE_QUOTA_OWN_KEY", "0")
+    monkeypatch.setenv("ACE_QUOTA_RUNS_PER_MIN_QUICK", "2")
+    monkeypatch.setenv("ACE_QUOTA_TOKENS_PER_DAY_QUICK", "1000")
+    monkeypatch.setattr(ace_quota, "_blocked", {})
+
+
+def test_runs_per_minute_reject_with_retry_after(db):
+    ace_quota.check(db, "u1", "Quick")
+    ace_quota.check(db, "u1", "Quick")
+    with pytest.raises(ace_quota.QuotaExceeded) as e:
+        ace_quota.check(db, "u1", "Quick")
+    # Two runs a minute refill one run every 30 s; the bucket is just under 1 short.
+    assert 29 < e.value.retry_after <= 30
+    assert "Run limit for Quick" in str(e.value)
+    ace_quota.check(db, "u2", "Quick")          # other users have their own bucket
+
+
+def test_rejection_is_remembered_without_a_database_round_trip(db):
+    for _ in range(2):
+        ace_quota.check(db, "u1", "Quick")
+    with pytest.raises(ace_quota.QuotaExceeded) as first:
+        ace_quota.check(db, "u1", "Quick")
+    with pytest.raises(ace_quota.QuotaExceeded) as again:
+        ace_quota.check(None, "u1", "Quick")    # would fail on any database access
+    assert again.value.retry_after <= first.value.retry_after
+
+
+def test_charge_can_overdraw_and_blocks_until_refilled(db):
+    ace_quota.check(db, "u1", "Quick")
+    ace_quota.charge(db, "u1", "Quick", 1500)
+    assert db["quotas"].find_one({"_id": "u1|Quick"})["tokens"]["level"] == pytest.approx(-500, abs=1)
+    with pytest.raises(ace_quota.QuotaExceeded) as e:
+        ace_quota.check(db, "u1", "Quick")
+    # 1000 tokens a day refill at 1000/86400 per second; it must climb back above zero.
+    assert e.value.retry_after == pytest.approx(501 * ace_quota.DAY / 1000, rel=0.01)
+    assert "Daily token budget" in str(e.value)
+
+
+def test_own_key_users_are_not_limited_by_default(db, monkeypatch):
+    for _ in range(5):
+        ace_quota.check(db, "u1", "Quick", own_key=True)
+    ace_quota.charge(db, "u1", "Quick", 10_000, own_key=True)
+    assert db["quotas"].count_documents({}) == 0
+    monkeypatch.setenv("ACE_QUOTA_OWN_KEY", "1")
+    ace_quota.check(db, "u1", "Quick", own_key=True)
+    assert db["quotas"].count_documents({}) == 1
+
+
+def test_compare_and_set_retries_after_a_concurrent_write(db):
+    ace_quota.check(db, "u1", "Quick")
+    calls = []
+
+    def step(runs, tokens, limits):
+        calls.append(tokens)
+        if len(calls) == 1:
+            # Another process charges between our read and our write: our write must lose.
+            ace_quota.charge(db, "u1", "Quick", 300)
+        return runs, tokens - 100
+
+    ace_quota._update(db, "u1", "Quick", step)
+    doc = db["quotas"].find_one({"_id": "u1|Quick"})
+    assert len(calls) == 2 and calls[1] < calls[0] - 299      # re-read saw the other charge
+    assert doc["v"] == 3
+    assert doc["tokens"]["level"] == pytest.approx(600, abs=1)
+
+
+def test_compare_and_set_gives_up_when_always_conflicting(db):
+    ace_quota.check(db, "u1", "Quick")
+
+    def step(runs, tokens, limits):
+        db["quotas"].update_one({"_id": "u1|Quick"}, {"$inc": {"v": 1}})
+        return runs, tokens
+
+    with pytest.raises(RuntimeError, match="kept conflicting"):
+        ace_quota._update(db, "u1", "Quick", step)
@@ -0,0 +1,87 @@
+import json
+
+from langchain_core.messages import AIMessage
+
+import ace_repair
+from ACE_backend import Plan
+
+HINTS = {"target_words": "300", "blog_title": "Self-attention"}
+
+
+def _task(i, bullets=3, **extra):
+    return {"id": i, "title": f"Part {i}", "goal": f"Understand part {i}",
+            "bullets": [f"point {i}.{b}" for b in range(bullets)], "target_words": "300", **extra}
+
+
+def _plan(*tasks):
+    return {"blog_title": "Self-attention", "audience": "engineers", "tone": "clear", "tasks": list(tasks)}
+
+
+def _repair(payload, hints=HINTS):
+    text = payload if isinstance(payload, str) else json.dumps(payload)
+    return ace_repair.repair(Plan, AIMessage(content=text), hints)
+
+
+def test_two_bullets_are_padded_to_the_minimum():
+    plan, fixes = _repair(_plan(_task(1, bullets=2)))
+    bullets = plan.tasks[0].bullets
+    assert len(bullets) == 3 and bullets[:2] == ["point 1.0", "point 1.1"]
+    assert "Plan.tasks[0].bullets: padded 2 -> 3 items" in fixes
+
+
+def test_seven_bullets_are_clamped_to_the_maximum():
+    plan, fixes = _repair(_plan(_task(1, bullets=7)))
+    assert plan.tasks[0].bullets == [f"point 1.{b}" for b in range(6)]
+    assert "Plan.tasks[0].bullets: clamped 7 -> 6 items" in fixes
+
+
+def test_numeric_target_words_becomes_a_string_and_missing_ones_come_from_hints():
+    missing = _task(2)
+    del missing["target_words"]
+    plan, fixes = _repair(_plan(_task(1, target_words=450), missing))
+    assert [t.target_words for t in plan.tasks] == ["450", "300"]
+    assert "Plan.tasks[0].target_words: 450 -> str" in fixes
+    assert "Plan.tasks[1].target_words: filled missing value" in fixes
+
+
+def test_fenced_json_with_prose_and_trailing_comma():
+    body = json.dumps(_plan(_task(1)), indent=2)[:-1].rstrip() + ",\n}"
+    plan, fixes = _repair(f"Here is the plan:\n```json\n{body}\n```")
+    assert plan.tasks[0].title == "Part 1"
+    assert "lenient JSON" in fixes
+
+
+def test_truncated_json_keeps_the_complete_tasks():
+    text = json.dumps(_plan(_task(1), _task(2), _task(3)))
+    cut = text[:text.index('"Part 3"') + 4]          # stops inside the third task's title
+    plan, fixes = _repair(cut)
+    assert "closed truncated JSON" in fixes
+    assert [t.title for t in plan.tasks][:2] == ["Part 1", "Part 2"]
+
+
+def test_duplicate_task_ids_are_renumbered():
+    plan, fixes = _repair(_plan(_task(1), _task(1), _task(1)))
+    assert [t.id for t in plan.tasks] == [1, 2, 3]
+    assert "Plan.tasks: renumbered duplicate ids" in fixes
+
+
+def test_tool_call_args_are_repaired_too():
+    raw = AIMessage(content="", tool_calls=[{"name": "Plan", "args": _plan(_task(1, bullets=2)), "id": "c1"}])
+    plan, _ = ace_repair.repair(Plan, raw, HINTS)
+    assert len(plan.tasks[0].bullets) == 3
+
+
+def test_unrepairable_replies_return_none():
+    assert _repair("I can't help with that.")[0] is None
+    assert _repair(_plan())[0] is None                          # an empty plan is worth a retry
+    no_title = _plan(_task(1))
+    del no_title["blog_title"]
+    assert _repair(no_title, hints={})[0] is None               # required, and no hint to fill it
+
+
+def test_record_counts_repairs_and_retries(monkeypatch):
+    monkeypatch.setattr(ace_repair, "_stats", dict.fromkeys(ace_repair._stats, 0))
+    ace_repair.record(True, 1.5)
+    ace_repair.record(False)
+    assert ace_repair.stats() == {"parse_failures": 2, "repaired": 1, "retried": 1,
+                                  "saved_seconds": 1.5, "repair_rate": 0.5}
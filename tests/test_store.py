@@ -0,0 +1,43 @@
+from bson import ObjectId
+
+import ace_store
+
+
+def _entry(md="# Attention\n\nSelf attention weighs every token against every other token."):
+    return ace_store.build_entry("self-attention", {}, "Attention", md, "closed_book", {}, [])
+
+
+def test_save_keeps_search_data_out_of_blogs(db):
+    ace_store.ensure_indexes(db)
+    saved = ace_store.save_blog(db, "u1", _entry())
+    oid = ObjectId(saved["_id"])
+    meta = db["blogs"].find_one({"_id": oid})
+    assert "search_text" not in meta and "markdown" not in meta
+    search = db["blog_search"].find_one({"_id": oid})
+    assert search["user_id"] == "u1" and search["saved_at"] == meta["saved_at"]
+    assert search["search_text"].split().count("token") == 1   # distinct words only
+    assert ace_store.load_blog(db, "u1", saved["_id"])["markdown"] == saved["markdown"]
+
+
+def test_delete_removes_all_three_entries(db):
+    saved = ace_store.save_blog(db, "u1", _entry())
+    ace_store.delete_blog(db, "u1", saved["_id"])
+    for coll in ("blogs", "blog_bodies", "blog_search"):
+        assert db[coll].count_documents({}) == 0
+
+
+def test_ensure_indexes_moves_old_search_data_and_drops_old_index(db):
+    db["blogs"].create_index([("user_id", 1), ("blog_title", "text")], name="blogs_search")
+    with_words, inline = ObjectId(), ObjectId()
+    db["blogs"].insert_many([
+        {"_id": with_words, "user_id": "u1", "blog_title": "A", "topic": "a", "search_text": "alpha beta"},
+        {"_id": inline, "user_id": "u1", "blog_title": "B", "topic": "b", "markdown": "Gamma gamma delta"},
+    ])
+    ace_store.ensure_indexes(db)
+    assert "blogs_search" not in db["blogs"].index_information()
+    assert "search_text" not in db["blogs"].find_one({"_id": with_words})
+    assert db["blog_search"].find_one({"_id": with_words})["search_text"] == "alpha beta"
+    assert db["blog_search"].find_one({"_id": inline})["search_text"] == "delta gamma"
+    assert db["blogs"].find_one({"_id": inline})["markdown"] == "Gamma gamma delta"
+    ace_store.ensure_indexes(db)                # nothing left to move
+    assert db["blog_search"].count_documents({}) == 2
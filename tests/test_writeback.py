@@ -0,0 +1,106 @@
+import pytest
+from pymongo import DeleteOne, InsertOne
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError
+
+import ace_writeback
+
+
+class FlakyDb:
+    """Applies bulk_write op by op to a mongomock db (whose own bulk_write rejects the
+    `sort` recent pymongo puts on UpdateOne), and can play a database that is down."""
+
+    def __init__(self, db, down: int = 0):
+        self.db, self.down, self.batches = db, down, []
+
+    def __getitem__(self, name):
+        return _Coll(self, name)
+
+
+class _Coll:
+    def __init__(self, owner: FlakyDb, name: str):
+        self.owner, self.coll = owner, owner.db[name]
+
+    def bulk_write(self, ops, ordered=True):
+        self.owner.batches.append((self.coll.name, len(ops)))
+        if self.owner.down:
+            self.owner.down -= 1
+            raise AutoReconnect("connection refused")
+        for i, op in enumerate(ops):
+            try:
+                if isinstance(op, InsertOne):
+                    self.coll.insert_one(op._doc)
+                elif isinstance(op, DeleteOne):
+                    self.coll.delete_one(op._filter)
+                else:
+                    self.coll.update_one(op._filter, op._doc, upsert=op._upsert)
+            except DuplicateKeyError:
+                raise BulkWriteError({"writeErrors": [{"index": i, "code": 11000, "errmsg": "dup"}]})
+
+
+@pytest.fixture
+def flaky(db):
+    return FlakyDb(db)
+
+
+def test_ops_on_one_document_apply_in_order(db, flaky):
+    w = ace_writeback.WriteBehind(flaky, journal="", flush_interval=0.05)
+    try:
+        w.insert("sessions", {"token": "t1", "user_id": "u1"})
+        w.delete("sessions", {"token": "t1"})                      # sign-out right after sign-in
+        w.insert("blogs", {"_id": "b1", "user_id": "u1", "v": 1})
+        for v in range(2, 6):
+            w.update("blogs", {"_id": "b1"}, {"$set": {"v": v}})
+        assert w.flush(timeout=2)
+    finally:
+        w.close(timeout=2)
+    assert db["sessions"].count_documents({}) == 0
+    assert db["blogs"].find_one({"_id": "b1"})["v"] == 5
+
+
+def test_transient_errors_are_retried_within_the_window(db, flaky):
+    flaky.down = 2
+    w = ace_writeback.WriteBehind(flaky, journal="", retry_for=5)
+    try:
+        w.insert("blogs", {"_id": "b1", "user_id": "u1"})
+        assert w.flush(timeout=5)
+    finally:
+        w.close(timeout=2)
+    assert db["blogs"].count_documents({}) == 1
+    assert len(flaky.batches) == 3 and w.take_failures("u1") == []
+
+
+def test_ops_still_failing_after_the_window_are_dead_lettered(db, flaky, tmp_path):
+    flaky.down = 10**6
+    journal = tmp_path / "writes.journal"
+    w = ace_writeback.WriteBehind(flaky, journal=str(journal), retry_for=0.3)
+    try:
+        w.insert("blogs", {"_id": "b1", "user_id": "u1"})
+        assert w.flush(timeout=5)
+    finally:
+        w.close(timeout=2)
+    failures = w.take_failures("u1")
+    assert [(f["coll"], f["kind"]) for f in failures] == [("blogs", "insert")]
+    assert w.take_failures("u1") == []                          # handed out once
+    assert '"b1"' in (tmp_path / "writes.journal.dead").read_text()
+    assert journal.stat().st_size == 0                          # dead letters leave the journal
+
+
+def test_journal_is_replayed_after_an_outage_and_restart(db, flaky, tmp_path):
+    journal = str(tmp_path / "writes.journal")
+    flaky.down = 10**6
+    w = ace_writeback.WriteBehind(flaky, journal=journal, retry_for=60)
+    w.insert("blogs", {"_id": "b1", "user_id": "u1"})
+    w.update("blogs", {"_id": "b1"}, {"$set": {"title": "saved while down"}})
+    w.close(timeout=0.5)                                        # stops mid-retry; ops stay journaled
+    assert db["blogs"].count_documents({}) == 0
+
+    flaky.down = 0
+    db["blogs"].insert_one({"_id": "b1", "user_id": "u1"})      # the insert did land before the outage
+    again = ace_writeback.WriteBehind(flaky, journal=journal)
+    try:
+        assert again.flush(timeout=2)
+    finally:
+        again.close(timeout=2)
+    assert db["blogs"].find_one({"_id": "b1"})["title"] == "saved while down"
+    assert again.take_failures("u1") == []                      # the replayed duplicate is harmless
+    assert (tmp_path / "writes.journal").stat().st_size == 0